@@ -3,9 +3,6 @@ This module sets up the Flask application, including configuration, database,
 and logging. It also defines the shell context and initializes various Flask extensions.
 
 Modules:
-    logging: Provides logging functionality.
-    os: Provides a way of using operating system dependent functionality.
-    RotatingFileHandler: A handler for logging that rotates log files.
     Flask: The Flask application class.
     current_app: Proxy for the current application.
     request: Proxy for the current request.
@@ -14,20 +11,30 @@ Modules:
     LoginManager: Flask-Login extension for user session management.
     Migrate: Flask-Migrate extension for handling database migrations.
     SQLAlchemy: Flask-SQLAlchemy extension for database integration.
+    ResponseCache: Extension caching the pages served to anonymous users.
+    LogPipeline: Extension writing the application log from a background thread.
+    Assets: Extension serving the fingerprinted static files of the asset build.
+    ResponseCompressor: Extension minifying and compressing the responses.
+    routing: Routing of the queries between the primary database and its replica.
+    instrumentation: Request, SQL and template timing, and the metrics endpoint.
+    preload: Warm-up of the application before forking workers, and startup timing.
+    ProxyFix: Middleware taking the client address from the headers of trusted proxies.
     Config: Configuration class for the application.
 """
 
-import logging
-import os
-from logging.handlers import RotatingFileHandler
-
 from flask import Flask, current_app, request
 from flask_babel import Babel
 from flask_babel import lazy_gettext as _l
 from flask_login import LoginManager
 from flask_migrate import Migrate
 from flask_sqlalchemy import SQLAlchemy
+from werkzeug.middleware.proxy_fix import ProxyFix
 
+from app import instrumentation, preload, routing
+from app.assets import Assets
+from app.cache import ResponseCache
+from app.compression import ResponseCompressor
+from app.logs import LogPipeline
 from config import Config
 
 
@@ -41,59 +48,89 @@ def get_locale():
     return request.accept_languages.best_match(current_app.config["LANGUAGES"])
 
 
-db = SQLAlchemy()
+db = SQLAlchemy(
+    engine_options={"poolclass": instrumentation.TimedQueuePool}, session_options={"class_": routing.RoutingSession}
+)
 migrate = Migrate()
 login = LoginManager()
 login.login_view = "auth.login"
 login.login_message = _l("Please log in to access this page.")
 babel = Babel()
+response_cache = ResponseCache()
+logs = LogPipeline()
+assets = Assets()
+compressor = ResponseCompressor()
 
 
 def create_app(config_class=Config):
     """
     Creates and configures the Flask application.
 
+    Each phase is timed in the StartupProfile stored in ``app.extensions["startup_profile"]``.
+    Behind TRUSTED_PROXY_HOPS reverse proxies, the client address and scheme are taken from
+    their X-Forwarded-For and X-Forwarded-Proto headers, so login throttling and the metrics
+    allowlist see the real client.
+    With PRELOAD_APP set, the templates, translations and place hierarchy are loaded before
+    returning, and the database connections are closed so the application can be forked.
+
     Args:
         config_class (class): The configuration class to use.
 
     Returns:
         Flask: The configured Flask application instance.
     """
-    app = Flask(__name__)
-    app.config.from_object(config_class)
+    profile = preload.StartupProfile()
+    with profile.phase("config"):
+        app = Flask(__name__)
+        app.config.from_object(config_class)
+        app.extensions["startup_profile"] = profile
+        hops = app.config.get("TRUSTED_PROXY_HOPS", 0)
+        if hops:
+            app.wsgi_app = ProxyFix(app.wsgi_app, x_for=hops, x_proto=hops)
+        preload.init_bytecode_cache(app)
+
+    with profile.phase("extensions"):
+        db.init_app(app)
+        routing.init_app(app, db)
+        instrumentation.init_app(app, db)
+        migrate.init_app(app, db)
+        login.init_app(app)
+        babel.init_app(app, locale_selector=get_locale)
+        response_cache.init_app(app)
+        assets.init_app(app)
+        compressor.init_app(app)
+
+        from app.identity import identities
 
-    db.init_app(app)
-    migrate.init_app(app, db)
-    login.init_app(app)
-    babel.init_app(app, locale_selector=get_locale)
+        identities.init_app(app)
 
-    from app.main import bp as routes_bp
+        from app.auth.protection import login_guard
 
-    app.register_blueprint(routes_bp)
+        login_guard.init_app(app)
 
-    from app.errors import bp as errors_bp
+    with profile.phase("blueprints"):
+        from app.main import bp as routes_bp
 
-    app.register_blueprint(errors_bp)
+        app.register_blueprint(routes_bp)
 
-    from app.auth import bp as auth_bp
+        from app.errors import bp as errors_bp
 
-    app.register_blueprint(auth_bp, url_prefix="/auth")
+        app.register_blueprint(errors_bp)
 
-    from app.cli import bp as cli_bp
+        from app.auth import bp as auth_bp
 
-    app.register_blueprint(cli_bp)
+        app.register_blueprint(auth_bp, url_prefix="/auth")
+
+        from app.cli import bp as cli_bp
+
+        app.register_blueprint(cli_bp)
 
     if not app.debug and not app.testing:
-        if not os.path.exists("logs"):
-            os.mkdir("logs")
-        file_handler = RotatingFileHandler("logs/restaurant.log", maxBytes=10240, backupCount=10)
-        file_handler.setFormatter(
-            logging.Formatter("%(asctime)s %(levelname)s: %(message)s [in %(pathname)s:%(lineno)d]")
-        )
-        file_handler.setLevel(logging.INFO)
-        app.logger.addHandler(file_handler)
-
-        app.logger.setLevel(logging.INFO)
-        app.logger.info("Restaurant startup")
+        with profile.phase("logging"):
+            logs.init_app(app)
+            app.logger.info("Restaurant startup")
+
+    if app.config.get("PRELOAD_APP"):
+        preload.warm_up(app, db, profile)
 
     return app
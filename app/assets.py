@@ -0,0 +1,236 @@
+"""
+This module implements the static asset pipeline.
+
+The ``flask assets build`` command concatenates the stylesheets and scripts loaded by every
+page into one bundle of each kind, minifies the files that are not minified yet, and
+writes every static file under ``static/dist`` with an xxhash of its contents in its name,
+along with a gzip-compressed copy and a manifest mapping the original names to the new
+ones. Once the manifest exists, ``url_for('static', ...)`` returns the fingerprinted
+URLs, and the files are served, precompressed when the client accepts gzip, with a
+one-year immutable Cache-Control, since a new version always gets a new URL. Without a
+manifest, or in debug mode, the original files are served one by one.
+
+Modules:
+    gzip: Provides gzip compression.
+    json: Provides JSON encoding and decoding.
+    mimetypes: Provides guessing of MIME types from file names.
+    os: Provides a way of using operating system dependent functionality.
+    xxhash: Provides fast non-cryptographic hashing.
+    jsmin: Provides JavaScript minification.
+    cssmin: Provides CSS minification.
+    current_app: Proxy for the current application.
+    request: Proxy for the current request.
+    send_from_directory: Function to send a file from a directory.
+    url_for: Function to build a URL to a specific endpoint.
+"""
+
+import gzip
+import json
+import mimetypes
+import os
+
+import xxhash
+from flask import current_app, request, send_from_directory, url_for
+from jsmin import jsmin
+from rcssmin import cssmin
+
+DIST = "dist"
+MANIFEST = "manifest.json"
+MAX_AGE = 365 * 24 * 60 * 60
+BUNDLES = {
+    "css/bundle.css": (
+        "css/bootstrap-5.3.3.min.css",
+        "css/twitter-bootstrap-5.3.0.min.css",
+        "css/dataTables.bootstrap5-2.1.5.min.css",
+    ),
+    "js/bundle.js": (
+        "js/bootstrap-5.3.3.bundle.min.js",
+        "js/jquery-3.7.1.min.js",
+        "js/twitter-bootstrap-5.3.0.bundle.min.js",
+        "js/dataTables-2.1.5.min.js",
+        "js/dataTables.bootstrap5-2.1.5.min.js",
+        "js/flash-messages-timeout.js",
+        "js/dataTables-custom-settings.js",
+    ),
+}
+SEPARATORS = {".css": b"\n", ".js": b";\n"}
+
+
+def minify(filename, content):
+    """
+    Minifies a stylesheet or a script, unless it is minified already.
+
+    Args:
+        filename (str): The name of the file.
+        content (bytes): The contents of the file.
+
+    Returns:
+        bytes: The minified contents, or the original ones for other files.
+    """
+    if ".min." in filename:
+        return content
+    if filename.endswith(".css"):
+        return cssmin(content.decode()).encode()
+    if filename.endswith(".js"):
+        return jsmin(content.decode()).encode()
+    return content
+
+
+def fingerprinted(filename, content):
+    """
+    Returns the name of a file with a digest of its contents.
+
+    Args:
+        filename (str): The name of the file, such as "js/bundle.js".
+        content (bytes): The contents of the file.
+
+    Returns:
+        str: The new name, such as "js/bundle.0123456789ab.js".
+    """
+    root, extension = os.path.splitext(filename)
+    return "{}.{}{}".format(root, xxhash.xxh64_hexdigest(content)[:12], extension)
+
+
+def _write(path, content):
+    """
+    Writes a file atomically, creating its directory if needed.
+
+    Args:
+        path (str): The path of the file.
+        content (bytes): The contents of the file.
+    """
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temporary = path + ".tmp"
+    with open(temporary, "wb") as file:
+        file.write(content)
+    os.replace(temporary, path)
+
+
+def build(static_folder, clean=False):
+    """
+    Builds the bundles and the fingerprinted, precompressed copies of the static files.
+
+    Args:
+        static_folder (str): The static folder of the application.
+        clean (bool): Whether to remove the files of earlier builds. They are kept by
+            default, so pages cached with the old URLs keep working.
+
+    Returns:
+        dict: The fingerprinted name of each file, relative to the static folder, by original name.
+    """
+    dist = os.path.join(static_folder, DIST)
+    files = {}
+    for dirpath, dirnames, filenames in os.walk(static_folder):
+        if os.path.abspath(dirpath) == os.path.abspath(static_folder):
+            dirnames[:] = [name for name in dirnames if name != DIST]
+        for name in filenames:
+            path = os.path.join(dirpath, name)
+            filename = os.path.relpath(path, static_folder).replace(os.sep, "/")
+            with open(path, "rb") as file:
+                files[filename] = minify(filename, file.read())
+    for bundle, sources in BUNDLES.items():
+        separator = SEPARATORS[os.path.splitext(bundle)[1]]
+        files[bundle] = separator.join(files[source].rstrip() for source in sources) + b"\n"
+
+    manifest = {}
+    for filename, content in sorted(files.items()):
+        target = fingerprinted(filename, content)
+        path = os.path.join(dist, target)
+        if not os.path.exists(path):
+            _write(path, content)
+            compressed = gzip.compress(content, 9, mtime=0)
+            if len(compressed) < len(content):
+                _write(path + ".gz", compressed)
+        manifest[filename] = "{}/{}".format(DIST, target)
+
+    if clean:
+        keep = {os.path.join(static_folder, target) for target in manifest.values()}
+        keep |= {path + ".gz" for path in keep}
+        for dirpath, _, filenames in os.walk(dist):
+            for name in filenames:
+                path = os.path.join(dirpath, name)
+                if path not in keep and name != MANIFEST:
+                    os.remove(path)
+    _write(os.path.join(dist, MANIFEST), json.dumps(manifest, indent=2, sort_keys=True).encode())
+    return manifest
+
+
+class Assets:
+    """
+    Flask extension serving the static files through the manifest of the last build.
+
+    Attributes:
+        manifest (dict): The fingerprinted name of each static file by original name, empty
+            when there is no build or the application runs in debug mode.
+    """
+
+    def __init__(self, app=None):
+        self.manifest = {}
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """
+        Loads the manifest and registers the URL rewriting and the route of the built files.
+
+        Args:
+            app (Flask): The application.
+        """
+        self.load(app)
+        app.extensions["assets"] = self
+        app.url_defaults(self._fingerprint_url)
+        app.add_url_rule("{}/{}/<path:filename>".format(app.static_url_path, DIST), "assets", _send_built_file)
+        app.jinja_env.globals["asset_urls"] = self.urls
+
+    def load(self, app):
+        """
+        Reads the manifest of the last build, if any.
+
+        Args:
+            app (Flask): The application.
+        """
+        path = os.path.join(app.static_folder, DIST, MANIFEST)
+        self.manifest = {}
+        if not app.debug and os.path.exists(path):
+            with open(path, encoding="utf-8") as file:
+                self.manifest = json.load(file)
+
+    def _fingerprint_url(self, endpoint, values):
+        if endpoint == "static" and values.get("filename") in self.manifest:
+            values["filename"] = self.manifest[values["filename"]]
+
+    def urls(self, bundle):
+        """
+        Returns the URLs to load a bundle with.
+
+        Args:
+            bundle (str): The name of the bundle, from BUNDLES.
+
+        Returns:
+            list: The URL of the built bundle, or of each of its files when it is not built.
+        """
+        if bundle in self.manifest:
+            return [url_for("static", filename=bundle)]
+        return [url_for("static", filename=source) for source in BUNDLES[bundle]]
+
+
+def _send_built_file(filename):
+    """
+    Route serving a built file, precompressed if the client accepts gzip.
+
+    Args:
+        filename (str): The path of the file within the build.
+
+    Returns:
+        Response: The file, cacheable for a year.
+    """
+    directory = os.path.join(current_app.static_folder, DIST)
+    mimetype = mimetypes.guess_type(filename)[0] or "application/octet-stream"
+    if "gzip" in request.accept_encodings and os.path.exists(os.path.join(directory, filename + ".gz")):
+        response = send_from_directory(directory, filename + ".gz", mimetype=mimetype, max_age=MAX_AGE)
+        response.content_encoding = "gzip"
+    else:
+        response = send_from_directory(directory, filename, mimetype=mimetype, max_age=MAX_AGE)
+    response.vary.add("Accept-Encoding")
+    response.cache_control.immutable = True
+    return response
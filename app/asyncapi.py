@@ -0,0 +1,346 @@
+"""
+This module serves a read-only JSON API of the restaurants and places over ASGI.
+
+The API runs as a separate process next to the Flask application, for clients that keep
+many connections open, and reads the same tables through the mappings of ``app.models``
+with the asyncio extension of SQLAlchemy, so a request waiting on the database does not
+hold a thread. It is a plain ASGI callable without any framework:
+
+    GET /api/restaurants                  page of the restaurant listing, in name order
+    GET /api/restaurants/<id>             one restaurant
+    GET /api/places/<kind>                places of a level, with their restaurant counts
+    GET /api/places/<kind>/<id>           one place, with its path up to the country
+
+SQLite databases are opened with the aiosqlite driver, in query-only mode. The engine is
+configured with ASYNC_DATABASE_URL, or derived from SQLALCHEMY_DATABASE_URI, and with the
+pool options of ASYNC_ENGINE_OPTIONS.
+
+Modules:
+    json: Provides JSON encoding and decoding.
+    re: Provides regular expression matching operations.
+    parse_qsl: Function decoding query strings.
+    sqlalchemy: SQLAlchemy library for database operations.
+    async_sessionmaker, create_async_engine: SQLAlchemy asyncio session and engine factories.
+    hierarchy: The levels of the place hierarchy and their models.
+    models: Contains the database models for the application.
+    query_only: Function making a SQLite connection refuse to write.
+    Config: Configuration class for the application.
+"""
+
+import json
+import re
+from urllib.parse import parse_qsl
+
+import sqlalchemy as sa
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from app.hierarchy import LEVELS, MODELS, PARENT_COLUMNS, PLURALS, parent_level
+from app.models import PlaceCount, RestaurantListing
+from app.routing import query_only
+from config import Config
+
+ASYNC_DRIVERS = {"sqlite": "sqlite+aiosqlite"}
+KINDS = {plural: level for level, plural in PLURALS.items()}
+LISTING_COLUMNS = (
+    RestaurantListing.restaurant_id,
+    RestaurantListing.name,
+    RestaurantListing.address,
+    RestaurantListing.city_id,
+    RestaurantListing.city_name,
+    RestaurantListing.province_name,
+    RestaurantListing.region_name,
+    RestaurantListing.country_name,
+)
+
+
+class ApiError(Exception):
+    """
+    Error answered with an HTTP error status and a JSON message.
+
+    Attributes:
+        status (int): The HTTP status code.
+        message (str): The error message.
+    """
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+def async_database_url(config):
+    """
+    Returns the URL the async engine connects to.
+
+    Args:
+        config (type): The configuration class.
+
+    Returns:
+        URL: ASYNC_DATABASE_URL, or SQLALCHEMY_DATABASE_URI with its async driver.
+    """
+    if config.ASYNC_DATABASE_URL:
+        return sa.engine.make_url(config.ASYNC_DATABASE_URL)
+    url = sa.engine.make_url(config.SQLALCHEMY_DATABASE_URI)
+    return url.set(drivername=ASYNC_DRIVERS.get(url.drivername, url.drivername))
+
+
+def _int_param(params, name, default=None):
+    """
+    Reads an integer query argument.
+
+    Args:
+        params (dict): The query arguments.
+        name (str): The argument name.
+        default (int, optional): The value of a missing argument.
+
+    Returns:
+        int: The parsed value.
+
+    Raises:
+        ApiError: If the argument is not an integer.
+    """
+    if name not in params:
+        return default
+    try:
+        return int(params[name])
+    except ValueError:
+        raise ApiError(400, "{} must be an integer".format(name)) from None
+
+
+def _restaurant(row):
+    return {
+        "id": row.restaurant_id,
+        "name": row.name,
+        "address": row.address,
+        "city_id": row.city_id,
+        "city": row.city_name,
+        "province": row.province_name,
+        "region": row.region_name,
+        "country": row.country_name,
+    }
+
+
+class AsyncApi:
+    """
+    ASGI application of the read-only API.
+
+    Attributes:
+        engine (AsyncEngine): The engine the queries run on.
+        sessions (async_sessionmaker): The factory of the session of each request.
+        max_page_length (int): The maximum number of restaurants per page.
+        routes (list): The path pattern and handler of each endpoint.
+    """
+
+    def __init__(self, engine, max_page_length):
+        self.engine = engine
+        self.sessions = async_sessionmaker(engine, expire_on_commit=False)
+        self.max_page_length = max_page_length
+        kinds = "|".join(KINDS)
+        self.routes = [
+            (re.compile(r"/api/restaurants"), self.restaurants),
+            (re.compile(r"/api/restaurants/(\d+)"), self.restaurant),
+            (re.compile(r"/api/places/({})".format(kinds)), self.places),
+            (re.compile(r"/api/places/({})/(\d+)".format(kinds)), self.place),
+        ]
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            await self._lifespan(receive, send)
+        elif scope["type"] == "http":
+            await self._http(scope, send)
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                await self.engine.dispose()
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    async def _http(self, scope, send):
+        """
+        Answers an HTTP request.
+
+        Args:
+            scope (dict): The ASGI connection scope.
+            send (callable): The ASGI send channel.
+        """
+        headers = [(b"content-type", b"application/json"), (b"cache-control", b"no-cache")]
+        try:
+            if scope["method"] not in ("GET", "HEAD"):
+                headers.append((b"allow", b"GET, HEAD"))
+                raise ApiError(405, "method not allowed")
+            for pattern, handler in self.routes:
+                match = pattern.fullmatch(scope["path"])
+                if match:
+                    break
+            else:
+                raise ApiError(404, "not found")
+            params = dict(parse_qsl(scope["query_string"].decode("latin-1")))
+            async with self.sessions() as db_session:
+                payload = await handler(db_session, params, *match.groups())
+            status = 200
+        except ApiError as error:
+            status, payload = error.status, {"error": error.message}
+        body = json.dumps(payload, separators=(",", ":")).encode()
+        headers.append((b"content-length", str(len(body)).encode()))
+        await send({"type": "http.response.start", "status": status, "headers": headers})
+        await send({"type": "http.response.body", "body": b"" if scope["method"] == "HEAD" else body})
+
+    async def restaurants(self, db_session, params):
+        """
+        Returns a page of the restaurant listing, in name order.
+
+        Takes the ``start`` and ``length`` of the page, and optionally the ID of a
+        ``country``, ``region``, ``province`` or ``city`` to restrict it to.
+
+        Args:
+            db_session (AsyncSession): The session of the request.
+            params (dict): The query arguments.
+
+        Returns:
+            dict: The page, with the number of matching restaurants.
+        """
+        start = max(_int_param(params, "start", 0), 0)
+        length = min(max(_int_param(params, "length", 25), 1), self.max_page_length)
+        query = sa.select(*LISTING_COLUMNS)
+        place = next(((level, column) for level, column in PlaceCount.COLUMNS.items() if level in params), None)
+        if place is None:
+            total = await db_session.scalar(sa.select(sa.func.count()).select_from(RestaurantListing))
+        else:
+            level, column = place
+            place_id = _int_param(params, level)
+            query = query.where(getattr(RestaurantListing, column) == place_id)
+            total = await db_session.scalar(
+                sa.select(PlaceCount.total).where(PlaceCount.level == level, PlaceCount.place_id == place_id)
+            )
+        rows = await db_session.execute(query.order_by(RestaurantListing.name).offset(start).limit(length))
+        return {"start": start, "length": length, "total": total or 0, "data": [_restaurant(row) for row in rows]}
+
+    async def restaurant(self, db_session, params, restaurant_id):
+        """
+        Returns a restaurant.
+
+        Args:
+            db_session (AsyncSession): The session of the request.
+            params (dict): The query arguments.
+            restaurant_id (str): The ID of the restaurant.
+
+        Returns:
+            dict: The restaurant.
+
+        Raises:
+            ApiError: If the restaurant does not exist.
+        """
+        query = sa.select(*LISTING_COLUMNS).where(RestaurantListing.restaurant_id == int(restaurant_id))
+        row = (await db_session.execute(query)).first()
+        if row is None:
+            raise ApiError(404, "restaurant not found")
+        return _restaurant(row)
+
+    async def places(self, db_session, params, kind):
+        """
+        Returns the places of a level, in name order, with their number of restaurants.
+
+        Below countries, the parent place is given as an argument named after its level,
+        as in the places endpoint of the Flask application.
+
+        Args:
+            db_session (AsyncSession): The session of the request.
+            params (dict): The query arguments.
+            kind (str): The plural name of the level.
+
+        Returns:
+            list: The places.
+
+        Raises:
+            ApiError: If the parent place is missing or does not exist.
+        """
+        level = KINDS[kind]
+        model = MODELS[level]
+        count = sa.func.coalesce(PlaceCount.total, 0)
+        query = (
+            sa.select(model.id, model.name, count)
+            .outerjoin(PlaceCount, sa.and_(PlaceCount.level == level, PlaceCount.place_id == model.id))
+            .order_by(model.name)
+        )
+        parent = parent_level(level)
+        if parent is not None:
+            parent_id = _int_param(params, parent)
+            if parent_id is None:
+                raise ApiError(400, "{} is required".format(parent))
+            query = query.where(PARENT_COLUMNS[level] == parent_id)
+        rows = (await db_session.execute(query)).all()
+        if not rows and parent is not None:
+            parent_model = MODELS[parent]
+            if await db_session.scalar(sa.select(parent_model.id).where(parent_model.id == parent_id)) is None:
+                raise ApiError(404, "{} not found".format(parent))
+        return [{"id": place_id, "name": name, "count": total} for place_id, name, total in rows]
+
+    async def place(self, db_session, params, kind, place_id):
+        """
+        Returns a place, with its number of restaurants and the places it belongs to.
+
+        The whole path is read with one query, joining each level to its parent.
+
+        Args:
+            db_session (AsyncSession): The session of the request.
+            params (dict): The query arguments.
+            kind (str): The plural name of the level.
+            place_id (str): The ID of the place.
+
+        Returns:
+            dict: The place, with its "path" from the country down to its parent.
+
+        Raises:
+            ApiError: If the place does not exist.
+        """
+        level = KINDS[kind]
+        model = MODELS[level]
+        query = (
+            sa.select(model.id, model.name, sa.func.coalesce(PlaceCount.total, 0))
+            .outerjoin(PlaceCount, sa.and_(PlaceCount.level == level, PlaceCount.place_id == model.id))
+            .where(model.id == int(place_id))
+        )
+        ancestors = LEVELS[: LEVELS.index(level)][::-1]
+        child = level
+        for ancestor in ancestors:
+            ancestor_model = MODELS[ancestor]
+            query = query.join(ancestor_model, PARENT_COLUMNS[child] == ancestor_model.id).add_columns(
+                ancestor_model.id, ancestor_model.name
+            )
+            child = ancestor
+        row = (await db_session.execute(query)).first()
+        if row is None:
+            raise ApiError(404, "{} not found".format(level))
+        path = [
+            {"level": ancestor, "id": row[3 + 2 * i], "name": row[4 + 2 * i]} for i, ancestor in enumerate(ancestors)
+        ]
+        return {"level": level, "id": row[0], "name": row[1], "count": row[2], "path": path[::-1]}
+
+
+def create_asgi_app(config_class=Config):
+    """
+    Creates the ASGI application of the read-only API.
+
+    Args:
+        config_class (type): The configuration class.
+
+    Returns:
+        AsyncApi: The application.
+
+    Raises:
+        RuntimeError: If the async driver of the database is not installed.
+    """
+    url = async_database_url(config_class)
+    try:
+        engine = create_async_engine(url, **config_class.ASYNC_ENGINE_OPTIONS)
+    except ImportError as error:
+        raise RuntimeError(
+            "The async API needs the {} driver of the database, from the async extra: {}".format(url.drivername, error)
+        ) from error
+    if engine.dialect.name == "sqlite":
+        sa.event.listen(engine.sync_engine, "connect", query_only)
+    return AsyncApi(engine, config_class.RESTAURANTS_MAX_PAGE_LENGTH)
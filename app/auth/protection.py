@@ -0,0 +1,217 @@
+"""
+This module protects the request workers from bursts of login attempts.
+
+Password hashes are verified with werkzeug's scrypt, which is designed to be slow and
+memory-hard. Login attempts are first checked against in-memory token buckets, one per
+username and one per client address, so a credential-stuffing run is turned away before
+any hashing. The hashes of the attempts let through are verified by a small, bounded pool
+of threads: when too many verifications are waiting, new attempts are rejected at once
+instead of tying up every worker.
+
+Modules:
+    math: Provides mathematical functions.
+    os: Provides a way of using operating system dependent functionality.
+    threading: Provides thread synchronization primitives.
+    time: Provides time-related functions.
+    OrderedDict: Dictionary that remembers insertion order.
+    ThreadPoolExecutor: Pool of threads executing calls asynchronously.
+    TimeoutError: Error raised when a future does not complete in time.
+    check_password_hash: Function to verify a password against its hash.
+"""
+
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+
+from werkzeug.security import check_password_hash
+
+
+class LoginRejected(Exception):
+    """
+    Error raised when a login attempt is turned away without verifying the password.
+
+    Attributes:
+        status (int): The HTTP status code of the response.
+        retry_after (int): Seconds after which the client may try again.
+    """
+
+    status = 503
+
+    def __init__(self, retry_after=1):
+        super().__init__(retry_after)
+        self.retry_after = max(1, math.ceil(retry_after))
+
+
+class TooManyAttempts(LoginRejected):
+    """
+    Error raised when a username or client address made too many login attempts.
+    """
+
+    status = 429
+
+
+class Overloaded(LoginRejected):
+    """
+    Error raised when too many password verifications are already waiting.
+    """
+
+    status = 503
+
+
+class TokenBuckets:
+    """
+    Thread-safe, bounded set of token buckets, one per key.
+
+    Each bucket holds up to ``burst`` tokens and gets them back at a steady rate over
+    ``period`` seconds. The least recently used buckets are dropped when there are more than
+    ``maxsize``, which only makes their keys start again with a full bucket.
+
+    Attributes:
+        burst (int): The capacity of each bucket.
+        period (float): Seconds it takes to refill an empty bucket.
+        maxsize (int): The maximum number of buckets kept.
+    """
+
+    def __init__(self, burst, period, maxsize=10000):
+        self.burst = burst
+        self.period = period
+        self.maxsize = maxsize
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def take(self, key):
+        """
+        Takes a token from the bucket of a key.
+
+        Args:
+            key (str): The key, such as a username or a client address.
+
+        Returns:
+            float: 0 if a token was taken, otherwise the seconds until one is available.
+        """
+        now = time.monotonic()
+        rate = self.burst / self.period
+        with self._lock:
+            tokens, updated = self._buckets.get(key, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - updated) * rate)
+            if tokens >= 1:
+                tokens -= 1
+                wait = 0
+            else:
+                wait = (1 - tokens) / rate
+            self._buckets[key] = (tokens, now)
+            self._buckets.move_to_end(key)
+            while len(self._buckets) > self.maxsize:
+                self._buckets.popitem(last=False)
+        return wait
+
+
+class LoginGuard:
+    """
+    Flask extension throttling login attempts and verifying passwords in a bounded pool.
+
+    Attributes:
+        usernames (TokenBuckets): The buckets of the attempted usernames, set by LOGIN_USERNAME_LIMIT.
+        addresses (TokenBuckets): The buckets of the client addresses, set by LOGIN_ADDRESS_LIMIT.
+        workers (int): The number of threads verifying passwords, set by LOGIN_HASH_WORKERS.
+        max_pending (int): The maximum number of verifications running or waiting, set by LOGIN_HASH_QUEUE.
+        timeout (float): Seconds an attempt waits for its verification, set by LOGIN_HASH_TIMEOUT.
+    """
+
+    def __init__(self, app=None):
+        self.usernames = TokenBuckets(5, 60)
+        self.addresses = TokenBuckets(20, 60)
+        self.workers = 2
+        self.max_pending = 8
+        self.timeout = 5
+        self._slots = threading.BoundedSemaphore(self.max_pending)
+        self._executor = None
+        self._pid = None
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """
+        Configures the limits for an application.
+
+        Args:
+            app (Flask): The application.
+        """
+        size = app.config.get("LOGIN_THROTTLE_SIZE", 10000)
+        self.usernames = TokenBuckets(*app.config.get("LOGIN_USERNAME_LIMIT", (5, 60)), maxsize=size)
+        self.addresses = TokenBuckets(*app.config.get("LOGIN_ADDRESS_LIMIT", (20, 60)), maxsize=size)
+        self.workers = app.config.get("LOGIN_HASH_WORKERS", 2)
+        self.max_pending = max(self.workers, app.config.get("LOGIN_HASH_QUEUE", 8))
+        self.timeout = app.config.get("LOGIN_HASH_TIMEOUT", 5)
+        self._slots = threading.BoundedSemaphore(self.max_pending)
+        app.extensions["login_guard"] = self
+
+    def check(self, username, address):
+        """
+        Counts a login attempt against the limits of its username and client address.
+
+        The address is checked first, and an attempt it refuses does not count against the
+        username, so a client flooding someone else's username cannot lock them out.
+
+        Args:
+            username (str): The attempted username.
+            address (str): The address of the client.
+
+        Raises:
+            TooManyAttempts: If either limit is exceeded.
+        """
+        wait = self.addresses.take(address or "") or self.usernames.take(username.strip().lower())
+        if wait:
+            raise TooManyAttempts(wait)
+
+    def _get_executor(self):
+        """
+        Returns the thread pool of the current process, creating it if needed.
+
+        The pool is created on first use, and again in a forked worker, since threads do not
+        survive a fork.
+
+        Returns:
+            ThreadPoolExecutor: The thread pool.
+        """
+        with self._lock:
+            if self._executor is None or self._pid != os.getpid():
+                self._executor = ThreadPoolExecutor(self.workers, thread_name_prefix="password-hash")
+                self._pid = os.getpid()
+            return self._executor
+
+    def verify(self, password_hash, password):
+        """
+        Verifies a password against its hash in the thread pool.
+
+        Args:
+            password_hash (str): The stored password hash.
+            password (str): The password to check.
+
+        Returns:
+            bool: True if the password is correct, False otherwise.
+
+        Raises:
+            Overloaded: If too many verifications are already pending, or this one does not
+                complete within the timeout.
+        """
+        if not self._slots.acquire(blocking=False):
+            raise Overloaded()
+        try:
+            future = self._get_executor().submit(check_password_hash, password_hash, password)
+        except BaseException:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        try:
+            return future.result(timeout=self.timeout)
+        except FutureTimeoutError as error:
+            raise Overloaded(self.timeout) from error
+
+
+login_guard = LoginGuard()
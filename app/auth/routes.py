@@ -7,6 +7,7 @@ Modules:
     urlsplit: Function to split a URL into components.
     sqlalchemy: SQLAlchemy library for database operations.
     flash: Function to flash messages to the user.
+    make_response: Function to convert a view return value into a response object.
     redirect: Function to redirect the user to a different endpoint.
     render_template: Function to render HTML templates.
     request: Proxy for the current request.
@@ -19,18 +20,22 @@ Modules:
     bp: Blueprint for the authentication routes.
     LoginForm: Form class for user login.
     User: User model class.
+    LoginRejected: Error raised when a login attempt is turned away.
+    TooManyAttempts: Error raised when too many login attempts were made.
+    login_guard: Extension throttling login attempts and verifying passwords.
 """
 
 from urllib.parse import urlsplit
 
 import sqlalchemy as sa
-from flask import flash, redirect, render_template, request, url_for
+from flask import flash, make_response, redirect, render_template, request, url_for
 from flask_babel import _
 from flask_login import current_user, login_user, logout_user
 
 from app import db
 from app.auth import bp
 from app.auth.forms import LoginForm
+from app.auth.protection import LoginRejected, TooManyAttempts, login_guard
 from app.models import User
 
 
@@ -41,7 +46,10 @@ def login():
 
     If the user is already authenticated, they are redirected to the main index.
     If the login form is submitted and valid, the user is authenticated and logged in.
-    If authentication fails, an error message is flashed.
+    If authentication fails, an error message is flashed. Attempts exceeding the limits of
+    their username or client address are answered with 429 Too Many Requests, and attempts
+    made while too many passwords are being verified with 503 Service Unavailable, in both
+    cases before hashing anything.
 
     Returns:
         Response: The response object to render the login template or redirect the user.
@@ -50,8 +58,19 @@ def login():
         return redirect(url_for("main.index"))
     form = LoginForm()
     if form.validate_on_submit():
-        user = db.session.scalar(sa.select(User).where(User.username == form.username.data))
-        if user is None or not user.check_password(form.password.data):
+        try:
+            login_guard.check(form.username.data, request.remote_addr)
+            user = db.session.scalar(sa.select(User).where(User.username == form.username.data))
+            valid = user is not None and login_guard.verify(user.password_hash, form.password.data)
+        except LoginRejected as error:
+            if isinstance(error, TooManyAttempts):
+                flash(_("Too many login attempts, please try again later."), "danger")
+            else:
+                flash(_("The server is busy, please try again later."), "danger")
+            response = make_response(render_template("auth/login.html", title=_("Sign In"), form=form), error.status)
+            response.headers["Retry-After"] = str(error.retry_after)
+            return response
+        if not valid:
             flash(_("Invalid username or password"), "danger")
             return redirect(url_for("auth.login"))
         login_user(user)
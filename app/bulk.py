@@ -0,0 +1,233 @@
+"""
+This module implements bulk loading of restaurants and places.
+
+It reads large CSV or NDJSON files one record at a time, resolves place names to IDs from
+an in-memory map, creating the missing places, and inserts restaurants in batches with
+executemany, committing one transaction per batch. Since the rows bypass the ORM, every
+batch also refreshes the derived data that the session hooks would otherwise maintain.
+
+Modules:
+    csv: Provides CSV reading and writing.
+    itertools: Provides functions creating iterators for efficient looping.
+    json: Provides JSON encoding and decoding.
+    sqlalchemy: SQLAlchemy library for database operations.
+    models: Contains the database models for the application.
+"""
+
+import csv
+import itertools
+import json
+
+import sqlalchemy as sa
+
+from app.models import City, Country, DataVersion, PlaceCount, Province, Region, Restaurant, RestaurantListing
+
+FIELDS = ("name", "address", "city", "province", "region", "country")
+LEVELS = (
+    ("country", Country, None),
+    ("region", Region, "country_id"),
+    ("province", Province, "region_id"),
+    ("city", City, "province_id"),
+)
+MAX_REPORTED_ERRORS = 100
+
+
+class RecordError(ValueError):
+    """
+    Error raised for a record that cannot be imported.
+    """
+
+
+def read_records(path, file_format=None):
+    """
+    Reads restaurant records from a CSV or NDJSON file, one at a time.
+
+    CSV files must have a header row naming the fields, NDJSON files hold one JSON object
+    per line. Both use the fields in FIELDS.
+
+    Args:
+        path (str): The path of the file.
+        file_format (str, optional): "csv" or "ndjson". Guessed from the extension if omitted.
+
+    Yields:
+        tuple: The line number and the record, as a dict.
+    """
+    if file_format is None:
+        file_format = "ndjson" if path.endswith((".ndjson", ".jsonl", ".json")) else "csv"
+    with open(path, encoding="utf-8", newline="") as file:
+        if file_format == "csv":
+            reader = csv.DictReader(file)
+            for record in reader:
+                yield reader.line_num, record
+        else:
+            for number, line in enumerate(file, 1):
+                if line.strip():
+                    try:
+                        yield number, json.loads(line)
+                    except ValueError as error:
+                        raise ValueError("line {}: {}".format(number, error)) from error
+
+
+def batched(iterable, size):
+    """
+    Splits an iterable in lists of a given size, the last one possibly shorter.
+
+    Args:
+        iterable (iterable): The items.
+        size (int): The size of the batches.
+
+    Yields:
+        list: The batches.
+    """
+    iterator = iter(iterable)
+    while batch := list(itertools.islice(iterator, size)):
+        yield batch
+
+
+class PlaceResolver:
+    """
+    In-memory map from place names to IDs, for every level of the hierarchy.
+
+    Attributes:
+        places (dict): For each level, the (ID, parent ID) pair of every place by name.
+        created (dict): The number of places created for each level.
+        dry_run (bool): Whether missing places get temporary IDs instead of being inserted.
+    """
+
+    def __init__(self, connection, dry_run=False):
+        self.places = {}
+        self.created = {level: 0 for level, _, _ in LEVELS}
+        self.dry_run = dry_run
+        for level, model, parent in LEVELS:
+            parent_column = getattr(model, parent) if parent else sa.null()
+            rows = connection.execute(sa.select(model.name, model.id, parent_column))
+            self.places[level] = {name: (place_id, parent_id) for name, place_id, parent_id in rows}
+
+    def resolve(self, connection, record):
+        """
+        Returns the IDs of the places of a record, creating the missing ones.
+
+        Args:
+            connection (Connection): The connection to insert the new places with.
+            record (dict): The restaurant record.
+
+        Returns:
+            dict: The place IDs, keyed by the restaurant foreign key names.
+
+        Raises:
+            RecordError: If a place name is missing, or exists with a different parent.
+        """
+        ids = {}
+        parent_id = None
+        for level, model, parent in LEVELS:
+            name = str(record.get(level) or "").strip()
+            if not name:
+                raise RecordError("missing {}".format(level))
+            known = self.places[level].get(name)
+            if known is None:
+                if self.dry_run:
+                    place_id = -(sum(len(places) for places in self.places.values()) + 1)
+                else:
+                    values = {"name": name, parent: parent_id} if parent else {"name": name}
+                    place_id = connection.execute(sa.insert(model).values(values)).inserted_primary_key[0]
+                self.places[level][name] = (place_id, parent_id)
+                self.created[level] += 1
+            else:
+                place_id, known_parent_id = known
+                if parent and known_parent_id != parent_id:
+                    raise RecordError("{} {!r} belongs to another {}".format(level, name, parent[: -len("_id")]))
+            ids["{}_id".format(level)] = place_id
+            parent_id = place_id
+        return ids
+
+
+def insert_restaurants(connection, rows):
+    """
+    Inserts a batch of restaurants and refreshes the data derived from them.
+
+    Must run inside the transaction of the batch, so the derived data commits with it.
+
+    Args:
+        connection (Connection): The connection to execute the statements on.
+        rows (list): The restaurant rows, as dicts of column values.
+    """
+    if not rows:
+        return
+    connection.execute(sa.insert(Restaurant), rows)
+    names = [row["name"] for row in rows]
+    RestaurantListing.refresh(connection, sa.select(Restaurant.id).where(Restaurant.name.in_(names)))
+    PlaceCount.apply(connection, PlaceCount.deltas(rows))
+
+
+def existing_names(connection, names):
+    """
+    Returns which of some restaurant names are already taken.
+
+    Args:
+        connection (Connection): The connection to execute the query on.
+        names (list): The names to check.
+
+    Returns:
+        set: The names already in use.
+    """
+    return set(connection.scalars(sa.select(Restaurant.name).where(Restaurant.name.in_(names))))
+
+
+def import_restaurants(connection, records, batch_size=5000, dry_run=False, progress=None):
+    """
+    Imports restaurant records, one transaction per batch.
+
+    Records with missing fields, inconsistent places or names already in use are skipped.
+
+    Args:
+        connection (Connection): The connection to import with, outside any transaction.
+        records (iterable): The (line number, record) pairs to import.
+        batch_size (int): The number of records per batch.
+        dry_run (bool): Whether to only validate the records, without writing anything.
+        progress (callable, optional): Called after each batch with the running statistics.
+
+    Returns:
+        dict: The statistics: records read, restaurants inserted, places created per level,
+        records skipped, and the first MAX_REPORTED_ERRORS errors as (line number, reason) pairs.
+    """
+    stats = {"read": 0, "inserted": 0, "created": {}, "skipped": 0, "errors": []}
+    resolver = PlaceResolver(connection, dry_run=dry_run)
+    connection.commit()
+    # Names used by earlier batches are found in the database, except when nothing is written
+    seen = set()
+    for batch in batched(records, batch_size):
+        if not dry_run:
+            seen = set()
+        created = dict(resolver.created)
+        with connection.begin() as transaction:
+            taken = existing_names(connection, [str(record.get("name") or "").strip() for _, record in batch])
+            rows = []
+            for number, record in batch:
+                stats["read"] += 1
+                name = str(record.get("name") or "").strip()
+                address = str(record.get("address") or "").strip()
+                try:
+                    if not name or not address:
+                        raise RecordError("missing name or address")
+                    if name in taken or name in seen:
+                        raise RecordError("restaurant {!r} already exists".format(name))
+                    rows.append({"name": name, "address": address, **resolver.resolve(connection, record)})
+                    seen.add(name)
+                except RecordError as error:
+                    stats["skipped"] += 1
+                    if len(stats["errors"]) < MAX_REPORTED_ERRORS:
+                        stats["errors"].append((number, str(error)))
+            if dry_run:
+                transaction.rollback()
+            else:
+                insert_restaurants(connection, rows)
+                changed = {"restaurant"} if rows else set()
+                changed.update(
+                    model.__tablename__ for level, model, _ in LEVELS if resolver.created[level] > created[level]
+                )
+                DataVersion.bump(connection, changed)
+            stats["inserted"] += len(rows)
+        stats["created"] = dict(resolver.created)
+        if progress is not None:
+            progress(stats)
+    return stats
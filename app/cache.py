@@ -0,0 +1,225 @@
+"""
+This module implements the response cache for pages served to anonymous users.
+
+The cache stores the rendered body of a page under a key made of the view, the
+locale, the view arguments and the data versions of the tables the page is built from, so
+a change to those tables makes every older entry unreachable. The backend is pluggable
+through RESPONSE_CACHE_TYPE, and the bundled LRU backend also honours a time to live.
+
+Modules:
+    functools: Provides higher-order functions and operations on callable objects.
+    threading: Provides thread synchronization primitives.
+    time: Provides time-related functions.
+    OrderedDict: Dictionary that remembers insertion order.
+    current_app: Proxy for the current application.
+    has_app_context: Function telling whether an application context is active.
+    request: Proxy for the current request.
+    session: Proxy for the current user session.
+    get_locale: Function returning the locale of the request.
+    current_user: Proxy for the current logged-in user.
+    import_string: Function to import an object from its dotted path.
+"""
+
+import functools
+import threading
+import time
+from collections import OrderedDict
+
+from flask import current_app, has_app_context, request, session
+from flask_babel import get_locale
+from flask_login import current_user
+from werkzeug.utils import import_string
+
+
+class NullCache:
+    """
+    Cache backend that stores nothing, used to disable the cache.
+    """
+
+    def __init__(self, app=None):
+        pass
+
+    def get(self, key):
+        """
+        Returns a cached value.
+
+        Args:
+            key (str): The cache key.
+
+        Returns:
+            object: Always None.
+        """
+        return None
+
+    def set(self, key, value):
+        """
+        Stores a value.
+
+        Args:
+            key (str): The cache key.
+            value (object): The value to store.
+        """
+
+    def clear(self):
+        """
+        Removes every value.
+        """
+
+
+class LRUCache(NullCache):
+    """
+    Thread-safe, bounded in-memory cache backend evicting the least recently used values.
+
+    Attributes:
+        maxsize (int): The maximum number of values kept.
+        ttl (float): Seconds a value stays valid.
+    """
+
+    def __init__(self, app=None, maxsize=None, ttl=None):
+        super().__init__(app)
+        config = app.config if app is not None else {}
+        self.maxsize = maxsize if maxsize is not None else config.get("RESPONSE_CACHE_SIZE", 256)
+        self.ttl = ttl if ttl is not None else config.get("RESPONSE_CACHE_TTL", 60)
+        self._values = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """
+        Returns a cached value, if it has not expired.
+
+        Args:
+            key (str): The cache key.
+
+        Returns:
+            object: The value, or None if it is missing or expired.
+        """
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                return None
+            expires, value = entry
+            if expires < time.monotonic():
+                del self._values[key]
+                return None
+            self._values.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        """
+        Stores a value, evicting the least recently used ones if the cache is full.
+
+        Args:
+            key (str): The cache key.
+            value (object): The value to store.
+        """
+        with self._lock:
+            self._values[key] = (time.monotonic() + self.ttl, value)
+            self._values.move_to_end(key)
+            while len(self._values) > self.maxsize:
+                self._values.popitem(last=False)
+
+    def clear(self):
+        """
+        Removes every value.
+        """
+        with self._lock:
+            self._values.clear()
+
+
+BACKENDS = {"null": NullCache, "lru": LRUCache}
+
+
+class ResponseCache:
+    """
+    Flask extension caching the pages served to anonymous users.
+
+    The cache backend of each application is kept in its ``extensions``, so applications
+    sharing the process do not share their pages.
+    """
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """
+        Creates the cache backend for an application.
+
+        The backend is configured by RESPONSE_CACHE_TYPE, either a name from BACKENDS or the
+        dotted path of a backend class.
+
+        Args:
+            app (Flask): The application.
+        """
+        from app.versioning import data_changed  # pylint: disable=import-outside-toplevel
+
+        backend = app.config.get("RESPONSE_CACHE_TYPE", "lru")
+        backend_class = BACKENDS.get(backend) or import_string(backend)
+        app.extensions["response_cache"] = backend_class(app)
+        data_changed.connect(self.clear)
+
+    @property
+    def backend(self):
+        """
+        NullCache: The cache backend of the current application.
+        """
+        return current_app.extensions["response_cache"]
+
+    def clear(self, sender=None, **kwargs):
+        """
+        Removes every cached page of the current application.
+
+        Accepts and ignores a sender and keyword arguments, so it can be connected to signals.
+        Does nothing outside an application context.
+        """
+        if has_app_context():
+            self.backend.clear()
+
+    def cached(self, *tables, key_args=()):
+        """
+        Decorator caching the page returned by a view to anonymous users.
+
+        Authenticated users and requests with pending flash messages always get a freshly
+        rendered page.
+
+        Args:
+            *tables (str): The names of the tables the view reads.
+            key_args (tuple): The form fields, besides the view arguments, the page depends on.
+
+        Returns:
+            function: The decorator.
+        """
+
+        def decorator(view):
+            @functools.wraps(view)
+            def wrapper(*args, **kwargs):
+                from app.versioning import data_versions  # pylint: disable=import-outside-toplevel
+
+                if current_user.is_authenticated or "_flashes" in session:
+                    return view(*args, **kwargs)
+
+                versions = data_versions(tables)
+                key = "\0".join(
+                    [
+                        request.endpoint,
+                        str(get_locale()),
+                        repr(sorted(kwargs.items())),
+                        repr([request.values.get(name) for name in key_args]),
+                        repr([versions[name][0] for name in tables]),
+                    ]
+                )
+                cached = self.backend.get(key)
+                if cached is not None:
+                    response = current_app.response_class(cached, mimetype="text/html")
+                    response.headers["X-Cache"] = "HIT"
+                    return response
+
+                response = current_app.make_response(view(*args, **kwargs))
+                if response.status_code == 200 and response.mimetype == "text/html" and not response.is_streamed:
+                    self.backend.set(key, response.get_data())
+                response.headers["X-Cache"] = "MISS"
+                return response
+
+            return wrapper
+
+        return decorator
@@ -1,21 +1,61 @@
 """
-This module defines the command-line interface (CLI) commands for translation and localization.
+This module defines the command-line interface (CLI) commands for translation, localization
+and data management.
 
-It includes commands to initialize, update, and compile translations using Flask-Babel and Click.
+It includes commands to initialize, update, and compile translations with the Babel API,
+to profile the startup of a worker, to build the static assets, to benchmark password
+verification, to bulk import, export and generate restaurants, and to copy a SQLite database to its
+replica.
 
 Modules:
+    json: Provides JSON encoding and decoding.
     os: Provides a way of using operating system dependent functionality.
+    sqlite3: Provides the SQLite database driver.
+    subprocess: Provides the running of other programs.
+    sys: Provides access to the standard streams.
+    time: Provides time-related functions.
+    ThreadPoolExecutor: Pool of threads executing calls asynchronously.
     click: A package for creating command-line interfaces.
     Blueprint: Flask class for creating blueprints.
+    current_app: Proxy for the current application.
+    check_password_hash, generate_password_hash: Functions for password hashing.
+    db: SQLAlchemy database instance.
+    i18n: Translation pipeline on top of the Babel API.
+    assets: Static asset pipeline.
+    Overloaded, login_guard: Extension verifying passwords in a bounded thread pool, and its overload error.
+    bulk: Bulk loading of restaurants and places.
+    export: Streaming export of restaurants.
+    DataVersion: Model storing the version counters.
+    PlaceCount: Model counting the restaurants in each place.
+    REPLICA: Name of the bind of the read-only replica.
+    generate: Function generating synthetic places and restaurants.
 """
 
+import json
 import os
+import sqlite3
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
 
 import click
-from flask import Blueprint
+from flask import Blueprint, current_app
+from werkzeug.security import check_password_hash, generate_password_hash
+
+from app import db, i18n
+from app.assets import BUNDLES, build
+from app.auth.protection import Overloaded, login_guard
+from app.bulk import import_restaurants, read_records
+from app.export import FORMATS, export_restaurants
+from app.models import DataVersion, PlaceCount
+from app.routing import REPLICA
+from app.seed import seed as generate
 
 bp = Blueprint("cli", __name__, cli_group=None)
 
+EXTRACT_CACHE = "babel-extract.json"
+
 
 @bp.cli.group()
 def translate():
@@ -27,6 +67,45 @@ def translate():
     pass
 
 
+def _extract_template():
+    """
+    Extracts the messages of the application into a template in the instance folder.
+
+    Returns:
+        str: The path of the template.
+    """
+    os.makedirs(current_app.instance_path, exist_ok=True)
+    started = time.perf_counter()
+    catalog, parsed, reused = i18n.extract(
+        os.path.dirname(current_app.root_path),
+        os.path.join(os.path.dirname(current_app.root_path), "babel.cfg"),
+        os.path.join(current_app.instance_path, EXTRACT_CACHE),
+    )
+    template = os.path.join(current_app.instance_path, "messages.pot")
+    i18n.write_template(catalog, template)
+    click.echo(
+        "{} messages extracted from {} files parsed and {} cached in {:.2f}s".format(
+            len(catalog), parsed, reused, time.perf_counter() - started
+        )
+    )
+    return template
+
+
+def _locales(translations):
+    """
+    Returns the languages with a catalog.
+
+    Args:
+        translations (str): The translations directory.
+
+    Returns:
+        list: The language codes.
+    """
+    return sorted(
+        name for name in os.listdir(translations) if os.path.isdir(os.path.join(translations, name, "LC_MESSAGES"))
+    )
+
+
 @translate.command()
 @click.argument("lang")
 def init(lang):
@@ -38,11 +117,12 @@ def init(lang):
     Args:
         lang (str): The language code to initialize.
     """
-    if os.system("pybabel extract -F babel.cfg -k _l -o messages.pot ."):
-        raise RuntimeError("extract command failed")
-    if os.system("pybabel init -i messages.pot -d app/translations -l " + lang):
-        raise RuntimeError("init command failed")
-    os.remove("messages.pot")
+    template = _extract_template()
+    try:
+        path = i18n.init_locale(template, os.path.join(current_app.root_path, "translations"), lang)
+    finally:
+        os.remove(template)
+    click.echo("{}: created {}".format(lang, path))
 
 
 @translate.command()
@@ -50,21 +130,349 @@ def update():
     """
     Update all languages.
 
-    Extracts messages and updates all existing languages for translation.
+    Extracts messages, parsing only the files changed since the last run, and merges them
+    into every existing language, one process per language.
     """
-    if os.system("pybabel extract -F babel.cfg -k _l -o messages.pot ."):
-        raise RuntimeError("extract command failed")
-    if os.system("pybabel update -i messages.pot -d app/translations"):
-        raise RuntimeError("update command failed")
-    os.remove("messages.pot")
+    translations = os.path.join(current_app.root_path, "translations")
+    template = _extract_template()
+    try:
+        for summary in i18n.for_each_locale(i18n.update_locale, _locales(translations), template, translations):
+            click.echo(summary)
+    finally:
+        os.remove(template)
 
 
 @translate.command()
-def compile():
+@click.option("--check", is_flag=True, help="Skip the languages whose catalog did not change since it was compiled.")
+def compile(check):
     """
     Compile all languages.
 
-    Compiles all translations into binary format.
+    Compiles all translations into binary format, one process per language.
+
+    Args:
+        check (bool): Whether to skip the catalogs older than their compiled version.
+    """
+    translations = os.path.join(current_app.root_path, "translations")
+    for summary in i18n.for_each_locale(i18n.compile_locale, _locales(translations), translations, check=check):
+        click.echo(summary)
+
+
+PROFILE_SCRIPT = """
+import json, time
+started = time.perf_counter()
+from app import create_app
+from config import Config
+imported = time.perf_counter() - started
+Config.PRELOAD_APP = {preload}
+app = create_app(Config)
+print(json.dumps({{"imports": imported, "phases": app.extensions["startup_profile"].phases}}))
+"""
+
+
+@bp.cli.command("startup-profile")
+@click.option("--preload/--no-preload", default=True, show_default=True, help="Run the warm-up phases.")
+@click.option("--imports", "slowest", default=15, show_default=True, help="Number of slowest imports to list.")
+def startup_profile(preload, slowest):
+    """
+    Report the time spent starting a worker.
+
+    Starts the application in a new interpreter, as a worker would, and reports the time
+    spent importing the code and in each phase of create_app, followed by the modules that
+    took the longest to import on their own.
+
+    Args:
+        preload (bool): Whether to run the warm-up phases.
+        slowest (int): The number of slowest imports to list.
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", PROFILE_SCRIPT.format(preload=preload)],
+        cwd=os.path.dirname(current_app.root_path),
+        capture_output=True,
+        text=True,
+        check=False,
+    )
+    if result.returncode:
+        raise click.ClickException("Startup failed:\n" + result.stderr[-2000:])
+    profile = json.loads(result.stdout.strip().splitlines()[-1])
+
+    phases = [("imports", profile["imports"])] + [tuple(phase) for phase in profile["phases"]]
+    for name, seconds in phases:
+        click.echo("{:<20} {:>9.1f} ms".format(name, seconds * 1000))
+    click.echo("{:<20} {:>9.1f} ms".format("total", sum(seconds for _, seconds in phases) * 1000))
+
+    imports = []
+    for line in result.stderr.splitlines():
+        if line.startswith("import time:") and "|" in line and "[us]" not in line:
+            own, cumulative, module = (field.strip() for field in line[len("import time:") :].split("|"))
+            imports.append((int(own), int(cumulative), module))
+    click.echo("\n{:<44} {:>9} {:>12}".format("slowest imports", "self", "cumulative"))
+    for own, cumulative, module in sorted(imports, reverse=True)[:slowest]:
+        click.echo("{:<44} {:>6.1f} ms {:>9.1f} ms".format(module, own / 1000, cumulative / 1000))
+
+
+@bp.cli.group()
+def assets():
+    """
+    Static asset commands.
+
+    This group contains commands for building the static assets.
+    """
+    pass
+
+
+@assets.command("build")
+@click.option("--clean", is_flag=True, help="Remove the files of earlier builds.")
+def build_assets(clean):
+    """
+    Build the static assets.
+
+    Bundles and minifies the stylesheets and scripts, and writes every static file with a
+    content digest in its name, along with a gzip-compressed copy and the manifest the
+    application reads at startup.
+
+    Args:
+        clean (bool): Whether to remove the files of earlier builds.
+    """
+    static_folder = current_app.static_folder
+    manifest = build(static_folder, clean=clean)
+    for bundle in BUNDLES:
+        path = os.path.join(static_folder, manifest[bundle])
+        compressed = path + ".gz"
+        click.echo(
+            "{} -> {} ({} bytes, {} gzipped)".format(
+                bundle,
+                manifest[bundle],
+                os.path.getsize(path),
+                os.path.getsize(compressed) if os.path.exists(compressed) else "not",
+            )
+        )
+    click.echo("{} files built".format(len(manifest)))
+
+
+@bp.cli.group()
+def passwords():
+    """
+    Password hashing commands.
+
+    This group contains commands for tuning the verification of password hashes.
+    """
+    pass
+
+
+@passwords.command()
+@click.option("--method", help="Hash method, such as scrypt:32768:8:1. Defaults to the one used for new passwords.")
+@click.option("--count", default=20, show_default=True, help="Number of verifications per run.")
+@click.option("--clients", type=int, help="Concurrent login attempts. Defaults to LOGIN_HASH_QUEUE.")
+def benchmark(method, count, clients):
+    """
+    Measure the password verification throughput.
+
+    Verifies a password hash repeatedly, first in the current thread and then through the
+    login pool from concurrent clients, as login requests do, and reports the verifications
+    per second a worker can sustain and the attempts the pool rejected as overloaded.
+
+    Args:
+        method (str): The hash method, werkzeug's default if omitted.
+        count (int): The number of verifications per run.
+        clients (int): The number of concurrent login attempts, LOGIN_HASH_QUEUE if omitted.
+    """
+    password_hash = generate_password_hash("benchmark", **({"method": method} if method else {}))
+    click.echo("Method: {}".format(password_hash.split("$", 1)[0]))
+
+    started = time.perf_counter()
+    for _ in range(count):
+        check_password_hash(password_hash, "benchmark")
+    elapsed = time.perf_counter() - started
+    click.echo("1 thread: {:.1f} verifications/s, {:.1f} ms each".format(count / elapsed, elapsed / count * 1000))
+
+    def attempt(_):
+        try:
+            return login_guard.verify(password_hash, "benchmark")
+        except Overloaded:
+            return None
+
+    clients = clients or login_guard.max_pending
+    with ThreadPoolExecutor(clients) as executor:
+        started = time.perf_counter()
+        outcomes = list(executor.map(attempt, range(count)))
+        elapsed = time.perf_counter() - started
+    verified = sum(outcome is not None for outcome in outcomes)
+    click.echo(
+        "Login pool, {} threads, {} clients: {:.1f} verifications/s, {} rejected as overloaded".format(
+            login_guard.workers, clients, verified / elapsed, count - verified
+        )
+    )
+
+
+@bp.cli.group()
+def data():
+    """
+    Data management commands.
+
+    This group contains commands for loading and maintaining restaurant data.
+    """
+    pass
+
+
+@data.command("import")
+@click.argument("path", type=click.Path(exists=True, dir_okay=False))
+@click.option("--format", "file_format", type=click.Choice(["csv", "ndjson"]), help="File format, guessed from the extension by default.")
+@click.option("--batch-size", default=5000, show_default=True, help="Number of records inserted per transaction.")
+@click.option("--dry-run", is_flag=True, help="Validate the records without writing anything.")
+def import_(path, file_format, batch_size, dry_run):
+    """
+    Import restaurants from a CSV or NDJSON file.
+
+    Each record holds the name, address, city, province, region and country of a restaurant.
+    Missing places are created, records with names already in use are skipped.
+
+    Args:
+        path (str): The path of the file to import.
+        file_format (str): The format of the file, "csv" or "ndjson".
+        batch_size (int): The number of records inserted per transaction.
+        dry_run (bool): Whether to only validate the records.
+    """
+    started = time.monotonic()
+
+    def progress(stats):
+        elapsed = time.monotonic() - started
+        click.echo(
+            "{} read, {} inserted, {} skipped ({:.0f} records/s)".format(
+                stats["read"], stats["inserted"], stats["skipped"], stats["read"] / elapsed if elapsed else 0
+            ),
+            err=True,
+        )
+
+    with db.engine.connect() as connection:
+        stats = import_restaurants(
+            connection, read_records(path, file_format), batch_size=batch_size, dry_run=dry_run, progress=progress
+        )
+
+    for number, error in stats["errors"]:
+        click.echo("line {}: {}".format(number, error), err=True)
+    created = ", ".join("{} {}".format(count, level) for level, count in stats["created"].items())
+    click.echo(
+        "{}{} restaurants imported, {} skipped, places created: {} in {:.1f}s".format(
+            "Dry run: " if dry_run else "", stats["inserted"], stats["skipped"], created, time.monotonic() - started
+        )
+    )
+
+
+@data.command()
+@click.argument("output", default="-")
+@click.option("--format", "file_format", type=click.Choice(list(FORMATS)), default="csv", show_default=True, help="Output format.")
+@click.option("--gzip", "compress", is_flag=True, help="Compress the output with gzip.")
+@click.option("--country", type=int, help="Only export the restaurants of this country ID.")
+@click.option("--region", type=int, help="Only export the restaurants of this region ID.")
+@click.option("--province", type=int, help="Only export the restaurants of this province ID.")
+@click.option("--city", type=int, help="Only export the restaurants of this city ID.")
+@click.option("--chunk-size", default=5000, show_default=True, help="Number of rows read and written at a time.")
+def export(output, file_format, compress, chunk_size, **filters):
+    """
+    Export restaurants to a CSV, NDJSON or columnar file.
+
+    Rows are streamed from the database, so memory use does not depend on the export size.
+    OUTPUT defaults to the standard output.
+
+    Args:
+        output (str): The path of the file to write, or "-" for the standard output.
+        file_format (str): The output format.
+        compress (bool): Whether to gzip the output.
+        chunk_size (int): The number of rows read and written at a time.
+        **filters: Place IDs to restrict the export to, keyed by level.
+    """
+    with db.engine.connect() as connection:
+        chunks = export_restaurants(
+            connection, file_format=file_format, compress=compress, filters=filters, chunk_size=chunk_size
+        )
+        if output == "-":
+            for chunk in chunks:
+                sys.stdout.buffer.write(chunk)
+            sys.stdout.buffer.flush()
+        else:
+            with open(output, "wb") as file:
+                for chunk in chunks:
+                    file.write(chunk)
+
+
+@data.command()
+@click.option("--seed", "seed_value", default=0, show_default=True, help="Seed of the generated data.")
+@click.option("--countries", default=5, show_default=True, help="Number of countries.")
+@click.option("--regions", default=5, show_default=True, help="Regions per country.")
+@click.option("--provinces", default=4, show_default=True, help="Provinces per region.")
+@click.option("--cities", default=50, show_default=True, help="Cities per province.")
+@click.option("--restaurants", default=100000, show_default=True, help="Total number of restaurants.")
+@click.option("--chunk-size", default=50000, show_default=True, help="Number of restaurants inserted per transaction.")
+def seed(seed_value, countries, regions, provinces, cities, restaurants, chunk_size):
+    """
+    Generate a synthetic place hierarchy and restaurants.
+
+    Builds a deterministic Country, Region, Province, City and Restaurant tree with the
+    given fan-out per level, spreading the restaurants unevenly over the cities. Running
+    it again adds a new tree with new unique names.
+
+    Args:
+        seed_value (int): The seed of the generated data.
+        countries (int): The number of countries.
+        regions (int): The number of regions per country.
+        provinces (int): The number of provinces per region.
+        cities (int): The number of cities per province.
+        restaurants (int): The total number of restaurants.
+        chunk_size (int): The number of restaurants inserted per transaction.
+    """
+    started = time.monotonic()
+
+    def progress(inserted):
+        elapsed = time.monotonic() - started
+        click.echo(
+            "{} of {} restaurants inserted ({:.0f} restaurants/s)".format(
+                inserted, restaurants, inserted / elapsed if elapsed else 0
+            ),
+            err=True,
+        )
+
+    fan_out = {"country": countries, "region": regions, "province": provinces, "city": cities}
+    with db.engine.connect() as connection:
+        created = generate(
+            connection, fan_out, restaurants, seed_value=seed_value, chunk_size=chunk_size, progress=progress
+        )
+    click.echo(
+        "Created {} in {:.1f}s".format(
+            ", ".join("{} {}".format(count, level) for level, count in created.items()), time.monotonic() - started
+        )
+    )
+
+
+@data.command()
+def recount():
+    """
+    Rebuild the restaurant counters of every place.
+
+    Recomputes the counters from the restaurants in a single transaction, repairing any drift,
+    and bumps their data version so the pages showing them are not revalidated.
+    """
+    with db.engine.begin() as connection:
+        PlaceCount.rebuild(connection)
+        DataVersion.bump(connection, {PlaceCount.__tablename__})
+    click.echo("Place counters rebuilt")
+
+
+@data.command()
+def replicate():
+    """
+    Copy the primary SQLite database over its replica.
+
+    Stands in for replication when the replica bind is a local SQLite file, so read/write
+    routing can be tried with two files. The copy is consistent even while the primary is
+    being written to.
     """
-    if os.system("pybabel compile -d app/translations"):
-        raise RuntimeError("compile command failed")
+    replica = db.engines.get(REPLICA)
+    if replica is None:
+        raise click.ClickException("No replica bind configured, set DATABASE_REPLICA_URL")
+    if db.engine.dialect.name != "sqlite" or replica.dialect.name != "sqlite":
+        raise click.ClickException("Only SQLite databases can be replicated by this command")
+    with db.engine.connect() as source, sqlite3.connect(replica.url.database) as target:
+        source.connection.driver_connection.backup(target)
+    replica.dispose()
+    click.echo("Replica {} updated".format(replica.url.database))
@@ -0,0 +1,160 @@
+"""
+This module minifies and compresses the dynamic responses of the application.
+
+An after-request stage minifies HTML pages with flask-minify's parser and compresses HTML,
+JSON and other text responses with gzip or deflate, whichever the client prefers through
+Accept-Encoding. Both results are cached under an xxhash of the raw body, so a page or a
+page of results served again, for instance from the response cache, is neither minified
+nor compressed twice. Small bodies gain nothing and streamed bodies cannot be rewritten,
+so both are left alone. The CPU time spent is reported in the Server-Timing header.
+
+Modules:
+    time: Provides time-related functions.
+    zlib: Provides gzip and deflate compression.
+    xxhash: Provides fast non-cryptographic hashing.
+    request: Proxy for the current request.
+    Parser: flask-minify parser minifying HTML.
+    LRUCache: Bounded in-memory cache with a time to live.
+"""
+
+import time
+import zlib
+
+import xxhash
+from flask import request
+from flask_minify.parsers import Parser
+
+from app.cache import LRUCache
+
+COMPRESSIBLE = frozenset(
+    ("text/html", "text/plain", "text/css", "text/csv", "text/javascript", "application/json", "application/x-ndjson")
+)
+ENCODINGS = ("gzip", "deflate")
+# Window bits of the zlib container of each content coding
+WBITS = {"gzip": 31, "deflate": 15}
+
+
+def compress(body, encoding, level=6):
+    """
+    Compresses a body with a content coding.
+
+    Args:
+        body (bytes): The body.
+        encoding (str): "gzip" or "deflate".
+        level (int): The compression level, from 1 to 9.
+
+    Returns:
+        bytes: The compressed body.
+    """
+    compressor = zlib.compressobj(level, zlib.DEFLATED, WBITS[encoding])
+    return compressor.compress(body) + compressor.flush()
+
+
+class ResponseCompressor:
+    """
+    Flask extension minifying and compressing the responses of an application.
+
+    Attributes:
+        parser (Parser): The HTML minifier.
+        cache (LRUCache): The minified and compressed bodies, by kind and digest of the raw body.
+        minify (bool): Whether to minify HTML pages, set by MINIFY_HTML.
+        min_size (int): The size below which bodies are sent as they are, set by COMPRESS_MIN_SIZE.
+        level (int): The compression level, set by COMPRESS_LEVEL.
+    """
+
+    def __init__(self, app=None):
+        self.parser = Parser(fail_safe=True, go=False)
+        self.cache = LRUCache(maxsize=256, ttl=3600)
+        self.minify = True
+        self.min_size = 500
+        self.level = 6
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """
+        Registers the after-request stage of an application.
+
+        Args:
+            app (Flask): The application.
+        """
+        self.cache = LRUCache(maxsize=app.config.get("COMPRESS_CACHE_SIZE", 256), ttl=3600)
+        self.minify = app.config.get("MINIFY_HTML", True)
+        self.min_size = app.config.get("COMPRESS_MIN_SIZE", 500)
+        self.level = app.config.get("COMPRESS_LEVEL", 6)
+        app.extensions["response_compressor"] = self
+        app.after_request(self.process)
+
+    def _cached(self, kind, digest, function, *args):
+        """
+        Returns a transformed body from the cache, computing it if missing.
+
+        Args:
+            kind (str): The transformation, "html" or a content coding.
+            digest (bytes): The digest of the raw body.
+            function (callable): The transformation.
+            *args: The arguments of the transformation.
+
+        Returns:
+            bytes: The transformed body.
+        """
+        key = (kind, digest)
+        value = self.cache.get(key)
+        if value is None:
+            value = function(*args)
+            self.cache.set(key, value)
+        return value
+
+    def process(self, response):
+        """
+        Minifies and compresses a response, if worth it.
+
+        A compressed response keeps its ETag as a weak one, since the compressed bytes
+        differ from the identity representation.
+
+        Args:
+            response (Response): The response.
+
+        Returns:
+            Response: The same response.
+        """
+        if response.mimetype not in COMPRESSIBLE:
+            return response
+        response.vary.add("Accept-Encoding")
+        if (
+            response.status_code != 200
+            or response.direct_passthrough
+            or response.is_streamed
+            or "Content-Encoding" in response.headers
+        ):
+            return response
+        body = response.get_data()
+        if len(body) < self.min_size:
+            return response
+
+        started = time.thread_time()
+        digest = xxhash.xxh3_64_digest(body)
+        if self.minify and response.mimetype == "text/html":
+            body = self._cached("html", digest, self._minify_html, body)
+        encoding = request.accept_encodings.best_match(ENCODINGS)
+        if encoding is not None:
+            body = self._cached(encoding, digest, compress, body, encoding, self.level)
+            response.content_encoding = encoding
+            etag, weak = response.get_etag()
+            if etag and not weak:
+                response.set_etag(etag, weak=True)
+        response.set_data(body)
+        response.headers.add("Server-Timing", "compress;dur={:.2f}".format((time.thread_time() - started) * 1000))
+        return response
+
+    def _minify_html(self, body):
+        """
+        Minifies an HTML page.
+
+        Args:
+            body (bytes): The page, UTF-8 encoded.
+
+        Returns:
+            bytes: The minified page.
+        """
+        return self.parser.minify(body.decode(), "html").encode()
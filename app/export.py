@@ -0,0 +1,184 @@
+"""
+This module implements the streaming export of restaurants.
+
+Restaurants are read with a Core select joining the four place tables through a
+server-side cursor, and written one chunk at a time as CSV, NDJSON or a columnar format,
+optionally gzip-compressed, so memory stays constant whatever the size of the export.
+
+The columnar format is a Parquet-like layout written as JSON lines: a header line with the
+column names, then one line per row group holding the values of each column as arrays.
+
+Modules:
+    csv: Provides CSV reading and writing.
+    io: Provides in-memory text streams.
+    json: Provides JSON encoding and decoding.
+    zlib: Provides gzip compatible compression.
+    sqlalchemy: SQLAlchemy library for database operations.
+    models: Contains the database models for the application.
+"""
+
+import csv
+import io
+import json
+import zlib
+
+import sqlalchemy as sa
+
+from app.models import City, Country, Province, Region, Restaurant
+
+FORMATS = {
+    "csv": "text/csv",
+    "ndjson": "application/x-ndjson",
+    "columnar": "application/x-ndjson",
+}
+FILTERS = {
+    "country": Restaurant.country_id,
+    "region": Restaurant.region_id,
+    "province": Restaurant.province_id,
+    "city": Restaurant.city_id,
+}
+
+
+def export_query(filters=None):
+    """
+    Builds the query selecting the exported restaurants.
+
+    Args:
+        filters (dict, optional): Place IDs to restrict the export to, keyed by level.
+
+    Returns:
+        Select: The select statement, in restaurant ID order.
+    """
+    query = (
+        sa.select(
+            Restaurant.id,
+            Restaurant.name,
+            Restaurant.address,
+            City.name.label("city"),
+            Province.name.label("province"),
+            Region.name.label("region"),
+            Country.name.label("country"),
+            Restaurant.city_id,
+            Restaurant.province_id,
+            Restaurant.region_id,
+            Restaurant.country_id,
+        )
+        .join(City, Restaurant.city_id == City.id)
+        .join(Province, Restaurant.province_id == Province.id)
+        .join(Region, Restaurant.region_id == Region.id)
+        .join(Country, Restaurant.country_id == Country.id)
+        .order_by(Restaurant.id)
+    )
+    for level, place_id in (filters or {}).items():
+        if place_id is not None:
+            query = query.where(FILTERS[level] == place_id)
+    return query
+
+
+def partitions(executor, filters=None, chunk_size=1000):
+    """
+    Reads the exported restaurants one chunk at a time.
+
+    Args:
+        executor (Session | Connection): What to execute the query with.
+        filters (dict, optional): Place IDs to restrict the export to, keyed by level.
+        chunk_size (int): The number of rows read per chunk.
+
+    Yields:
+        tuple: The column names first, then lists of rows.
+    """
+    result = executor.execute(export_query(filters).execution_options(yield_per=chunk_size))
+    yield tuple(result.keys())
+    yield from result.partitions()
+
+
+def _csv_chunks(chunks):
+    """
+    Writes chunks of rows as CSV.
+
+    Args:
+        chunks (iterator): The column names, then lists of rows.
+
+    Yields:
+        str: The CSV text, one chunk at a time.
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(next(chunks))
+    for rows in chunks:
+        writer.writerows(rows)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    yield buffer.getvalue()
+
+
+def _ndjson_chunks(chunks):
+    """
+    Writes chunks of rows as JSON objects, one per line.
+
+    Args:
+        chunks (iterator): The column names, then lists of rows.
+
+    Yields:
+        str: The NDJSON text, one chunk at a time.
+    """
+    columns = next(chunks)
+    for rows in chunks:
+        yield "".join(json.dumps(dict(zip(columns, row)), ensure_ascii=False) + "\n" for row in rows)
+
+
+def _columnar_chunks(chunks):
+    """
+    Writes chunks of rows as columnar row groups.
+
+    Args:
+        chunks (iterator): The column names, then lists of rows.
+
+    Yields:
+        str: The header line, then one line per row group.
+    """
+    columns = next(chunks)
+    yield json.dumps({"format": "columnar", "version": 1, "columns": columns}) + "\n"
+    for rows in chunks:
+        values = {column: list(values) for column, values in zip(columns, zip(*rows))}
+        yield json.dumps({"rows": len(rows), "columns": values}, ensure_ascii=False) + "\n"
+
+
+WRITERS = {"csv": _csv_chunks, "ndjson": _ndjson_chunks, "columnar": _columnar_chunks}
+
+
+def _gzip(chunks):
+    """
+    Compresses a stream of bytes in the gzip format.
+
+    Args:
+        chunks (iterable): The uncompressed bytes.
+
+    Yields:
+        bytes: The compressed bytes.
+    """
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
+def export_restaurants(executor, file_format="csv", compress=False, filters=None, chunk_size=1000):
+    """
+    Exports restaurants as a stream of bytes.
+
+    Args:
+        executor (Session | Connection): What to execute the query with.
+        file_format (str): One of FORMATS.
+        compress (bool): Whether to gzip the output.
+        filters (dict, optional): Place IDs to restrict the export to, keyed by level.
+        chunk_size (int): The number of rows read and written per chunk.
+
+    Returns:
+        iterator: The exported bytes, one chunk at a time.
+    """
+    chunks = (text.encode() for text in WRITERS[file_format](partitions(executor, filters, chunk_size)) if text)
+    return _gzip(chunks) if compress else chunks
@@ -0,0 +1,282 @@
+"""
+This module keeps an in-process, immutable snapshot of the place hierarchy.
+
+Countries, regions, provinces and cities are reference data that almost never change, so
+each worker loads them once into compact records with parent and child indexes, and
+serves every lookup from memory. The snapshot is rebuilt after a commit touching any of
+the place tables, and after HIERARCHY_CACHE_TTL seconds so that workers which did not
+make the change eventually catch up with it. Each application keeps its own snapshot in
+``app.extensions["hierarchy"]``.
+
+Modules:
+    threading: Provides thread synchronization primitives.
+    time: Provides time-related functions.
+    sqlalchemy: SQLAlchemy library for database operations.
+    xxhash: Provides fast non-cryptographic hashing.
+    current_app: Proxy for the current application.
+    has_app_context: Function telling whether an application context is active.
+    db: SQLAlchemy database instance.
+    models: Contains the database models for the application.
+    data_changed: Signal sent after a commit changes some tables.
+"""
+
+import threading
+import time
+
+import sqlalchemy as sa
+import xxhash
+from flask import current_app, has_app_context
+
+from app import db
+from app.models import City, Country, Province, Region
+from app.versioning import data_changed
+
+LEVELS = ("country", "region", "province", "city")
+PLURALS = {"country": "countries", "region": "regions", "province": "provinces", "city": "cities"}
+MODELS = {"country": Country, "region": Region, "province": Province, "city": City}
+PARENT_COLUMNS = {"region": Region.country_id, "province": Province.region_id, "city": City.province_id}
+TABLES = frozenset(model.__tablename__ for model in MODELS.values())
+
+
+def parent_level(level):
+    """
+    Returns the level above another one.
+
+    Args:
+        level (str): The hierarchy level.
+
+    Returns:
+        str: The parent level, or None for countries.
+    """
+    index = LEVELS.index(level)
+    return LEVELS[index - 1] if index else None
+
+
+class Place:
+    """
+    Immutable record for a country, region, province or city.
+
+    Attributes:
+        level (str): The hierarchy level, one of LEVELS.
+        id (int): The ID of the place.
+        name (str): The name of the place.
+        parent_id (int, optional): The ID of the parent place, None for countries.
+    """
+
+    __slots__ = ("level", "id", "name", "parent_id")
+
+    def __init__(self, level, id, name, parent_id=None):  # pylint: disable=redefined-builtin
+        object.__setattr__(self, "level", level)
+        object.__setattr__(self, "id", id)
+        object.__setattr__(self, "name", name)
+        object.__setattr__(self, "parent_id", parent_id)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("Place records are immutable")
+
+    def __repr__(self):
+        return "<Place {} {}>".format(self.level, self.name)
+
+
+class Hierarchy:
+    """
+    Snapshot of the whole place hierarchy, indexed by ID and by parent.
+
+    Attributes:
+        places (dict): The places of each level by ID, in name order.
+        children (dict): The places of each level grouped by parent ID, in name order.
+        version (str): A digest of the snapshot contents, suitable for ETags.
+        loaded_at (float): The monotonic time at which the snapshot was loaded.
+    """
+
+    __slots__ = ("places", "children", "version", "loaded_at")
+
+    def __init__(self, places):
+        self.places = places
+        self.children = {}
+        digest = xxhash.xxh64()
+        for level, records in places.items():
+            grouped = {}
+            for place in records.values():
+                grouped.setdefault(place.parent_id, []).append(place)
+                digest.update("{}\0{}\0{}\0{}\n".format(level, place.id, place.name, place.parent_id).encode())
+            self.children[level] = {parent_id: tuple(group) for parent_id, group in grouped.items()}
+        self.version = digest.hexdigest()
+        self.loaded_at = time.monotonic()
+
+    @classmethod
+    def load(cls):
+        """
+        Loads the hierarchy from the database.
+
+        The places are read from the primary, since the snapshot is kept until the next
+        change or HIERARCHY_CACHE_TTL, well beyond the lag of a replica.
+
+        Returns:
+            Hierarchy: The new snapshot.
+        """
+        places = {}
+        for level in LEVELS:
+            model = MODELS[level]
+            parent = PARENT_COLUMNS.get(level, sa.null())
+            rows = db.session.execute(
+                sa.select(model.id, model.name, parent).order_by(model.name), bind_arguments={"bind": db.engine}
+            )
+            places[level] = {row[0]: Place(level, row[0], row[1], row[2]) for row in rows}
+        return cls(places)
+
+    def all(self, level):
+        """
+        Returns every place of a level.
+
+        Args:
+            level (str): The hierarchy level.
+
+        Returns:
+            list: The places, in name order.
+        """
+        return list(self.places[level].values())
+
+    def get(self, level, place_id):
+        """
+        Returns a place by ID.
+
+        Args:
+            level (str): The hierarchy level.
+            place_id (int): The ID of the place.
+
+        Returns:
+            Place: The place, or None if it does not exist.
+        """
+        return self.places[level].get(place_id)
+
+    def children_of(self, level, parent_id):
+        """
+        Returns the places of a level belonging to a parent.
+
+        Args:
+            level (str): The hierarchy level of the children.
+            parent_id (int): The ID of the parent place.
+
+        Returns:
+            tuple: The child places, in name order.
+        """
+        return self.children[level].get(parent_id, ())
+
+    def path(self, city_id):
+        """
+        Resolves the province, region and country a city belongs to.
+
+        Args:
+            city_id (int): The ID of the city.
+
+        Returns:
+            dict: The places of the path keyed by level, or None if the city does not exist.
+        """
+        place = self.get("city", city_id)
+        if place is None:
+            return None
+        path = {}
+        for level in reversed(LEVELS):
+            path[level] = place
+            if level != "country":
+                place = self.get(parent_level(level), place.parent_id)
+        return path
+
+
+class _Snapshots:
+    """
+    Hierarchy snapshot of an application, kept in its ``extensions``.
+
+    Attributes:
+        current (Hierarchy, optional): The current snapshot, None until loaded or after an
+            invalidation.
+        generation (int): Incremented by every invalidation, so a load that overlapped one
+            is not kept.
+        lock (Lock): Guards the snapshot and the generation.
+        load_lock (Lock): Lets a single thread load a snapshot at a time.
+    """
+
+    def __init__(self):
+        self.current = None
+        self.generation = 0
+        self.lock = threading.Lock()
+        self.load_lock = threading.Lock()
+
+
+def _snapshots():
+    """
+    Returns the snapshot state of the current application, creating it on first use.
+
+    Returns:
+        _Snapshots: The state.
+    """
+    snapshots = current_app.extensions.get("hierarchy")
+    if snapshots is None:
+        snapshots = current_app.extensions.setdefault("hierarchy", _Snapshots())
+    return snapshots
+
+
+def get_hierarchy():
+    """
+    Returns the current hierarchy snapshot of the application, loading it if needed.
+
+    Returns:
+        Hierarchy: The snapshot.
+    """
+    snapshots = _snapshots()
+    snapshot = snapshots.current
+    ttl = current_app.config["HIERARCHY_CACHE_TTL"]
+    if snapshot is None or time.monotonic() - snapshot.loaded_at > ttl:
+        snapshot = _reload(snapshots, snapshot)
+    return snapshot
+
+
+def _reload(snapshots, stale):
+    """
+    Loads a new snapshot and swaps it in, unless another thread already did.
+
+    A snapshot is only swapped in if no invalidation happened while it was loading, since
+    it may have been read before the change that caused it; it is loaded again otherwise.
+
+    Args:
+        snapshots (_Snapshots): The snapshot state of the application.
+        stale (Hierarchy, optional): The snapshot the caller found out of date.
+
+    Returns:
+        Hierarchy: The current snapshot.
+    """
+    with snapshots.load_lock:
+        while True:
+            with snapshots.lock:
+                if snapshots.current is not None and snapshots.current is not stale:
+                    return snapshots.current
+                generation = snapshots.generation
+            snapshot = Hierarchy.load()
+            with snapshots.lock:
+                if generation == snapshots.generation:
+                    snapshots.current = snapshot
+                    return snapshot
+
+
+def invalidate():
+    """
+    Discards the snapshot of the current application, so the next lookup reloads it.
+    """
+    snapshots = _snapshots()
+    with snapshots.lock:
+        snapshots.generation += 1
+        snapshots.current = None
+
+
+@data_changed.connect
+def _invalidate_on_change(sender, tables, **kwargs):
+    """
+    Discards the snapshot of the application once a change to the place tables is committed.
+
+    Args:
+        sender (Session): The session that committed.
+        tables (frozenset): The names of the changed tables.
+    """
+    if not tables.isdisjoint(TABLES) and has_app_context():
+        invalidate()
@@ -0,0 +1,238 @@
+"""
+This module implements the translation pipeline on top of the Babel API.
+
+Messages are extracted in-process from the files selected by ``babel.cfg``, and the
+messages found in each file are kept in a cache keyed by its modification time and size,
+so only the files changed since the last run are parsed again. The catalogs of the
+languages are then updated and compiled in a pool of processes, one language per task.
+
+Modules:
+    io: Provides in-memory text streams.
+    json: Provides JSON encoding and decoding.
+    os: Provides a way of using operating system dependent functionality.
+    ProcessPoolExecutor: Pool of processes executing calls asynchronously.
+    datetime, timezone: Classes for manipulating dates and times.
+    xxhash: Provides fast non-cryptographic hashing.
+    Catalog: Babel message catalog.
+    DEFAULT_KEYWORDS: The gettext functions Babel looks for by default.
+    check_and_call_extract_file: Function extracting the messages of a file.
+    parse_mapping_cfg: Function reading a Babel extraction configuration.
+    write_mo: Function writing a compiled catalog.
+    read_po, write_po: Functions reading and writing a catalog.
+    pathmatch: Function matching a path against a babel.cfg pattern.
+"""
+
+import io
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+
+import xxhash
+from babel.messages.catalog import Catalog
+from babel.messages.extract import DEFAULT_KEYWORDS, check_and_call_extract_file
+from babel.messages.frontend import parse_mapping_cfg
+from babel.messages.mofile import write_mo
+from babel.messages.pofile import read_po, write_po
+from babel.util import pathmatch
+
+KEYWORDS = {**DEFAULT_KEYWORDS, "_l": None}
+DOMAIN = "messages"
+
+
+def _catalog_path(translations, locale, extension="po"):
+    """
+    Returns the path of the catalog of a language.
+
+    Args:
+        translations (str): The translations directory.
+        locale (str): The language code.
+        extension (str): "po" for the catalog, "mo" for the compiled one.
+
+    Returns:
+        str: The path of the file.
+    """
+    return os.path.join(translations, locale, "LC_MESSAGES", "{}.{}".format(DOMAIN, extension))
+
+
+def extract(root, mapping_file, cache_file=None):
+    """
+    Extracts the translatable messages of a source tree.
+
+    Args:
+        root (str): The directory to scan, which the paths of babel.cfg are relative to.
+        mapping_file (str): The path of the extraction configuration.
+        cache_file (str, optional): The path of the extraction cache.
+
+    Returns:
+        tuple: The template catalog, and the number of files parsed and reused from the cache.
+    """
+    with open(mapping_file, encoding="utf-8") as file:
+        config = file.read()
+    method_map, options_map = parse_mapping_cfg(io.StringIO(config), mapping_file)
+    signature = xxhash.xxh64_hexdigest(config + json.dumps(sorted(KEYWORDS.items()), default=str))
+
+    cache = {}
+    if cache_file and os.path.exists(cache_file):
+        with open(cache_file, encoding="utf-8") as file:
+            stored = json.load(file)
+        if stored.get("signature") == signature:
+            cache = stored["files"]
+
+    files = {}
+    parsed = reused = 0
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames[:] = sorted(name for name in dirnames if not name.startswith((".", "_")))
+        for name in sorted(filenames):
+            path = os.path.relpath(os.path.join(dirpath, name), root).replace(os.sep, "/")
+            if not any(pathmatch(pattern, path) for pattern, _ in method_map):
+                continue
+            stat = os.stat(os.path.join(root, path))
+            entry = cache.get(path)
+            if entry is not None and entry[:2] == [stat.st_mtime_ns, stat.st_size]:
+                reused += 1
+            else:
+                messages = [
+                    [lineno, message, comments, context]
+                    for _, lineno, message, comments, context in check_and_call_extract_file(
+                        path, method_map, options_map, None, KEYWORDS, (), False, dirpath=root
+                    )
+                ]
+                entry = [stat.st_mtime_ns, stat.st_size, messages]
+                parsed += 1
+            files[path] = entry
+
+    if cache_file:
+        os.makedirs(os.path.dirname(cache_file), exist_ok=True)
+        with open(cache_file, "w", encoding="utf-8") as file:
+            json.dump({"signature": signature, "files": files}, file)
+
+    catalog = Catalog(fuzzy=False, charset="utf-8")
+    for path, (_, _, messages) in files.items():
+        for lineno, message, comments, context in messages:
+            catalog.add(
+                tuple(message) if isinstance(message, list) else message,
+                None,
+                [(path, lineno)],
+                auto_comments=comments,
+                context=context,
+            )
+    return catalog, parsed, reused
+
+
+def write_template(catalog, path):
+    """
+    Writes a template catalog.
+
+    Args:
+        catalog (Catalog): The template catalog.
+        path (str): The path of the .pot file.
+    """
+    with open(path, "wb") as file:
+        write_po(file, catalog, width=76)
+
+
+def init_locale(template_file, translations, locale):
+    """
+    Creates the catalog of a new language from the template.
+
+    Args:
+        template_file (str): The path of the .pot file.
+        translations (str): The translations directory.
+        locale (str): The language code.
+
+    Returns:
+        str: The path of the new catalog.
+    """
+    with open(template_file, "rb") as file:
+        catalog = read_po(file, locale=locale)
+    catalog.locale = locale
+    catalog.revision_date = datetime.now(timezone.utc)
+    catalog.fuzzy = False
+    path = _catalog_path(translations, locale)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as file:
+        write_po(file, catalog, width=76)
+    return path
+
+
+def update_locale(template_file, translations, locale):
+    """
+    Merges the messages of the template into the catalog of a language.
+
+    Args:
+        template_file (str): The path of the .pot file.
+        translations (str): The translations directory.
+        locale (str): The language code.
+
+    Returns:
+        str: A summary of the update.
+    """
+    path = _catalog_path(translations, locale)
+    if not os.path.exists(path):
+        return "{}: no catalog, run 'flask translate init {}'".format(locale, locale)
+    with open(template_file, "rb") as file:
+        template = read_po(file)
+    with open(path, "rb") as file:
+        catalog = read_po(file, locale=locale)
+    catalog.update(template)
+    temporary = path + ".tmp"
+    with open(temporary, "wb") as file:
+        write_po(file, catalog, width=76, ignore_obsolete=False, include_previous=False)
+    os.replace(temporary, path)
+    return "{}: updated, {} messages".format(locale, len(catalog))
+
+
+def compile_locale(translations, locale, check=False):
+    """
+    Compiles the catalog of a language.
+
+    Args:
+        translations (str): The translations directory.
+        locale (str): The language code.
+        check (bool): Whether to skip the catalog if it did not change since it was last compiled.
+
+    Returns:
+        str: A summary of the compilation, with the errors found in the catalog.
+    """
+    path = _catalog_path(translations, locale)
+    mo_path = _catalog_path(translations, locale, "mo")
+    if not os.path.exists(path):
+        return "{}: no catalog".format(locale)
+    if check and os.path.exists(mo_path) and os.stat(mo_path).st_mtime_ns >= os.stat(path).st_mtime_ns:
+        return "{}: up to date".format(locale)
+    with open(path, "rb") as file:
+        catalog = read_po(file, locale=locale)
+    if catalog.fuzzy:
+        return "{}: catalog is marked as fuzzy, not compiling it".format(locale)
+    errors = [
+        "{}: {}:{}: {}".format(locale, path, message.lineno, error)
+        for message, message_errors in catalog.check()
+        for error in message_errors
+    ]
+    temporary = mo_path + ".tmp"
+    with open(temporary, "wb") as file:
+        write_mo(file, catalog)
+    os.replace(temporary, mo_path)
+    translated = sum(1 for message in list(catalog)[1:] if message.string)
+    return "\n".join(errors + ["{}: compiled, {} of {} messages translated".format(locale, translated, len(catalog))])
+
+
+def for_each_locale(function, locales, *args, **kwargs):
+    """
+    Runs a task for every language in a pool of processes.
+
+    Args:
+        function (callable): The task, taking a language code after the positional arguments.
+        locales (list): The language codes.
+        *args: The positional arguments of the task.
+        **kwargs: The keyword arguments of the task.
+
+    Returns:
+        list: The results of the task, in the order of the languages.
+    """
+    if len(locales) < 2:
+        return [function(*args, locale, **kwargs) for locale in locales]
+    with ProcessPoolExecutor(min(len(locales), os.cpu_count() or 1)) as executor:
+        futures = [executor.submit(function, *args, locale, **kwargs) for locale in locales]
+        return [future.result() for future in futures]
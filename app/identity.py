@@ -0,0 +1,210 @@
+"""
+This module loads the logged-in user of each request from an in-process cache.
+
+Flask-Login loads the user of every request that touches ``current_user``, which every page
+does through the navigation bar. Instead of querying the User table each time, each worker
+keeps lightweight, immutable identities holding the ID, username and password fingerprint
+of recently seen users in a bounded LRU cache with a time to live. The cache is cleared
+after a commit changing the User table, and the TTL bounds how long other workers keep
+serving an identity changed elsewhere.
+
+Modules:
+    threading: Provides thread synchronization primitives.
+    current_app: Proxy for the current application.
+    has_app_context: Function telling whether an application context is active.
+    UserMixin: Flask-Login mixin for user session management.
+    db: SQLAlchemy database instance.
+    login: Flask-Login instance for user session management.
+    LRUCache: Bounded in-memory cache backend with a time to live.
+    User: User model class.
+    data_changed: Signal sent after a commit changes some tables.
+"""
+
+import threading
+
+from flask import current_app, has_app_context
+from flask_login import UserMixin
+
+from app import db, login
+from app.cache import LRUCache
+from app.models import User
+from app.versioning import data_changed
+
+
+class Identity(UserMixin):
+    """
+    Immutable record standing for a logged-in user, without any database session.
+
+    Attributes:
+        id (int): The ID of the user.
+        username (str): The username of the user.
+        fingerprint (str): The fingerprint of the password hash of the user.
+    """
+
+    __slots__ = ("id", "username", "fingerprint")
+
+    def __init__(self, id, username, fingerprint):  # pylint: disable=redefined-builtin
+        object.__setattr__(self, "id", id)
+        object.__setattr__(self, "username", username)
+        object.__setattr__(self, "fingerprint", fingerprint)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("Identity records are immutable")
+
+    def __repr__(self):
+        return "<Identity {}>".format(self.username)
+
+    @classmethod
+    def of(cls, user):
+        """
+        Creates the identity of a user.
+
+        Args:
+            user (User): The user.
+
+        Returns:
+            Identity: The identity.
+        """
+        return cls(user.id, user.username, user.fingerprint)
+
+    def get_id(self):
+        """
+        Returns the identifier stored in the session of the user, like User.get_id.
+
+        Returns:
+            str: The ID and the password fingerprint of the user.
+        """
+        return "{}:{}".format(self.id, self.fingerprint)
+
+
+class _CachedIdentities:
+    """
+    Identity cache of an application, kept in its ``extensions``.
+
+    Attributes:
+        backend (LRUCache): The identities by user ID.
+        hits (int): The number of identities served from the cache.
+        misses (int): The number of identities loaded from the database.
+        lock (Lock): Guards the counters.
+    """
+
+    def __init__(self, maxsize, ttl):
+        self.backend = LRUCache(maxsize=maxsize, ttl=ttl)
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+
+class IdentityCache:
+    """
+    Flask extension caching the identities of the logged-in users.
+
+    Each application keeps its own cache in ``app.extensions["identity_cache"]``, sized by
+    USER_CACHE_SIZE and expiring identities after USER_CACHE_TTL seconds.
+    """
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """
+        Creates the cache of an application.
+
+        Args:
+            app (Flask): The application.
+        """
+        app.extensions["identity_cache"] = _CachedIdentities(
+            app.config.get("USER_CACHE_SIZE", 1024), app.config.get("USER_CACHE_TTL", 60)
+        )
+        data_changed.connect(self._clear_on_change)
+
+    @staticmethod
+    def _cache():
+        """
+        Returns the cache of the current application.
+
+        Returns:
+            _CachedIdentities: The cache.
+        """
+        return current_app.extensions["identity_cache"]
+
+    def _clear_on_change(self, sender, tables, **kwargs):
+        """
+        Clears the cache of the application after a commit changing the User table.
+
+        Args:
+            sender (Session): The session that committed.
+            tables (frozenset): The names of the changed tables.
+        """
+        if User.__tablename__ in tables and has_app_context():
+            self._cache().backend.clear()
+
+    def _count(self, hit):
+        """
+        Counts a lookup.
+
+        Args:
+            hit (bool): Whether the identity was found in the cache.
+        """
+        cache = self._cache()
+        with cache.lock:
+            if hit:
+                cache.hits += 1
+            else:
+                cache.misses += 1
+
+    def stats(self):
+        """
+        Returns the counters of the cache of the current application.
+
+        Returns:
+            dict: The number of hits and misses.
+        """
+        cache = self._cache()
+        with cache.lock:
+            return {"hits": cache.hits, "misses": cache.misses}
+
+    def load(self, user_id):
+        """
+        Returns the identity of the user of a session.
+
+        Args:
+            user_id (str): The identifier stored in the session, as returned by get_id.
+
+        Returns:
+            Identity: The identity, or None if the user does not exist anymore or changed
+            its password since the session was opened.
+        """
+        user_id, _, fingerprint = user_id.partition(":")
+        try:
+            user_id = int(user_id)
+        except ValueError:
+            return None
+        backend = self._cache().backend
+        identity = backend.get(user_id)
+        self._count(identity is not None)
+        if identity is None:
+            user = db.session.get(User, user_id)
+            if user is None:
+                return None
+            identity = Identity.of(user)
+            backend.set(user_id, identity)
+        return identity if identity.fingerprint == fingerprint else None
+
+
+identities = IdentityCache()
+
+
+@login.user_loader
+def load_user(id):  # pylint: disable=redefined-builtin
+    """
+    Loads a user by the identifier stored in its session.
+
+    Args:
+        id (str): The identifier of the user, as returned by get_id.
+
+    Returns:
+        Identity: The identity of the user, or None if the session is not valid anymore.
+    """
+    return identities.load(id)
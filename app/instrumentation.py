@@ -0,0 +1,498 @@
+"""
+This module measures where the time of each request goes and publishes the measurements.
+
+Engine hooks count the SQL statements of each request and the time spent running them,
+template signals time the rendering, and request hooks time the whole request. Every
+response reports its figures in a Server-Timing header, and the ``/metrics`` endpoint
+serves the per-endpoint latency histograms, query counts, template render times,
+connection pool checkout waits and user identity cache counters of the worker in the
+Prometheus text format, to the client addresses of METRICS_ALLOWED_ADDRESSES only. Each
+worker process keeps its own metrics, which the scraper tells apart by instance.
+
+Statements slower than SLOW_QUERY_THRESHOLD are logged through the application logger
+with their redacted parameters, the endpoint and the query plan of the database, which
+is computed once per statement shape.
+
+Modules:
+    abc: Provides abstract base classes.
+    bisect: Provides binary search on sorted lists.
+    functools: Provides higher-order functions and operations on callable objects.
+    ipaddress: Provides IP address and network parsing.
+    threading: Provides thread synchronization primitives.
+    time: Provides time-related functions.
+    sqlalchemy: SQLAlchemy library for database operations.
+    QueuePool: SQLAlchemy connection pool of a bounded number of connections.
+    Blueprint: Flask class for creating blueprints.
+    abort: Function to abort a request with an HTTP error.
+    before_render_template, template_rendered: Signals sent around template rendering.
+    current_app: Proxy for the current application.
+    g: Namespace object for storing data during a request.
+    has_request_context: Function telling whether a request is being handled.
+    request: Proxy for the current request.
+    LRUCache: Bounded in-memory cache with a time to live.
+"""
+
+import abc
+import bisect
+import functools
+import ipaddress
+import threading
+import time
+
+import sqlalchemy as sa
+from flask import Blueprint, abort, before_render_template, current_app, g, has_request_context, request, template_rendered
+from sqlalchemy.pool import QueuePool
+
+from app.cache import LRUCache
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 250)
+
+
+class Metric(abc.ABC):
+    """
+    Thread-safe Prometheus metric with labels.
+
+    Attributes:
+        name (str): The metric name.
+        documentation (str): The help text of the metric.
+        labels (tuple): The label names.
+    """
+
+    kind = "untyped"
+
+    def __init__(self, name, documentation, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+        self._series = {}
+        self._lock = threading.Lock()
+
+    @abc.abstractmethod
+    def samples(self):
+        """
+        Returns the samples of the metric.
+
+        Yields:
+            tuple: The sample name suffix, the labels as (name, value) pairs, and the value.
+        """
+
+
+class Counter(Metric):
+    """
+    Thread-safe Prometheus counter with labels.
+    """
+
+    kind = "counter"
+
+    def inc(self, *label_values, amount=1):
+        """
+        Increases the counter.
+
+        Args:
+            *label_values (str): The values of the labels, in order.
+            amount (float): The increment.
+        """
+        with self._lock:
+            self._series[label_values] = self._series.get(label_values, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            series = dict(self._series)
+        for label_values, value in sorted(series.items()):
+            yield "", tuple(zip(self.labels, label_values)), value
+
+
+class Histogram(Metric):
+    """
+    Thread-safe Prometheus histogram with labels.
+
+    Attributes:
+        buckets (tuple): The upper bounds of the buckets, in increasing order.
+    """
+
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labels=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = buckets
+
+    def observe(self, value, *label_values):
+        """
+        Records a value.
+
+        Args:
+            value (float): The observed value.
+            *label_values (str): The values of the labels, in order.
+        """
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.setdefault(label_values, [[0] * len(self.buckets), 0.0, 0])
+            if index < len(self.buckets):
+                series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def samples(self):
+        with self._lock:
+            series = {labels: (list(counts), total, count) for labels, (counts, total, count) in self._series.items()}
+        for label_values, (counts, total, count) in sorted(series.items()):
+            labels = tuple(zip(self.labels, label_values))
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                yield "_bucket", labels + (("le", format_number(bound)),), cumulative
+            yield "_bucket", labels + (("le", "+Inf"),), count
+            yield "_sum", labels, total
+            yield "_count", labels, count
+
+
+REQUEST_DURATION = Histogram("http_request_duration_seconds", "Time spent handling requests.", ("endpoint",))
+REQUESTS = Counter("http_requests_total", "Requests handled, by status code.", ("endpoint", "status"))
+REQUEST_QUERIES = Histogram(
+    "db_queries_per_request", "SQL statements executed per request.", ("endpoint",), buckets=QUERY_BUCKETS
+)
+REQUEST_DB_TIME = Histogram(
+    "db_time_per_request_seconds", "Time spent running SQL statements per request.", ("endpoint",)
+)
+STATEMENTS = Counter("db_statements_total", "SQL statements executed, by database bind.", ("bind",))
+RENDER_DURATION = Histogram("template_render_duration_seconds", "Time spent rendering templates.", ("template",))
+SLOW_STATEMENTS = Counter("db_slow_statements_total", "SQL statements over SLOW_QUERY_THRESHOLD.", ("bind",))
+POOL_WAIT = Histogram("db_pool_checkout_wait_seconds", "Time spent waiting for a pooled database connection.")
+METRICS = (
+    REQUEST_DURATION,
+    REQUESTS,
+    REQUEST_QUERIES,
+    REQUEST_DB_TIME,
+    STATEMENTS,
+    SLOW_STATEMENTS,
+    RENDER_DURATION,
+    POOL_WAIT,
+)
+
+# Plans of the slow statements, by dialect and statement
+PLANS = LRUCache(maxsize=512, ttl=3600)
+EXPLAINABLE = ("SELECT", "INSERT", "UPDATE", "DELETE", "WITH")
+
+
+def format_number(value):
+    """
+    Formats a number as Prometheus does.
+
+    Args:
+        value (float): The number.
+
+    Returns:
+        str: The number, without a fractional part if it is an integer.
+    """
+    return "{:d}".format(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+def escape_label(value):
+    """
+    Escapes a label value for the Prometheus text format.
+
+    Args:
+        value (object): The label value.
+
+    Returns:
+        str: The escaped value.
+    """
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def render_metrics(metrics):
+    """
+    Renders metrics in the Prometheus text exposition format.
+
+    Args:
+        metrics (iterable): The metrics, with their current samples.
+
+    Returns:
+        str: The exposition text.
+    """
+    lines = []
+    for metric in metrics:
+        lines.append("# HELP {} {}".format(metric.name, metric.documentation))
+        lines.append("# TYPE {} {}".format(metric.name, metric.kind))
+        for suffix, labels, value in metric.samples():
+            escaped = ",".join('{}="{}"'.format(name, escape_label(label)) for name, label in labels)
+            selector = "{" + escaped + "}" if escaped else ""
+            lines.append("{}{}{} {}".format(metric.name, suffix, selector, format_number(value)))
+    return "\n".join(lines) + "\n"
+
+
+class TimedQueuePool(QueuePool):
+    """
+    Queue pool recording how long each checkout waits for a connection.
+    """
+
+    _state = threading.local()
+
+    def _do_get(self):
+        if getattr(self._state, "timing", False):
+            return super()._do_get()
+        self._state.timing = True
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            self._state.timing = False
+            POOL_WAIT.observe(time.perf_counter() - started)
+
+
+def _timing():
+    """
+    Returns the figures of the current request.
+
+    Returns:
+        dict: The number of statements, and the seconds spent running them and rendering templates.
+    """
+    return g.setdefault("timing", {"queries": 0, "db": 0.0, "render": 0.0})
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(app, bind, conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info["query_started"].pop()
+    STATEMENTS.inc(bind)
+    if has_request_context():
+        timing = _timing()
+        timing["queries"] += 1
+        timing["db"] += elapsed
+    threshold = app.config.get("SLOW_QUERY_THRESHOLD")
+    if threshold and elapsed >= threshold:
+        _log_slow_query(app, bind, conn, statement, parameters, executemany, elapsed)
+
+
+def redact(parameters):
+    """
+    Hides the values of query parameters which may hold personal data or secrets.
+
+    Numbers, booleans and nulls are kept, since they are mostly IDs and flags that help
+    reproducing a query, and everything else is replaced by its type and length.
+
+    Args:
+        parameters (tuple | dict | list): The parameters of a statement, a list of them
+            for executemany.
+
+    Returns:
+        tuple | dict | list: The redacted parameters.
+    """
+    if isinstance(parameters, list):
+        return [redact(item) for item in parameters[:3]] + (["..."] if len(parameters) > 3 else [])
+    if isinstance(parameters, dict):
+        return {name: redact(value) for name, value in parameters.items()}
+    if isinstance(parameters, tuple):
+        return tuple(redact(value) for value in parameters)
+    if parameters is None or isinstance(parameters, (bool, int, float)):
+        return parameters
+    try:
+        return "<{} len={}>".format(type(parameters).__name__, len(parameters))
+    except TypeError:
+        return "<{}>".format(type(parameters).__name__)
+
+
+def explain(conn, statement, parameters):
+    """
+    Returns the plan of a statement, computing it once per statement shape.
+
+    The plan is read with a raw DBAPI cursor, so it is neither instrumented nor logged
+    itself. Plans are kept for PLANS.ttl seconds, so a new index shows up in the log.
+
+    Args:
+        conn (Connection): The connection that ran the statement.
+        statement (str): The SQL statement, with parameter placeholders.
+        parameters (tuple | dict): The parameters the statement ran with.
+
+    Returns:
+        str: The plan, one line per step, or None if the statement cannot be explained.
+    """
+    if not statement.lstrip().upper().startswith(EXPLAINABLE):
+        return None
+    key = (conn.dialect.name, statement)
+    plan = PLANS.get(key)
+    if plan is None:
+        prefix = "EXPLAIN QUERY PLAN " if conn.dialect.name == "sqlite" else "EXPLAIN "
+        cursor = conn.connection.dbapi_connection.cursor()
+        try:
+            cursor.execute(prefix + statement, parameters)
+            plan = "\n".join(" ".join(str(value) for value in row) for row in cursor.fetchall())
+        except Exception as error:  # pylint: disable=broad-exception-caught
+            plan = "unavailable: {}".format(error)
+        finally:
+            cursor.close()
+        PLANS.set(key, plan)
+    return plan
+
+
+def _log_slow_query(app, bind, conn, statement, parameters, executemany, elapsed):
+    """
+    Logs a statement that took longer than SLOW_QUERY_THRESHOLD, with its plan.
+
+    Args:
+        app (Flask): The application.
+        bind (str): The name of the database bind.
+        conn (Connection): The connection that ran the statement.
+        statement (str): The SQL statement.
+        parameters (tuple | dict | list): The parameters of the statement.
+        executemany (bool): Whether the statement ran once per set of parameters.
+        elapsed (float): The seconds the statement took.
+    """
+    endpoint = request.endpoint if has_request_context() else None
+    plan = explain(conn, statement, parameters[0] if executemany and parameters else parameters)
+    SLOW_STATEMENTS.inc(bind)
+    app.logger.warning(
+        "Slow query: %.1f ms on %s in %s\n%s\nparameters: %r\nplan:\n%s",
+        elapsed * 1000,
+        bind,
+        endpoint or "no request",
+        statement,
+        redact(parameters),
+        plan or "none",
+        extra={"endpoint": endpoint, "statement_duration": elapsed, "statement": statement, "plan": plan},
+    )
+
+
+def _forget_failed_statement(exception_context):
+    connection = exception_context.connection
+    if connection is not None and connection.info.get("query_started"):
+        connection.info["query_started"].pop()
+
+
+def _before_render_template(sender, template, context, **kwargs):
+    g.setdefault("render_started", []).append(time.perf_counter())
+
+
+def _template_rendered(sender, template, context, **kwargs):
+    started = g.get("render_started")
+    if started:
+        elapsed = time.perf_counter() - started.pop()
+        RENDER_DURATION.observe(elapsed, template.name or "")
+        if has_request_context():
+            _timing()["render"] += elapsed
+
+
+def _start_request():
+    g.request_started = time.perf_counter()
+
+
+def _add_server_timing(response):
+    """
+    Reports the figures of the request so far in the Server-Timing header of its response.
+
+    Args:
+        response (Response): The response.
+
+    Returns:
+        Response: The same response.
+    """
+    timing = _timing()
+    response.headers.add(
+        "Server-Timing",
+        'db;dur={:.2f};desc="{} queries", render;dur={:.2f}, app;dur={:.2f}'.format(
+            timing["db"] * 1000,
+            timing["queries"],
+            timing["render"] * 1000,
+            (time.perf_counter() - g.get("request_started", time.perf_counter())) * 1000,
+        ),
+    )
+    if "status" not in g:
+        g.status = response.status_code
+    return response
+
+
+def _finish_request(error=None):
+    """
+    Records the metrics of a request once it is over, streamed body included.
+
+    Args:
+        error (Exception, optional): The error that ended the request, if any.
+    """
+    started = g.get("request_started")
+    if started is None:
+        return
+    endpoint = request.endpoint or "none"
+    timing = _timing()
+    REQUEST_DURATION.observe(time.perf_counter() - started, endpoint)
+    REQUESTS.inc(endpoint, str(500 if error is not None else g.get("status", 500)))
+    REQUEST_QUERIES.observe(timing["queries"], endpoint)
+    REQUEST_DB_TIME.observe(timing["db"], endpoint)
+
+
+bp = Blueprint("instrumentation", __name__)
+
+
+@bp.route("/metrics")
+def metrics():
+    """
+    Route serving the metrics of the worker in the Prometheus text format.
+
+    Answers 404 Not Found to clients outside METRICS_ALLOWED_ADDRESSES. Behind
+    TRUSTED_PROXY_HOPS reverse proxies, the client address is the one they forwarded, and
+    requests they did not forward are refused, so allowing the address of a proxy does not
+    let every client through it.
+
+    Returns:
+        Response: The metrics.
+    """
+    if current_app.config.get("TRUSTED_PROXY_HOPS") and "X-Forwarded-For" not in request.headers:
+        abort(404)
+    try:
+        address = ipaddress.ip_address(request.remote_addr or "")
+    except ValueError:
+        abort(404)
+    if not any(address in network for network in current_app.extensions["metrics_networks"]):
+        abort(404)
+
+    from app.identity import identities  # pylint: disable=import-outside-toplevel
+
+    cache = identities.stats()
+    hits = Counter("user_cache_hits_total", "Logged-in user identities served from the cache.")
+    hits.inc(amount=cache["hits"])
+    misses = Counter("user_cache_misses_total", "Logged-in user identities loaded from the database.")
+    misses.inc(amount=cache["misses"])
+    dropped = Counter("log_records_dropped_total", "Log records dropped because the log queue was full.")
+    pipeline = current_app.extensions.get("log_pipeline")
+    dropped.inc(amount=pipeline.dropped if pipeline is not None else 0)
+    return current_app.response_class(
+        render_metrics((*METRICS, hits, misses, dropped)), content_type="text/plain; version=0.0.4"
+    )
+
+
+def init_app(app, db):
+    """
+    Registers the instrumentation hooks and the metrics endpoint of an application.
+
+    The metrics endpoint is only registered when METRICS_ALLOWED_ADDRESSES is not empty.
+
+    Args:
+        app (Flask): The application.
+        db (SQLAlchemy): The database extension, already initialised for the application.
+    """
+    with app.app_context():
+        engines = dict(db.engines)
+    for bind_key, engine in engines.items():
+        bind = bind_key or "default"
+        sa.event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+        sa.event.listen(engine, "handle_error", _forget_failed_statement)
+        sa.event.listen(
+            engine,
+            "after_cursor_execute",
+            functools.partial(_after_cursor_execute, app, bind),
+        )
+    before_render_template.connect(_before_render_template, app)
+    template_rendered.connect(_template_rendered, app)
+    app.before_request(_start_request)
+    app.after_request(_add_server_timing)
+    app.teardown_request(_finish_request)
+    networks = [
+        ipaddress.ip_network(address.strip(), strict=False)
+        for address in app.config.get("METRICS_ALLOWED_ADDRESSES", ())
+        if address.strip()
+    ]
+    if networks:
+        app.extensions["metrics_networks"] = networks
+        app.register_blueprint(bp)
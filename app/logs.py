@@ -0,0 +1,292 @@
+"""
+This module sets up the logging pipeline of the application.
+
+Request threads never write to disk: the application logger hands its records to a
+bounded in-memory queue, and a single background thread writes them to the log file as
+JSON lines. Each record carries the request ID, endpoint and elapsed time of the request
+that emitted it. When the writer falls behind and the queue is full, new records are
+dropped and counted instead of blocking the requests. The log file rotates by size, or
+by time when LOG_ROTATE_WHEN is set.
+
+Modules:
+    atexit: Provides functions run when the interpreter exits.
+    copy: Provides shallow copies of objects.
+    json: Provides JSON encoding and decoding.
+    logging: Provides logging functionality.
+    os: Provides a way of using operating system dependent functionality.
+    queue: Provides synchronized queues.
+    threading: Provides thread synchronization primitives.
+    time: Provides time-related functions.
+    uuid: Provides unique identifiers.
+    weakref: Provides weak references to objects.
+    datetime, timezone: Classes for manipulating dates and times.
+    logging.handlers: Provides the queue and rotating file handlers.
+    current_app: Proxy for the current application.
+    g: Namespace object for storing data during a request.
+    has_request_context: Function telling whether a request is being handled.
+    request: Proxy for the current request.
+"""
+
+import atexit
+import copy
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import threading
+import time
+import uuid
+import weakref
+from datetime import datetime, timezone
+
+from flask import current_app, g, has_request_context, request
+
+_TRACEBACKS = logging.Formatter()
+
+# Attributes of every log record, the others come from the extra argument of the logging call
+RECORD_ATTRIBUTES = frozenset(logging.makeLogRecord({}).__dict__) | {"message", "asctime"}
+
+
+class JSONFormatter(logging.Formatter):
+    """
+    Formats log records as JSON objects, one per line.
+    """
+
+    def format(self, record):
+        """
+        Formats a log record.
+
+        Args:
+            record (LogRecord): The log record.
+
+        Returns:
+            str: The JSON object.
+        """
+        entry = {
+            "time": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            "location": "{}:{}".format(record.pathname, record.lineno),
+        }
+        for name, value in record.__dict__.items():
+            if name not in RECORD_ATTRIBUTES and not name.startswith("_"):
+                entry[name] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exception"] = record.exc_text
+        if record.stack_info:
+            entry["stack"] = self.formatStack(record.stack_info)
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+class RequestContextFilter(logging.Filter):
+    """
+    Adds the request ID, endpoint and elapsed time of the current request to log records.
+
+    It runs in the thread that emits the record, before the record is queued.
+    """
+
+    def filter(self, record):
+        """
+        Adds the request details to a log record.
+
+        Args:
+            record (LogRecord): The log record.
+
+        Returns:
+            bool: Always True.
+        """
+        if has_request_context():
+            record.__dict__.setdefault("request_id", g.get("request_id"))
+            record.__dict__.setdefault("endpoint", request.endpoint)
+            started = g.get("request_started")
+            if started is not None:
+                record.__dict__.setdefault("duration", round(time.perf_counter() - started, 6))
+        return True
+
+
+class BoundedQueueHandler(logging.handlers.QueueHandler):
+    """
+    Queue handler dropping and counting the records that do not fit in its queue.
+
+    Attributes:
+        dropped (int): The number of records dropped because the queue was full.
+    """
+
+    def __init__(self, maxsize):
+        super().__init__(queue.Queue(maxsize))
+        self.dropped = 0
+        self._lock = threading.Lock()
+
+    def prepare(self, record):
+        """
+        Prepares a record for the queue, merging its message arguments and traceback.
+
+        Unlike QueueHandler.prepare, the traceback is kept apart from the message, so the
+        JSON formatter writes it to its own field.
+
+        Args:
+            record (LogRecord): The log record.
+
+        Returns:
+            LogRecord: A copy of the record, holding only plain values.
+        """
+        record = copy.copy(record)
+        record.msg = record.message = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = record.exc_text or _TRACEBACKS.formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        """
+        Queues a record without waiting, or drops it if the queue is full.
+
+        Args:
+            record (LogRecord): The prepared log record.
+        """
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            with self._lock:
+                self.dropped += 1
+
+
+class LogPipeline:
+    """
+    Flask extension writing the application log through a queue and a background thread.
+
+    Attributes:
+        handler (BoundedQueueHandler): The handler of the application logger.
+        listener (QueueListener): The background thread writing the records to the file.
+    """
+
+    def __init__(self, app=None):
+        self.handler = None
+        self.listener = None
+        if app is not None:
+            self.init_app(app)
+
+    @property
+    def dropped(self):
+        """
+        The number of records dropped because the queue was full.
+        """
+        return self.handler.dropped if self.handler is not None else 0
+
+    def init_app(self, app):
+        """
+        Attaches the pipeline to the logger of an application and starts writing.
+
+        The log file is configured by LOG_FILE, LOG_MAX_BYTES, LOG_ROTATE_WHEN and
+        LOG_BACKUP_COUNT, and the queue by LOG_QUEUE_SIZE.
+
+        Args:
+            app (Flask): The application.
+        """
+        path = app.config.get("LOG_FILE", "logs/restaurant.log")
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        backup_count = app.config.get("LOG_BACKUP_COUNT", 10)
+        if app.config.get("LOG_ROTATE_WHEN"):
+            file_handler = logging.handlers.TimedRotatingFileHandler(
+                path, when=app.config["LOG_ROTATE_WHEN"], backupCount=backup_count, encoding="utf-8", delay=True
+            )
+        else:
+            file_handler = logging.handlers.RotatingFileHandler(
+                path,
+                maxBytes=app.config.get("LOG_MAX_BYTES", 10 * 1024 * 1024),
+                backupCount=backup_count,
+                encoding="utf-8",
+                delay=True,
+            )
+        file_handler.setFormatter(JSONFormatter())
+
+        self.handler = BoundedQueueHandler(app.config.get("LOG_QUEUE_SIZE", 10000))
+        self.handler.addFilter(RequestContextFilter())
+        self.handler.setLevel(logging.INFO)
+        self.listener = logging.handlers.QueueListener(self.handler.queue, file_handler, respect_handler_level=True)
+        self.start()
+        _pipelines.add(self)
+
+        app.logger.addHandler(self.handler)
+        app.logger.setLevel(logging.INFO)
+        app.extensions["log_pipeline"] = self
+        app.before_request(_assign_request_id)
+        app.after_request(_send_request_id)
+        if app.config.get("LOG_REQUESTS", True):
+            app.teardown_request(_log_request)
+
+    def start(self):
+        """
+        Starts the background thread writing the records, if it is not running.
+        """
+        if self.listener is not None and self.listener._thread is None:  # pylint: disable=protected-access
+            self.listener.start()
+
+    def stop(self):
+        """
+        Writes the queued records and stops the background thread, if it is running.
+        """
+        if self.listener is not None and self.listener._thread is not None:  # pylint: disable=protected-access
+            self.listener.stop()
+
+
+# Pipelines stopped at exit and restarted around forks, without keeping discarded ones alive
+_pipelines = weakref.WeakSet()
+
+
+def _stop_pipelines():
+    for pipeline in list(_pipelines):
+        pipeline.stop()
+
+
+def _start_pipelines():
+    for pipeline in list(_pipelines):
+        pipeline.start()
+
+
+atexit.register(_stop_pipelines)
+if hasattr(os, "register_at_fork"):
+    # The writer thread does not survive a fork, every process needs its own
+    os.register_at_fork(before=_stop_pipelines, after_in_parent=_start_pipelines, after_in_child=_start_pipelines)
+
+
+def _assign_request_id():
+    g.request_id = request.headers.get("X-Request-ID") or uuid.uuid4().hex
+
+
+def _send_request_id(response):
+    """
+    Returns the request ID to the client, to quote when reporting a problem.
+
+    Args:
+        response (Response): The response.
+
+    Returns:
+        Response: The same response.
+    """
+    response.headers["X-Request-ID"] = g.get("request_id", "")
+    if "status" not in g:
+        g.status = response.status_code
+    return response
+
+
+def _log_request(error=None):
+    """
+    Logs the outcome of a request once it is over, streamed body included.
+
+    Args:
+        error (Exception, optional): The error that ended the request, if any.
+    """
+    status = 500 if error is not None else g.get("status", 500)
+    current_app.logger.info(
+        "%s %s %s",
+        request.method,
+        request.full_path.rstrip("?"),
+        status,
+        extra={"method": request.method, "status": status},
+    )
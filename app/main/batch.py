@@ -0,0 +1,192 @@
+"""
+This module applies batches of restaurant updates with optimistic concurrency.
+
+A batch is a list of partial updates, each naming a restaurant by ID, the version of it
+the client last read, and the new name, address or city. Updates are validated against
+the current rows, which are read once for the whole batch, and then applied with one
+executemany ``UPDATE ... WHERE id = :id AND version = :version`` per combination of
+changed columns, all in the transaction of the request. An update made against an old
+version is not applied and is reported as a conflict with the current version, so the
+client can merge and retry it; no row is ever locked while a client is editing.
+
+Since the statements bypass the ORM, the listing, the place counters and the data
+versions are kept in sync here, as the session hooks do for ORM changes.
+
+Modules:
+    sqlalchemy: SQLAlchemy library for database operations.
+    mark_written: Function sending the following reads of the client to the primary.
+    record_changes: Function increasing the data versions of changed tables.
+    models: Contains the database models for the application.
+"""
+
+import sqlalchemy as sa
+
+from app.models import PlaceCount, Restaurant, RestaurantListing
+from app.routing import mark_written
+from app.versioning import record_changes
+
+FIELDS = ("name", "address", "city_id")
+PLACE_COLUMNS = ("city_id", "province_id", "region_id", "country_id")
+
+
+class BatchError(ValueError):
+    """
+    Error raised when a batch cannot be applied at all.
+    """
+
+
+class ConcurrentUpdate(BatchError):
+    """
+    Error raised when a row changed between the validation and the update of a batch.
+    """
+
+
+def parse_updates(payload, max_size):
+    """
+    Reads the updates of a batch request.
+
+    Args:
+        payload (object): The decoded JSON body, a list of updates or an object holding
+            them under "updates".
+        max_size (int): The maximum number of updates in a batch.
+
+    Returns:
+        list: The updates, as dicts.
+
+    Raises:
+        BatchError: If the payload is not a list of objects, or is too long.
+    """
+    updates = payload.get("updates") if isinstance(payload, dict) else payload
+    if not isinstance(updates, list) or not all(isinstance(update, dict) for update in updates):
+        raise BatchError("expected a list of updates")
+    if len(updates) > max_size:
+        raise BatchError("at most {} updates per batch".format(max_size))
+    return updates
+
+
+def _is_integer(value):
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+def _validate(update, hierarchy):
+    """
+    Checks an update and returns the column values it sets.
+
+    Args:
+        update (dict): The update.
+        hierarchy (Hierarchy): The place hierarchy the city is resolved with.
+
+    Returns:
+        dict: The new column values, with every place of the new city.
+
+    Raises:
+        ValueError: If the update is invalid.
+    """
+    unknown = set(update) - set(FIELDS) - {"id", "version"}
+    if unknown:
+        raise ValueError("unknown fields: {}".format(", ".join(sorted(unknown))))
+    values = {}
+    for field, column in (("name", Restaurant.name), ("address", Restaurant.address)):
+        if field in update:
+            value = update[field]
+            if not isinstance(value, str) or not value.strip():
+                raise ValueError("{} must be a non-empty string".format(field))
+            if len(value.strip()) > column.type.length:
+                raise ValueError("{} is longer than {} characters".format(field, column.type.length))
+            values[field] = value.strip()
+    if "city_id" in update:
+        path = hierarchy.path(update["city_id"]) if _is_integer(update["city_id"]) else None
+        if path is None:
+            raise ValueError("unknown city")
+        values.update({"{}_id".format(level): place.id for level, place in path.items()})
+    if not values:
+        raise ValueError("nothing to update")
+    return values
+
+
+def apply_updates(db_session, updates, hierarchy):
+    """
+    Applies a batch of updates in the current transaction of a session.
+
+    The caller commits the transaction, or rolls it back on error.
+
+    Args:
+        db_session (Session): The session.
+        updates (list): The updates, as returned by parse_updates.
+        hierarchy (Hierarchy): The place hierarchy the cities are resolved with.
+
+    Returns:
+        dict: The "updated" restaurants with their new version, the "conflicts" with the
+        version each restaurant is at, and the "errors" with the position of the update.
+
+    Raises:
+        ConcurrentUpdate: If a restaurant changed while the batch was being applied.
+    """
+    result = {"updated": [], "conflicts": [], "errors": []}
+    ids = {update.get("id") for update in updates if _is_integer(update.get("id"))}
+    connection = db_session.connection()
+    table = Restaurant.__table__
+    columns = [table.c.id, table.c.version, table.c.name, *(table.c[column] for column in PLACE_COLUMNS)]
+    current = {row.id: row for row in connection.execute(sa.select(*columns).where(table.c.id.in_(ids)))}
+
+    valid = []
+    seen = set()
+    for index, update in enumerate(updates):
+        restaurant_id, version = update.get("id"), update.get("version")
+        try:
+            if not _is_integer(restaurant_id) or not _is_integer(version):
+                raise ValueError("id and version must be integers")
+            if restaurant_id in seen:
+                raise ValueError("restaurant updated twice in the batch")
+            seen.add(restaurant_id)
+            if restaurant_id not in current:
+                raise ValueError("restaurant not found")
+            values = _validate(update, hierarchy)
+        except ValueError as error:
+            result["errors"].append({"index": index, "id": restaurant_id, "error": str(error)})
+            continue
+        row = current[restaurant_id]
+        if row.version != version:
+            result["conflicts"].append({"index": index, "id": restaurant_id, "version": row.version})
+            continue
+        valid.append((index, row, values))
+
+    # Names must stay unique: reject those taken by other restaurants or repeated in the batch
+    names = [values["name"] for _, row, values in valid if values.get("name", row.name) != row.name]
+    taken = set(connection.scalars(sa.select(table.c.name).where(table.c.name.in_(names)))) if names else set()
+    accepted = []
+    for index, row, values in valid:
+        name = values.get("name")
+        if name is not None and name != row.name:
+            if name in taken:
+                result["errors"].append({"index": index, "id": row.id, "error": "name already in use"})
+                continue
+            taken.add(name)
+        accepted.append((row, values))
+
+    groups = {}
+    for row, values in accepted:
+        groups.setdefault(tuple(sorted(values)), []).append((row, values))
+    for columns, group in groups.items():
+        statement = (
+            sa.update(table)
+            .where(table.c.id == sa.bindparam("_id"), table.c.version == sa.bindparam("_version"))
+            .values({**{column: sa.bindparam(column) for column in columns}, "version": table.c.version + 1})
+        )
+        parameters = [{"_id": row.id, "_version": row.version, **values} for row, values in group]
+        if connection.execute(statement, parameters).rowcount != len(parameters):
+            raise ConcurrentUpdate("a restaurant changed while the batch was being applied")
+    result["errors"].sort(key=lambda error: error["index"])
+    if not accepted:
+        return result
+
+    old_places = [{column: getattr(row, column) for column in PLACE_COLUMNS} for row, _ in accepted]
+    new_places = [{column: values.get(column, getattr(row, column)) for column in PLACE_COLUMNS} for row, values in accepted]
+    deltas = PlaceCount.deltas(old_places, -1)
+    deltas.update(PlaceCount.deltas(new_places))
+    PlaceCount.apply(connection, deltas)
+    RestaurantListing.refresh(connection, [row.id for row, _ in accepted])
+    record_changes(db_session, {Restaurant.__tablename__})
+    mark_written(db_session)
+    result["updated"] = [{"id": row.id, "version": row.version + 1} for row, _ in accepted]
+    return result
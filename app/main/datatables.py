@@ -0,0 +1,252 @@
+"""
+This module implements the DataTables server-side processing protocol for the restaurant list.
+
+It parses the draw/start/length/order/search parameters sent by DataTables, builds the
+matching SQL query against the flattened restaurant listing and its full-text index, and
+pages through it using keyset pagination whenever the client provides a cursor for the
+page it is asking for, falling back to OFFSET otherwise. The total number of restaurants
+is read from the place counters, so only searches count the rows they match.
+
+Modules:
+    json: Provides JSON encoding and decoding.
+    sqlalchemy: SQLAlchemy library for database operations.
+    current_app: Proxy for the current application.
+    db: SQLAlchemy database instance.
+    models: Contains the database models for the application.
+"""
+
+import json
+
+import sqlalchemy as sa
+from flask import current_app
+
+from app import db
+from app.models import PlaceCount, RestaurantListing
+
+COLUMNS = (
+    ("name", RestaurantListing.name),
+    ("address", RestaurantListing.address),
+    ("city", RestaurantListing.city_name),
+    ("province", RestaurantListing.province_name),
+    ("region", RestaurantListing.region_name),
+    ("country", RestaurantListing.country_name),
+)
+
+
+def _int_arg(args, name, default):
+    """
+    Reads an integer request argument.
+
+    Args:
+        args (MultiDict): The request arguments.
+        name (str): The argument name.
+        default (int): The value to use when the argument is missing or invalid.
+
+    Returns:
+        int: The parsed value.
+    """
+    try:
+        return int(args.get(name, default))
+    except (TypeError, ValueError):
+        return default
+
+
+def parse_order(args):
+    """
+    Parses the DataTables ordering parameters.
+
+    Unknown or non-sortable columns are ignored. The restaurant ID is always appended as a
+    tie-breaker so the resulting order is total, which keyset pagination requires.
+
+    Args:
+        args (MultiDict): The request arguments.
+
+    Returns:
+        list: A list of (column index, descending) tuples.
+    """
+    order = []
+    i = 0
+    while f"order[{i}][column]" in args:
+        column = _int_arg(args, f"order[{i}][column]", -1)
+        descending = args.get(f"order[{i}][dir]") == "desc"
+        if 0 <= column < len(COLUMNS) and column not in (c for c, _ in order):
+            order.append((column, descending))
+        i += 1
+    if not order:
+        order.append((0, False))
+    return order
+
+
+def _order_columns(order):
+    """
+    Returns the SQL expressions for an ordering, including the ID tie-breaker.
+
+    Args:
+        order (list): A list of (column index, descending) tuples.
+
+    Returns:
+        list: A list of (expression, descending) tuples.
+    """
+    return [(COLUMNS[column][1], descending) for column, descending in order] + [(RestaurantListing.restaurant_id, False)]
+
+
+def _keyset_condition(columns, values):
+    """
+    Builds the condition selecting the rows that come after a given row.
+
+    Args:
+        columns (list): A list of (expression, descending) tuples.
+        values (list): The values of the ordering columns for the last row already sent.
+
+    Returns:
+        ColumnElement: The keyset condition.
+    """
+    clauses = []
+    for i, (column, descending) in enumerate(columns):
+        equal = [col == value for (col, _), value in zip(columns[:i], values[:i])]
+        beyond = column < values[i] if descending else column > values[i]
+        clauses.append(sa.and_(*equal, beyond))
+    return sa.or_(*clauses)
+
+
+def _signature(order, search, city_id):
+    """
+    Identifies the ordering and filters a cursor was issued for.
+
+    Args:
+        order (list): A list of (column index, descending) tuples.
+        search (str): The global search value.
+        city_id (int, optional): The city filter.
+
+    Returns:
+        list: A JSON-serializable signature.
+    """
+    return [[[column, descending] for column, descending in order], search, city_id]
+
+
+def _search_condition(search):
+    """
+    Builds the condition matching rows against the global search value.
+
+    Uses the full-text index, matching every word as a prefix, when the database has one,
+    and a substring match on every column otherwise.
+
+    Args:
+        search (str): The global search value.
+
+    Returns:
+        ColumnElement: The search condition.
+    """
+    if RestaurantListing.search_available():
+        ids = RestaurantListing.search_ids(search)
+        if ids is None:
+            return sa.true()
+        return RestaurantListing.restaurant_id.in_(ids)
+    pattern = "%{}%".format(search.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_"))
+    return sa.or_(*(column.ilike(pattern, escape="\\") for _, column in COLUMNS))
+
+
+def _total(city_id=None):
+    """
+    Reads the number of restaurants from the place counters, without scanning the listing.
+
+    Args:
+        city_id (int, optional): The city to count the restaurants of, all of them if omitted.
+
+    Returns:
+        int: The number of restaurants.
+    """
+    if city_id is not None:
+        return PlaceCount.totals("city", [city_id]).get(city_id, 0)
+    query = sa.select(sa.func.coalesce(sa.func.sum(PlaceCount.total), 0)).where(PlaceCount.level == "country")
+    return db.session.scalar(query)
+
+
+def restaurant_page(args, city_id=None):
+    """
+    Answers a DataTables server-side processing request.
+
+    Args:
+        args (MultiDict): The request arguments sent by DataTables.
+        city_id (int, optional): Restricts the results to a single city.
+
+    Returns:
+        dict: The DataTables response, plus a cursor for the following page.
+    """
+    draw = _int_arg(args, "draw", 0)
+    start = max(_int_arg(args, "start", 0), 0)
+    length = _int_arg(args, "length", 10)
+    max_length = current_app.config["RESTAURANTS_MAX_PAGE_LENGTH"]
+    if length < 1 or length > max_length:
+        length = max_length
+    search = args.get("search[value]", "").strip()
+    order = parse_order(args)
+    columns = _order_columns(order)
+
+    query = sa.select(RestaurantListing.restaurant_id.label("id"), *(column for _, column in COLUMNS))
+    if city_id is not None:
+        query = query.where(RestaurantListing.city_id == city_id)
+    records_total = _total(city_id)
+
+    if search:
+        query = query.where(_search_condition(search))
+        records_filtered = db.session.scalar(sa.select(sa.func.count()).select_from(query.subquery()))
+    else:
+        records_filtered = records_total
+
+    signature = _signature(order, search, city_id)
+    cursor = _load_cursor(args.get("cursor"))
+    if (
+        cursor
+        and cursor.get("start") == start
+        and cursor.get("signature") == signature
+        and len(cursor["values"]) == len(columns)
+    ):
+        query = query.where(_keyset_condition(columns, cursor["values"]))
+    elif start:
+        query = query.offset(start)
+    query = query.order_by(*(column.desc() if descending else column.asc() for column, descending in columns))
+    rows = db.session.execute(query.limit(length)).all()
+
+    data = [
+        {"id": row.id, **{name: value for (name, _), value in zip(COLUMNS, row[1:])}}
+        for row in rows
+    ]
+    next_cursor = None
+    if rows:
+        last = data[-1]
+        values = [last[COLUMNS[column][0]] for column, _ in order] + [last["id"]]
+        next_cursor = json.dumps({"start": start + len(rows), "signature": signature, "values": values})
+    return {
+        "draw": draw,
+        "recordsTotal": records_total,
+        "recordsFiltered": records_filtered,
+        "data": data,
+        "cursor": next_cursor,
+    }
+
+
+def _load_cursor(value):
+    """
+    Decodes a cursor sent back by the client.
+
+    The cursor values are bound as query parameters, so any value that is not a plain
+    string, number or null makes the cursor malformed.
+
+    Args:
+        value (str, optional): The cursor as returned by a previous response.
+
+    Returns:
+        dict: The decoded cursor, or None if it is missing or malformed.
+    """
+    if not value:
+        return None
+    try:
+        cursor = json.loads(value)
+        if not isinstance(cursor, dict) or not isinstance(cursor.get("values"), list):
+            return None
+        if not all(item is None or isinstance(item, (str, int, float)) for item in cursor["values"]):
+            return None
+        return cursor
+    except ValueError:
+        return None
@@ -1,48 +1,194 @@
-from flask import flash, redirect, render_template, request, url_for
+from flask import (
+    abort,
+    current_app,
+    flash,
+    jsonify,
+    redirect,
+    render_template,
+    request,
+    stream_with_context,
+    url_for,
+)
 from flask_babel import _
-from flask_login import login_required
+from flask_login import current_user, login_required
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm.exc import StaleDataError
 
-from app import db
+from app import db, response_cache
+from app.export import FILTERS, FORMATS, export_restaurants
+from app.hierarchy import LEVELS, PLURALS, get_hierarchy, parent_level
 from app.main import bp
-from app.models import City, Country, Province, Region, Restaurant
+from app.main.batch import BatchError, ConcurrentUpdate, apply_updates, parse_updates
+from app.main.datatables import restaurant_page
+from app.main.streaming import stream_restaurant_list
+from app.models import PlaceCount, Restaurant, RestaurantListing
+from app.versioning import conditional
+
+# Tables the restaurant pages are rendered from
+RESTAURANT_TABLES = ("restaurant", "city", "province", "region", "country")
 
 
 @bp.route("/", methods=("GET", "POST"))
+@conditional(*RESTAURANT_TABLES)
+@response_cache.cached(*RESTAURANT_TABLES, key_args=("city_id",))
 def index():
     """
     Route for the index page.
 
-    Displays a list of restaurants and allows filtering by city.
+    Displays a list of restaurants and allows filtering by city. The rows themselves are
+    fetched page by page from the restaurants endpoint, unless STREAM_RESTAURANT_LIST is
+    set, in which case they are streamed along with the page.
 
     Returns:
         Response: The response object to render the index template.
     """
-    cities = City.query.all()
-    countries = Country.query.all()
-    regions = Region.query.all()
-    provinces = Province.query.all()
+    hierarchy = get_hierarchy()
 
+    city_id = None
     if request.method == "POST":
-        city_id = request.form.get("city_id")
-        if city_id:
-            restaurants = Restaurant.query.filter_by(city_id=city_id).all()
-        else:
-            restaurants = Restaurant.query.all()
+        city_id = request.form.get("city_id", type=int)
+        if hierarchy.get("city", city_id) is None:
+            city_id = None
+
+    context = {
+        "city_id": city_id,
+        "cities": hierarchy.all("city"),
+        "countries": hierarchy.all("country"),
+        "regions": hierarchy.all("region"),
+        "provinces": hierarchy.all("province"),
+    }
+    if current_app.config["STREAM_RESTAURANT_LIST"]:
+        return stream_restaurant_list(can_edit=current_user.is_authenticated, **context)
+    return render_template("index.html", **context)
+
+
+@bp.route("/restaurants")
+@conditional(*RESTAURANT_TABLES, PlaceCount.__tablename__)
+def restaurants():
+    """
+    Route for the restaurant list data.
+
+    Implements the DataTables server-side processing protocol: sorting, filtering and
+    paging all happen in SQL and only the requested page is returned.
+
+    Returns:
+        Response: The JSON response with the requested page of restaurants.
+    """
+    page = restaurant_page(request.args, city_id=request.args.get("city_id", type=int))
+    for row in page["data"]:
+        row["edit_url"] = url_for("main.edit", restaurant_id=row["id"]) if current_user.is_authenticated else None
+    return jsonify(page)
+
+
+@bp.route("/search")
+def search():
+    """
+    Route for the restaurant full-text search.
+
+    Matches every word of the ``q`` argument as a prefix of the restaurant name, address or
+    place names, and returns the best ranked matches first.
+
+    Returns:
+        Response: The JSON response with the matching restaurants.
+    """
+    text = request.args.get("q", "").strip()
+    limit = min(max(request.args.get("limit", 20, type=int), 1), current_app.config["RESTAURANTS_MAX_PAGE_LENGTH"])
+    if not RestaurantListing.search_available():
+        abort(501)
+    results = [
+        {
+            "id": listing.restaurant_id,
+            "name": listing.name,
+            "address": listing.address,
+            "city": listing.city_name,
+            "province": listing.province_name,
+            "region": listing.region_name,
+            "country": listing.country_name,
+        }
+        for listing in RestaurantListing.search(text, limit=limit)
+    ]
+    return jsonify(query=text, results=results)
+
+
+@bp.route("/places/<any(countries, regions, provinces, cities):kind>")
+def places(kind):
+    """
+    Route for the place hierarchy lookups.
+
+    Returns every country, or the children of a parent place given as an argument named
+    after the parent level (regions of a ``country``, provinces of a ``region`` and cities
+    of a ``province``). Responses carry an ETag derived from the hierarchy snapshot, so
+    clients revalidate them with a 304 Not Modified instead of downloading them again.
+
+    Args:
+        kind (str): The plural name of the hierarchy level to list.
+
+    Returns:
+        Response: The JSON response with the places, in name order.
+    """
+    level = LEVELS[list(PLURALS.values()).index(kind)]
+    parent = parent_level(level)
+    hierarchy = get_hierarchy()
+    parent_id = None
+    if parent is not None:
+        parent_id = request.args.get(parent, type=int)
+        if parent_id is None or hierarchy.get(parent, parent_id) is None:
+            abort(404)
+
+    etag = "{}-{}-{}".format(hierarchy.version, level, parent_id)
+    # Weak comparison, so the weak ETag of a compressed response still matches
+    if request.if_none_match.contains_weak(etag):
+        response = current_app.response_class(status=304)
     else:
-        restaurants = Restaurant.query.all()
+        children = hierarchy.all(level) if parent is None else hierarchy.children_of(level, parent_id)
+        response = jsonify([{"id": place.id, "name": place.name} for place in children])
+    response.set_etag(etag)
+    response.cache_control.no_cache = True
+    return response
 
-    return render_template(
-        "index.html", restaurants=restaurants, cities=cities, countries=countries, regions=regions, provinces=provinces
-    )
+
+@bp.route("/facets/<any(countries, regions, provinces, cities):kind>")
+@conditional(*RESTAURANT_TABLES, PlaceCount.__tablename__)
+def facets(kind):
+    """
+    Route for the number of restaurants in each place.
+
+    Returns every country, or the children of a parent place given as in the places
+    endpoint, with the number of restaurants in each one, read from the place counters.
+
+    Args:
+        kind (str): The plural name of the hierarchy level to count.
+
+    Returns:
+        Response: The JSON response with the places and their counts, in name order.
+    """
+    level = LEVELS[list(PLURALS.values()).index(kind)]
+    parent = parent_level(level)
+    hierarchy = get_hierarchy()
+    if parent is None:
+        children = hierarchy.all(level)
+        totals = PlaceCount.totals(level)
+    else:
+        parent_id = request.args.get(parent, type=int)
+        if parent_id is None or hierarchy.get(parent, parent_id) is None:
+            abort(404)
+        children = hierarchy.children_of(level, parent_id)
+        totals = PlaceCount.totals(level, [place.id for place in children])
+    return jsonify([{"id": place.id, "name": place.name, "count": totals.get(place.id, 0)} for place in children])
 
 
 @bp.route("/edit/<int:restaurant_id>", methods=("GET", "POST"))
 @login_required
+@conditional(*RESTAURANT_TABLES)
 def edit(restaurant_id):
     """
     Route for editing a restaurant's details.
 
-    Allows authenticated users to update restaurant information.
+    Allows authenticated users to update restaurant information. Only the current place of
+    the restaurant is rendered for each hierarchy level, the other options are loaded on
+    demand from the places endpoint. The submitted places must form a consistent path, and
+    the form must carry the version of the restaurant it was rendered with, so a change saved
+    meanwhile by someone else is not silently overwritten.
 
     Args:
         restaurant_id (int): The ID of the restaurant to edit.
@@ -51,21 +197,100 @@ def edit(restaurant_id):
         Response: The response object to render the edit template or redirect the user.
     """
     restaurant = Restaurant.query.get_or_404(restaurant_id)
-    countries = Country.query.all()
-    regions = Region.query.all()
-    provinces = Province.query.all()
-    cities = City.query.all()
+    hierarchy = get_hierarchy()
 
     if request.method == "POST":
+        version = request.form.get("version", type=int)
+        if version is None:
+            abort(400)
+        if version != restaurant.version:
+            flash(_("The restaurant was changed by someone else. Review it and save your changes again."), "danger")
+            return redirect(url_for("main.edit", restaurant_id=restaurant_id))
+        path = hierarchy.path(request.form.get("city_id", type=int))
+        if path is None or any(request.form.get(f"{level}_id", type=int) != path[level].id for level in LEVELS):
+            flash(_("The selected city, province, region and country do not match."), "danger")
+            return redirect(url_for("main.edit", restaurant_id=restaurant_id))
         restaurant.name = request.form["name"]
         restaurant.address = request.form["address"]
-        restaurant.city_id = request.form["city_id"]
-        restaurant.province_id = request.form["province_id"]
-        restaurant.region_id = request.form["region_id"]
-        restaurant.country_id = request.form["country_id"]
-        db.session.commit()
+        restaurant.city_id = path["city"].id
+        restaurant.province_id = path["province"].id
+        restaurant.region_id = path["region"].id
+        restaurant.country_id = path["country"].id
+        try:
+            db.session.commit()
+        except StaleDataError:
+            db.session.rollback()
+            flash(_("The restaurant was changed by someone else. Review it and save your changes again."), "danger")
+            return redirect(url_for("main.edit", restaurant_id=restaurant_id))
         flash(_("Restaurant successfully updated!"), "success")
         return redirect(url_for("main.index"))
-    return render_template(
-        "edit.html", restaurant=restaurant, countries=countries, regions=regions, provinces=provinces, cities=cities
+    return render_template("edit.html", restaurant=restaurant, path=hierarchy.path(restaurant.city_id))
+
+
+@bp.route("/restaurants/batch", methods=("POST",))
+@login_required
+def batch_update():
+    """
+    Route for updating many restaurants at once.
+
+    Takes a JSON list of partial updates, each with the ``id`` and ``version`` of a
+    restaurant and its new ``name``, ``address`` or ``city_id``, and applies them in one
+    transaction. Updates made against an old version are reported as conflicts with the
+    current version instead of being applied, invalid ones as errors, and the others are
+    applied. Only JSON bodies are accepted, which browsers do not send across sites
+    without a CORS preflight.
+
+    Returns:
+        Response: The JSON response with the updated restaurants and their new version,
+        the conflicts and the errors, or 400 for a malformed batch and 409 when a
+        restaurant changed during the batch, in which case nothing was applied.
+    """
+    if not request.is_json:
+        abort(415)
+    try:
+        updates = parse_updates(request.get_json(), current_app.config["BATCH_UPDATE_MAX_SIZE"])
+        result = apply_updates(db.session, updates, get_hierarchy())
+        db.session.commit()
+    except ConcurrentUpdate as error:
+        db.session.rollback()
+        return jsonify(error=str(error)), 409
+    except IntegrityError:
+        db.session.rollback()
+        return jsonify(error="a restaurant name is already in use"), 409
+    except BatchError as error:
+        db.session.rollback()
+        return jsonify(error=str(error)), 400
+    return jsonify(result)
+
+
+@bp.route("/export.<any(csv, ndjson, columnar):file_format>")
+@login_required
+def export(file_format):
+    """
+    Route for downloading the restaurants.
+
+    Streams every restaurant, or those of the place given by the ``country``, ``region``,
+    ``province`` or ``city`` arguments, as a CSV, NDJSON or columnar file. The ``gzip``
+    argument compresses the download.
+
+    Args:
+        file_format (str): The file format.
+
+    Returns:
+        Response: The streamed file.
+    """
+    filters = {level: request.args.get(level, type=int) for level in FILTERS}
+    compress = request.args.get("gzip", type=int) == 1
+    chunks = export_restaurants(
+        db.session,
+        file_format=file_format,
+        compress=compress,
+        filters=filters,
+        chunk_size=current_app.config["STREAM_CHUNK_SIZE"],
+    )
+    filename = "restaurants.{}{}".format(file_format, ".gz" if compress else "")
+    response = current_app.response_class(
+        stream_with_context(chunks), mimetype="application/gzip" if compress else FORMATS[file_format]
     )
+    response.headers["Content-Disposition"] = "attachment; filename={}".format(filename)
+    return response
@@ -0,0 +1,56 @@
+"""
+This module streams the restaurant list page.
+
+The page is rendered once with an empty table body and split at the rows placeholder.
+The part before it, with the document head and the table header, is sent immediately,
+then the rows are read through a server-side cursor and rendered one chunk at a time,
+so memory stays constant however many restaurants there are.
+
+Modules:
+    sqlalchemy: SQLAlchemy library for database operations.
+    current_app: Proxy for the current application.
+    get_template_attribute: Function to load a macro from a template.
+    render_template: Function to render HTML templates.
+    stream_with_context: Function keeping the request context alive while streaming.
+    db: SQLAlchemy database instance.
+    RestaurantListing: Flattened read model for restaurant listings.
+"""
+
+import sqlalchemy as sa
+from flask import current_app, get_template_attribute, render_template, stream_with_context
+
+from app import db
+from app.models import RestaurantListing
+
+ROWS_PLACEHOLDER = "<!-- restaurant rows -->"
+
+
+def stream_restaurant_list(city_id=None, can_edit=False, **context):
+    """
+    Renders the restaurant list page as a stream.
+
+    Args:
+        city_id (int, optional): Restricts the list to a single city.
+        can_edit (bool): Whether the rows link to the edit page.
+        **context: The variables passed to the index template.
+
+    Returns:
+        Response: The streamed response.
+    """
+    page = render_template("index.html", streaming=True, city_id=city_id, **context)
+    head, tail = page.split(ROWS_PLACEHOLDER, 1)
+    chunk_size = current_app.config["STREAM_CHUNK_SIZE"]
+
+    query = sa.select(RestaurantListing.__table__).order_by(RestaurantListing.name)
+    if city_id is not None:
+        query = query.where(RestaurantListing.city_id == city_id)
+
+    def generate():
+        yield head
+        render_rows = get_template_attribute("restaurant_rows.html", "restaurant_rows")
+        result = db.session.execute(query.execution_options(yield_per=chunk_size))
+        for partition in result.partitions():
+            yield render_rows(partition, can_edit)
+        yield tail
+
+    return current_app.response_class(stream_with_context(generate()), mimetype="text/html")
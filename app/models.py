@@ -2,26 +2,37 @@
 This module defines the database models for the Flask application.
 
 It includes models for User, Country, Region, Province, City, and Restaurant,
-and sets up relationships between these models.
+and sets up relationships between these models. It also defines the RestaurantListing
+read model, a flattened copy of each restaurant with its place names resolved, which is
+kept in sync from the session whenever restaurants or places change, and its SQLite
+FTS5 full-text index, the DataVersion counters used to tell whether a table changed, and
+the PlaceCount counters holding the number of restaurants in each place.
 
 Modules:
+    re: Provides regular expression matching operations.
+    Counter: Dictionary subclass for counting hashable objects.
+    datetime, timezone: Classes for manipulating dates and times.
     Optional: A typing hint for optional values.
     sqlalchemy: SQLAlchemy library for database operations.
     sqlalchemy.orm: SQLAlchemy ORM components.
+    xxhash: Provides fast non-cryptographic hashing.
     UserMixin: Flask-Login mixin for user session management.
     check_password_hash, generate_password_hash: Functions for password hashing.
     db: SQLAlchemy database instance.
-    login: Flask-Login instance for user session management.
 """
 
+import re
+from collections import Counter
+from datetime import datetime, timezone
 from typing import Optional
 
 import sqlalchemy as sa
 import sqlalchemy.orm as so
+import xxhash
 from flask_login import UserMixin
 from werkzeug.security import check_password_hash, generate_password_hash
 
-from app import db, login
+from app import db
 
 
 class User(UserMixin, db.Model):
@@ -62,6 +73,28 @@ class User(UserMixin, db.Model):
         """
         return check_password_hash(self.password_hash, password)
 
+    @property
+    def fingerprint(self):
+        """
+        A short digest of the password hash, which changes whenever the password does.
+
+        Returns:
+            str: The digest, empty if the user has no password.
+        """
+        return xxhash.xxh64_hexdigest(self.password_hash) if self.password_hash else ""
+
+    def get_id(self):
+        """
+        Returns the identifier stored in the session of the user.
+
+        It includes the password fingerprint, so resetting the password ends the sessions
+        opened with the old one.
+
+        Returns:
+            str: The ID and the password fingerprint of the user.
+        """
+        return "{}:{}".format(self.id, self.fingerprint)
+
 
 class Country(db.Model):
     """
@@ -161,6 +194,8 @@ class Restaurant(db.Model):
         province_id (int): The ID of the province the restaurant is located in.
         region_id (int): The ID of the region the restaurant is located in.
         country_id (int): The ID of the country the restaurant is located in.
+        version (int): The version of the row, increased by every update, so that concurrent
+            updates of the same version are detected instead of overwriting each other.
         city (City): The city the restaurant is located in.
         province (Province): The province the restaurant is located in.
         region (Region): The region the restaurant is located in.
@@ -170,29 +205,435 @@ class Restaurant(db.Model):
     id: so.Mapped[int] = so.mapped_column(primary_key=True)
     name: so.Mapped[str] = so.mapped_column(sa.String(80), index=True, unique=True)
     address: so.Mapped[str] = so.mapped_column(sa.String(120), nullable=False)
-    city_id: so.Mapped[int] = so.mapped_column(sa.ForeignKey(City.id), index=True)
-    province_id: so.Mapped[int] = so.mapped_column(sa.ForeignKey(Province.id), index=True)
-    region_id: so.Mapped[int] = so.mapped_column(sa.ForeignKey(Region.id), index=True)
-    country_id: so.Mapped[int] = so.mapped_column(sa.ForeignKey(Country.id), index=True)
+    city_id: so.Mapped[int] = so.mapped_column(sa.ForeignKey(City.id), index=True, active_history=True)
+    province_id: so.Mapped[int] = so.mapped_column(sa.ForeignKey(Province.id), index=True, active_history=True)
+    region_id: so.Mapped[int] = so.mapped_column(sa.ForeignKey(Region.id), index=True, active_history=True)
+    country_id: so.Mapped[int] = so.mapped_column(sa.ForeignKey(Country.id), index=True, active_history=True)
+    version: so.Mapped[int] = so.mapped_column(default=1, server_default="1")
 
     city: so.Mapped[City] = so.relationship("City")
     province: so.Mapped[Province] = so.relationship("Province")
     region: so.Mapped[Region] = so.relationship("Region")
     country: so.Mapped[Country] = so.relationship("Country")
 
+    __mapper_args__ = {"version_id_col": version}
+
     def __repr__(self):
         return "<Restaurant {}>".format(self.name)
 
 
-@login.user_loader
-def load_user(id):
+class RestaurantListing(db.Model):
+    """
+    Flattened read model for restaurant listings.
+
+    Holds one row per restaurant with the names of its city, province, region and country
+    already resolved, so listings can be served by a single indexed query instead of
+    joining, or lazily loading, the four place tables for every row.
+
+    Attributes:
+        restaurant_id (int): The ID of the restaurant, also the primary key.
+        name (str): The name of the restaurant.
+        address (str): The address of the restaurant.
+        city_id (int): The ID of the city the restaurant is located in.
+        province_id (int): The ID of the province the restaurant is located in.
+        region_id (int): The ID of the region the restaurant is located in.
+        country_id (int): The ID of the country the restaurant is located in.
+        city_name (str): The name of the city the restaurant is located in.
+        province_name (str): The name of the province the restaurant is located in.
+        region_name (str): The name of the region the restaurant is located in.
+        country_name (str): The name of the country the restaurant is located in.
+    """
+
+    __tablename__ = "restaurant_listing"
+
+    restaurant_id: so.Mapped[int] = so.mapped_column(primary_key=True, autoincrement=False)
+    name: so.Mapped[str] = so.mapped_column(sa.String(80), index=True, unique=True)
+    address: so.Mapped[str] = so.mapped_column(sa.String(120))
+    city_id: so.Mapped[int] = so.mapped_column(index=True)
+    province_id: so.Mapped[int] = so.mapped_column(index=True)
+    region_id: so.Mapped[int] = so.mapped_column(index=True)
+    country_id: so.Mapped[int] = so.mapped_column(index=True)
+    city_name: so.Mapped[str] = so.mapped_column(sa.String(80), index=True)
+    province_name: so.Mapped[str] = so.mapped_column(sa.String(80), index=True)
+    region_name: so.Mapped[str] = so.mapped_column(sa.String(80), index=True)
+    country_name: so.Mapped[str] = so.mapped_column(sa.String(80), index=True)
+
+    PLACES = {
+        City: ("city_id", "city_name"),
+        Province: ("province_id", "province_name"),
+        Region: ("region_id", "region_name"),
+        Country: ("country_id", "country_name"),
+    }
+
+    def __repr__(self):
+        return "<RestaurantListing {}>".format(self.name)
+
+    @classmethod
+    def source(cls):
+        """
+        Returns the query that computes listing rows from the normalized tables.
+
+        Returns:
+            Select: The select statement, with columns in the order of the listing table.
+        """
+        return (
+            sa.select(
+                Restaurant.id,
+                Restaurant.name,
+                Restaurant.address,
+                Restaurant.city_id,
+                Restaurant.province_id,
+                Restaurant.region_id,
+                Restaurant.country_id,
+                City.name,
+                Province.name,
+                Region.name,
+                Country.name,
+            )
+            .join(City, Restaurant.city_id == City.id)
+            .join(Province, Restaurant.province_id == Province.id)
+            .join(Region, Restaurant.region_id == Region.id)
+            .join(Country, Restaurant.country_id == Country.id)
+        )
+
+    @classmethod
+    def refresh(cls, connection, restaurant_ids=None):
+        """
+        Rebuilds listing rows from the normalized tables.
+
+        Rows of restaurants that no longer exist are removed.
+
+        Args:
+            connection (Connection): The connection to execute the statements on.
+            restaurant_ids (iterable | Select, optional): The restaurants to rebuild, as IDs or as
+                a query selecting them. All of them if omitted.
+        """
+        delete = sa.delete(cls)
+        source = cls.source()
+        if restaurant_ids is not None:
+            if not isinstance(restaurant_ids, sa.Select):
+                restaurant_ids = list(restaurant_ids)
+                if not restaurant_ids:
+                    return
+            delete = delete.where(cls.restaurant_id.in_(restaurant_ids))
+            source = source.where(Restaurant.id.in_(restaurant_ids))
+        connection.execute(delete)
+        columns = [column.name for column in cls.__table__.columns]
+        connection.execute(sa.insert(cls).from_select(columns, source))
+
+    @classmethod
+    def rename_place(cls, connection, place):
+        """
+        Propagates the new name of a place to the listing rows that reference it.
+
+        Args:
+            connection (Connection): The connection to execute the statement on.
+            place (City | Province | Region | Country): The renamed place.
+        """
+        id_column, name_column = cls.PLACES[type(place)]
+        connection.execute(
+            sa.update(cls).where(getattr(cls, id_column) == place.id).values({name_column: place.name})
+        )
+
+    @staticmethod
+    def search_available():
+        """
+        Tells whether the full-text search index can be used.
+
+        The index is an SQLite FTS5 table created by the migrations, other backends do not have it.
+
+        Returns:
+            bool: True if the database supports full-text search, False otherwise.
+        """
+        return db.engine.dialect.name == "sqlite"
+
+    @staticmethod
+    def match_expression(text):
+        """
+        Builds an FTS5 query matching every word of a free-text search as a prefix.
+
+        Each word is quoted, so FTS5 operators typed by the user are treated as plain text.
+
+        Args:
+            text (str): The free-text search.
+
+        Returns:
+            str: The FTS5 query, or None if the text contains no words.
+        """
+        words = re.findall(r"\w+", text)
+        if not words:
+            return None
+        return " ".join('"{}"*'.format(word.replace('"', '""')) for word in words)
+
+    @classmethod
+    def search_ids(cls, text):
+        """
+        Returns the query selecting the IDs of the restaurants matching a free-text search.
+
+        Args:
+            text (str): The free-text search.
+
+        Returns:
+            Select: The select statement, or None if the text contains no words.
+        """
+        expression = cls.match_expression(text)
+        if expression is None:
+            return None
+        return (
+            sa.select(SEARCH_INDEX.c.rowid)
+            .where(sa.text("restaurant_search MATCH :expression").bindparams(expression=expression))
+        )
+
+    @classmethod
+    def search(cls, text, limit=20):
+        """
+        Searches restaurants by name, address or place names, best matches first.
+
+        Args:
+            text (str): The free-text search. Every word must match, as a prefix.
+            limit (int): The maximum number of results.
+
+        Returns:
+            list: The matching listing rows.
+        """
+        expression = cls.match_expression(text)
+        if expression is None:
+            return []
+        query = (
+            sa.select(cls)
+            .join(SEARCH_INDEX, SEARCH_INDEX.c.rowid == cls.restaurant_id)
+            .where(sa.text("restaurant_search MATCH :expression").bindparams(expression=expression))
+            .order_by(SEARCH_INDEX.c.rank)
+            .limit(limit)
+        )
+        return db.session.scalars(query).all()
+
+
+class DataVersion(db.Model):
+    """
+    Data version counter for a table.
+
+    The version of a table is increased by every flush that changes its rows, so comparing
+    versions tells whether anything derived from the table may have changed.
+
+    Attributes:
+        name (str): The name of the table, also the primary key.
+        version (int): The number of flushes that changed the table.
+        updated_at (datetime): When the table was last changed.
+    """
+
+    __tablename__ = "data_version"
+
+    name: so.Mapped[str] = so.mapped_column(sa.String(64), primary_key=True)
+    version: so.Mapped[int] = so.mapped_column(default=0)
+    updated_at: so.Mapped[Optional[datetime]] = so.mapped_column()
+
+    def __repr__(self):
+        return "<DataVersion {} {}>".format(self.name, self.version)
+
+    @classmethod
+    def bump(cls, connection, tables):
+        """
+        Increases the version of some tables.
+
+        Args:
+            connection (Connection): The connection to execute the statements on, part of the
+                transaction that changed the tables.
+            tables (iterable): The names of the changed tables.
+        """
+        now = datetime.now(timezone.utc).replace(tzinfo=None)
+        for name in sorted(tables):
+            result = connection.execute(
+                sa.update(cls).where(cls.name == name).values(version=cls.version + 1, updated_at=now)
+            )
+            if not result.rowcount:
+                connection.execute(sa.insert(cls).values(name=name, version=1, updated_at=now))
+
+    @classmethod
+    def get(cls, tables):
+        """
+        Reads the current version of some tables.
+
+        Args:
+            tables (iterable): The names of the tables.
+
+        Returns:
+            dict: The (version, updated_at) pair of each table, (0, None) for tables never changed.
+        """
+        tables = list(tables)
+        versions = {name: (0, None) for name in tables}
+        rows = db.session.execute(sa.select(cls.name, cls.version, cls.updated_at).where(cls.name.in_(tables)))
+        for name, version, updated_at in rows:
+            versions[name] = (version, updated_at)
+        return versions
+
+
+class PlaceCount(db.Model):
+    """
+    Number of restaurants in a place.
+
+    The counters are maintained incrementally, in the same transaction as the restaurant
+    changes, so facet counts never need a GROUP BY over the restaurants.
+
+    Attributes:
+        level (str): The hierarchy level of the place, "country", "region", "province" or "city".
+        place_id (int): The ID of the place.
+        total (int): The number of restaurants in the place.
     """
-    Loads a user by ID.
+
+    __tablename__ = "place_count"
+
+    level: so.Mapped[str] = so.mapped_column(sa.String(16), primary_key=True)
+    place_id: so.Mapped[int] = so.mapped_column(primary_key=True, autoincrement=False)
+    total: so.Mapped[int] = so.mapped_column(default=0)
+
+    COLUMNS = {
+        "country": "country_id",
+        "region": "region_id",
+        "province": "province_id",
+        "city": "city_id",
+    }
+
+    def __repr__(self):
+        return "<PlaceCount {} {} {}>".format(self.level, self.place_id, self.total)
+
+    @classmethod
+    def deltas(cls, rows, sign=1):
+        """
+        Computes the counter changes caused by adding or removing restaurants.
+
+        Args:
+            rows (iterable): The restaurants, as objects or dicts with the place ID columns.
+            sign (int): 1 for added restaurants, -1 for removed ones.
+
+        Returns:
+            Counter: The change of each counter, keyed by (level, place ID).
+        """
+        deltas = Counter()
+        for row in rows:
+            for level, column in cls.COLUMNS.items():
+                place_id = row[column] if isinstance(row, dict) else getattr(row, column)
+                deltas[(level, place_id)] += sign
+        return deltas
+
+    @classmethod
+    def apply(cls, connection, deltas):
+        """
+        Applies counter changes.
+
+        Args:
+            connection (Connection): The connection to execute the statements on, part of the
+                transaction that changed the restaurants.
+            deltas (Counter): The change of each counter, keyed by (level, place ID).
+        """
+        for (level, place_id), delta in sorted(deltas.items()):
+            if not delta:
+                continue
+            result = connection.execute(
+                sa.update(cls).where(cls.level == level, cls.place_id == place_id).values(total=cls.total + delta)
+            )
+            if not result.rowcount:
+                connection.execute(sa.insert(cls).values(level=level, place_id=place_id, total=delta))
+
+    @classmethod
+    def rebuild(cls, connection):
+        """
+        Recomputes every counter from the restaurants, set-based.
+
+        Args:
+            connection (Connection): The connection to execute the statements on.
+        """
+        connection.execute(sa.delete(cls))
+        for level, column in cls.COLUMNS.items():
+            place_id = getattr(Restaurant, column)
+            source = sa.select(sa.literal(level), place_id, sa.func.count()).group_by(place_id)
+            connection.execute(sa.insert(cls).from_select(["level", "place_id", "total"], source))
+
+    @classmethod
+    def totals(cls, level, place_ids=None):
+        """
+        Reads the counters of a level.
+
+        Args:
+            level (str): The hierarchy level.
+            place_ids (iterable, optional): The places to read. All of them if omitted.
+
+        Returns:
+            dict: The number of restaurants by place ID, for places that have any.
+        """
+        query = sa.select(cls.place_id, cls.total).where(cls.level == level)
+        if place_ids is not None:
+            query = query.where(cls.place_id.in_(list(place_ids)))
+        return dict(db.session.execute(query).all())
+
+
+# FTS5 external-content table over restaurant_listing, created and maintained by triggers in
+# the migrations rather than through the metadata
+SEARCH_INDEX = sa.table("restaurant_search", sa.column("rowid"), sa.column("rank"))
+
+
+@sa.event.listens_for(so.Session, "after_flush")
+def sync_restaurant_listing(session, flush_context):
+    """
+    Keeps the restaurant listing read model in sync with the flushed changes.
+
+    Runs inside the flushing transaction, so the listing commits or rolls back together
+    with the changes that caused it.
 
     Args:
-        id (int): The ID of the user to load.
+        session (Session): The session that was flushed.
+        flush_context (UOWTransaction): The flush context.
+    """
+    restaurant_ids = set()
+    renamed = []
+    for obj in session.new:
+        if isinstance(obj, Restaurant):
+            restaurant_ids.add(obj.id)
+    for obj in session.dirty:
+        if isinstance(obj, Restaurant) and session.is_modified(obj):
+            restaurant_ids.add(obj.id)
+        elif type(obj) in RestaurantListing.PLACES and sa.inspect(obj).attrs.name.history.has_changes():
+            renamed.append(obj)
+    for obj in session.deleted:
+        if isinstance(obj, Restaurant):
+            restaurant_ids.add(obj.id)
+    if not restaurant_ids and not renamed:
+        return
+    connection = session.connection()
+    for place in renamed:
+        RestaurantListing.rename_place(connection, place)
+    RestaurantListing.refresh(connection, restaurant_ids)
+
+
+@sa.event.listens_for(so.Session, "after_flush")
+def sync_place_counts(session, flush_context):
+    """
+    Keeps the place counters in sync with the flushed restaurant changes.
 
-    Returns:
-        User: The user object.
+    New restaurants are added to their places and deleted ones removed. Restaurants moved to
+    another place are removed from the old one and added to the new one.
+
+    Args:
+        session (Session): The session that was flushed.
+        flush_context (UOWTransaction): The flush context.
     """
-    return db.session.get(User, int(id))
+    deltas = Counter()
+    deltas.update(PlaceCount.deltas(obj for obj in session.new if isinstance(obj, Restaurant)))
+    for obj in session.deleted:
+        if isinstance(obj, Restaurant):
+            attrs = sa.inspect(obj).attrs
+            for level, column in PlaceCount.COLUMNS.items():
+                history = attrs[column].history
+                values = history.deleted or history.unchanged
+                if values:
+                    deltas[(level, values[0])] -= 1
+    for obj in session.dirty:
+        if isinstance(obj, Restaurant):
+            attrs = sa.inspect(obj).attrs
+            for level, column in PlaceCount.COLUMNS.items():
+                history = attrs[column].history
+                if history.added and history.deleted and history.added[0] != history.deleted[0]:
+                    deltas[(level, history.deleted[0])] -= 1
+                    deltas[(level, history.added[0])] += 1
+    if any(deltas.values()):
+        PlaceCount.apply(session.connection(), deltas)
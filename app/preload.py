@@ -0,0 +1,191 @@
+"""
+This module prepares an application to be forked into many workers.
+
+With PRELOAD_APP set, ``create_app`` ends with a warm-up phase: every template is compiled
+and stored in a Jinja bytecode cache on disk, the translations of every language are
+loaded, and the place hierarchy is read. Under a preloading server such as
+``gunicorn --preload``, the workers inherit that state through fork and start serving at
+once. The warm-up closes its database connections before any fork, and each child drops
+the pools it inherited, since a connection must never be shared between processes.
+
+Every phase of ``create_app`` is timed, and ``flask startup-profile`` reports the times
+along with the slowest imports.
+
+Modules:
+    os: Provides a way of using operating system dependent functionality.
+    time: Provides time-related functions.
+    weakref: Provides weak references to objects.
+    contextmanager: Decorator for defining context managers.
+    SQLAlchemyError: Base class of the SQLAlchemy errors.
+    FileSystemBytecodeCache: Jinja cache storing compiled templates on disk.
+    g: Namespace object for storing data during an application context.
+    force_locale, get_translations: Flask-Babel functions loading the translations of a language.
+"""
+
+import os
+import time
+import weakref
+from contextlib import contextmanager
+
+from flask import g
+from flask_babel import force_locale, get_translations
+from jinja2 import FileSystemBytecodeCache
+from sqlalchemy.exc import SQLAlchemyError
+
+# Engines whose pools forked children drop, without keeping discarded ones alive
+_forked_engines = weakref.WeakSet()
+
+
+def _drop_inherited_pools():
+    for engine in list(_forked_engines):
+        engine.dispose(close=False)
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_drop_inherited_pools)
+
+
+class StartupProfile:
+    """
+    Durations of the startup phases of an application.
+
+    Attributes:
+        phases (list): The name and duration in seconds of each phase, in order.
+    """
+
+    def __init__(self):
+        self.phases = []
+
+    @contextmanager
+    def phase(self, name):
+        """
+        Times a phase.
+
+        Args:
+            name (str): The name of the phase.
+        """
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases.append((name, time.perf_counter() - started))
+
+    @property
+    def total(self):
+        """
+        The duration of all the phases, in seconds.
+        """
+        return sum(seconds for _, seconds in self.phases)
+
+
+def init_bytecode_cache(app):
+    """
+    Stores the compiled templates of an application in TEMPLATE_CACHE_DIR.
+
+    Without TEMPLATE_CACHE_DIR, a preloaded application stores them in the jinja directory
+    of its instance folder, and any other application keeps them in memory only.
+
+    Args:
+        app (Flask): The application.
+    """
+    directory = app.config.get("TEMPLATE_CACHE_DIR")
+    if not directory and app.config.get("PRELOAD_APP"):
+        directory = os.path.join(app.instance_path, "jinja")
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+        app.jinja_env.bytecode_cache = FileSystemBytecodeCache(directory)
+
+
+def compile_templates(app):
+    """
+    Compiles every template of an application, through the bytecode cache if any.
+
+    Args:
+        app (Flask): The application.
+
+    Returns:
+        int: The number of templates compiled.
+    """
+    names = [name for name in app.jinja_env.list_templates() if name.endswith(".html")]
+    for name in names:
+        app.jinja_env.get_template(name)
+    return len(names)
+
+
+def load_translations(app):
+    """
+    Loads the translations of every language of an application.
+
+    Flask-Babel keeps the catalogs it loads for the life of the process.
+
+    Args:
+        app (Flask): The application.
+    """
+    with app.app_context():
+        # Flask-Babel only keeps its state in g once g holds something
+        g.preloading = True
+        for language in app.config["LANGUAGES"]:
+            with force_locale(language):
+                get_translations()
+
+
+def load_hierarchy(app, db):
+    """
+    Reads the place hierarchy, unless the database is not ready.
+
+    Args:
+        app (Flask): The application.
+        db (SQLAlchemy): The database extension.
+
+    Returns:
+        bool: Whether the hierarchy was loaded.
+    """
+    from app.hierarchy import get_hierarchy
+
+    with app.app_context():
+        try:
+            get_hierarchy()
+        except SQLAlchemyError as error:
+            app.logger.warning("Place hierarchy not preloaded: %s", error)
+            db.session.rollback()
+            return False
+        finally:
+            db.session.remove()
+    return True
+
+
+def dispose_engines(app, db):
+    """
+    Closes the pooled connections of an application, and has forked children drop theirs.
+
+    The children call Engine.dispose(close=False), which gives them new pools without
+    closing the connections the parent may still be using.
+
+    Args:
+        app (Flask): The application.
+        db (SQLAlchemy): The database extension.
+    """
+    with app.app_context():
+        engines = list(db.engines.values())
+    for engine in engines:
+        engine.dispose()
+        _forked_engines.add(engine)
+
+
+def warm_up(app, db, profile):
+    """
+    Runs the warm-up phases of an application.
+
+    Args:
+        app (Flask): The application.
+        db (SQLAlchemy): The database extension.
+        profile (StartupProfile): The profile recording the phases.
+    """
+    with profile.phase("templates"):
+        compile_templates(app)
+    with profile.phase("translations"):
+        load_translations(app)
+    with profile.phase("hierarchy"):
+        load_hierarchy(app, db)
+    with profile.phase("dispose engines"):
+        dispose_engines(app, db)
@@ -0,0 +1,137 @@
+"""
+This module routes the queries of the application between the primary database and a
+read-only replica.
+
+When SQLALCHEMY_BINDS defines a "replica" bind, the queries run while handling a GET or
+HEAD request go to the replica, and everything else goes to the primary: requests with
+other methods, commands, flushes and any query following a flush in the same session. A
+commit also makes the client stick to the primary for REPLICA_STICKY_SECONDS, so the page
+it is redirected to reads its own writes even when the replica lags behind.
+
+Modules:
+    time: Provides time-related functions.
+    sqlalchemy: SQLAlchemy library for database operations.
+    has_request_context: Function telling whether a request is being handled.
+    current_app: Proxy for the current application.
+    request: Proxy for the current request.
+    session: Proxy for the current user session.
+    Session: Flask-SQLAlchemy session class choosing the engine of each query.
+"""
+
+import time
+
+import sqlalchemy as sa
+from flask import current_app, has_request_context, request, session
+from flask_sqlalchemy.session import Session
+
+REPLICA = "replica"
+READ_METHODS = ("GET", "HEAD")
+STICKY_KEY = "_primary_until"
+
+
+class RoutingSession(Session):
+    """
+    Session sending the queries of read-only requests to the replica bind, if there is one.
+    """
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        """
+        Selects the engine of a query.
+
+        Args:
+            mapper (Mapper, optional): The mapper of the queried model.
+            clause (ClauseElement, optional): The statement being executed.
+            bind (Engine | Connection, optional): An engine explicitly requested by the caller.
+
+        Returns:
+            Engine | Connection: The replica engine for reads in read-only requests,
+            otherwise the engine chosen by the Flask-SQLAlchemy session.
+        """
+        if bind is None and self._reads_from_replica():
+            replica = self._db.engines.get(REPLICA)
+            if replica is not None:
+                return replica
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+    def _reads_from_replica(self):
+        """
+        Tells whether the queries of the session may read from the replica.
+
+        Returns:
+            bool: Whether a read-only request is being handled, by a client that did not
+            just commit, and nothing was flushed by the session.
+        """
+        if self._flushing or self.info.get("wrote") or not has_request_context():
+            return False
+        if request.method not in READ_METHODS:
+            return False
+        return session.get(STICKY_KEY, 0) < time.time()
+
+
+@sa.event.listens_for(RoutingSession, "after_flush")
+def stick_to_primary(db_session, flush_context):
+    """
+    Sends the remaining queries of a session that wrote something to the primary.
+
+    Args:
+        db_session (Session): The session that was flushed.
+        flush_context (UOWTransaction): The flush context.
+    """
+    mark_written(db_session)
+
+
+def mark_written(db_session):
+    """
+    Records that a session wrote to the primary, so its remaining queries and the following
+    requests of the client are sent to the primary.
+
+    Flushes call it, and code writing with Core statements through the session must call it.
+
+    Args:
+        db_session (Session): The session.
+    """
+    db_session.info["wrote"] = True
+
+
+@sa.event.listens_for(RoutingSession, "after_commit")
+def stick_client_to_primary(db_session):
+    """
+    Sends the following requests of the client that committed to the primary for a while.
+
+    Args:
+        db_session (Session): The session that committed.
+    """
+    if db_session.info.get("wrote") and has_request_context():
+        seconds = current_app.config.get("REPLICA_STICKY_SECONDS", 0)
+        if seconds:
+            session[STICKY_KEY] = time.time() + seconds
+
+
+def query_only(dbapi_connection, connection_record):
+    """
+    Makes a SQLite connection refuse to write.
+
+    Args:
+        dbapi_connection (Connection): The new DBAPI connection.
+        connection_record (ConnectionRecord): The pool record of the connection.
+    """
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA query_only = ON")
+    cursor.close()
+
+
+def init_app(app, db):
+    """
+    Prepares the replica engine of an application, if it has one.
+
+    A SQLite replica is opened in query-only mode, so a query wrongly routed to it fails
+    instead of writing to a copy that is about to be overwritten.
+
+    Args:
+        app (Flask): The application.
+        db (SQLAlchemy): The database extension, already initialised for the application.
+    """
+    with app.app_context():
+        replica = db.engines.get(REPLICA)
+    if replica is not None and replica.dialect.name == "sqlite":
+        sa.event.listen(replica, "connect", query_only)
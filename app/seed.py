@@ -0,0 +1,179 @@
+"""
+This module generates synthetic restaurant data for scale testing.
+
+It builds a complete Country, Region, Province, City and Restaurant tree with a fixed
+fan-out per level and a given total of restaurants, spread over the cities with a skewed,
+city-size-like distribution. Everything is drawn from a seeded generator, so the same
+options always produce the same data. Names are made unique by a sequence number that
+continues after the highest ID of each table, so seeding a database twice adds to it.
+
+Places get explicit IDs, so restaurants can reference them without reading them back.
+Restaurants are generated a city at a time, a batch of names and addresses per call
+to the generator, and inserted with executemany in chunked transactions that also
+refresh the listing, the place counters and the data versions, as the bulk import does.
+
+Modules:
+    random: Provides pseudo-random number generators.
+    sqlalchemy: SQLAlchemy library for database operations.
+    LEVELS: The place models of each level, with their parent column.
+    models: Contains the database models for the application.
+"""
+
+import random
+
+import sqlalchemy as sa
+
+from app.bulk import LEVELS
+from app.models import DataVersion, PlaceCount, Restaurant, RestaurantListing
+
+PREFIXES = ("Sant", "Santa", "Vila", "Castell", "Torre", "Font", "Riu", "Mont", "Pobla", "Serra", "Coll", "Pla")
+ROOTS = ("nova", "franca", "blanca", "seca", "alta", "del Mar", "de Dalt", "d'Avall", "rodona", "verda", "vella")
+KINDS = ("Bar", "Restaurant", "Cafè", "Taverna", "Bistrot", "Braseria", "Pizzeria", "Celler", "Fonda", "Marisqueria")
+WORDS = ("del Port", "La Plaça", "Can Pere", "El Racó", "La Lluna", "El Forn", "Cal Tet", "La Vinya", "El Mirador", "Sol")
+STREETS = ("Carrer Major", "Carrer Nou", "Avinguda Diagonal", "Passeig de Gràcia", "Rambla", "Plaça Gran", "Camí Ral")
+
+
+def place_names(rng, count, start):
+    """
+    Generates unique place names.
+
+    Args:
+        rng (Random): The generator.
+        count (int): The number of names.
+        start (int): The sequence number of the first name.
+
+    Returns:
+        list: The names.
+    """
+    prefixes = rng.choices(PREFIXES, k=count)
+    roots = rng.choices(ROOTS, k=count)
+    return ["{} {} {}".format(prefix, root, start + i) for i, (prefix, root) in enumerate(zip(prefixes, roots))]
+
+
+def restaurant_rows(rng, count, start, places):
+    """
+    Generates the rows of the restaurants of a city.
+
+    Args:
+        rng (Random): The generator.
+        count (int): The number of restaurants.
+        start (int): The ID of the first restaurant, also its sequence number.
+        places (dict): The place ID columns of the city.
+
+    Returns:
+        list: The restaurant rows, as dicts of column values.
+    """
+    kinds = rng.choices(KINDS, k=count)
+    words = rng.choices(WORDS, k=count)
+    streets = rng.choices(STREETS, k=count)
+    numbers = rng.choices(range(1, 400), k=count)
+    return [
+        {
+            "id": start + i,
+            "name": "{} {} {}".format(kind, word, start + i),
+            "address": "{}, {}".format(street, number),
+            **places,
+        }
+        for i, (kind, word, street, number) in enumerate(zip(kinds, words, streets, numbers))
+    ]
+
+
+def spread(rng, total, buckets):
+    """
+    Splits a total over buckets with a skewed distribution.
+
+    Args:
+        rng (Random): The generator.
+        total (int): The total to split.
+        buckets (int): The number of buckets.
+
+    Returns:
+        list: The share of each bucket, adding up to the total.
+    """
+    weights = [rng.paretovariate(1.5) for _ in range(buckets)]
+    scale = total / sum(weights)
+    shares = [int(weight * scale) for weight in weights]
+    for i in rng.sample(range(buckets), total - sum(shares)):
+        shares[i] += 1
+    return shares
+
+
+def _next_id(connection, model):
+    return (connection.scalar(sa.select(sa.func.max(model.id))) or 0) + 1
+
+
+def seed(connection, fan_out, restaurants, seed_value=0, chunk_size=50000, progress=None):
+    """
+    Generates a place hierarchy and its restaurants.
+
+    Args:
+        connection (Connection): The connection to insert with, outside any transaction.
+        fan_out (dict): The number of countries, and of children of each place for the
+            other levels, keyed by level.
+        restaurants (int): The total number of restaurants.
+        seed_value (int): The seed of the generator.
+        chunk_size (int): The number of restaurants inserted per transaction.
+        progress (callable, optional): Called after each chunk with the restaurants inserted so far.
+
+    Returns:
+        dict: The number of places created for each level, and of restaurants.
+    """
+    rng = random.Random(seed_value)
+    created = {}
+    with connection.begin():
+        paths = [{}]
+        for level, model, parent in LEVELS:
+            start = _next_id(connection, model)
+            names = iter(place_names(rng, len(paths) * fan_out[level], start))
+            rows, children = [], []
+            for path in paths:
+                for _ in range(fan_out[level]):
+                    place_id = start + len(rows)
+                    row = {"id": place_id, "name": next(names)}
+                    if parent:
+                        row[parent] = path[parent]
+                    rows.append(row)
+                    children.append({**path, "{}_id".format(level): place_id})
+            if rows:
+                connection.execute(sa.insert(model), rows)
+            created[level] = len(rows)
+            paths = children
+        DataVersion.bump(connection, {model.__tablename__ for level, model, _ in LEVELS if created[level]})
+        start = _next_id(connection, Restaurant)
+
+    cities = paths
+    shares = spread(rng, restaurants, len(cities)) if cities else []
+    inserted = 0
+    chunk = []
+    for places, share in zip(cities, shares):
+        chunk.extend(restaurant_rows(rng, share, start + inserted + len(chunk), places))
+        while len(chunk) >= chunk_size:
+            _insert_chunk(connection, chunk[:chunk_size])
+            inserted += chunk_size
+            chunk = chunk[chunk_size:]
+            if progress is not None:
+                progress(inserted)
+    if chunk:
+        _insert_chunk(connection, chunk)
+        inserted += len(chunk)
+        if progress is not None:
+            progress(inserted)
+    created["restaurant"] = inserted
+    return created
+
+
+def _insert_chunk(connection, rows):
+    """
+    Inserts a chunk of restaurants with consecutive IDs, and the data derived from them.
+
+    Args:
+        connection (Connection): The connection to insert with, outside any transaction.
+        rows (list): The restaurant rows.
+    """
+    with connection.begin():
+        connection.execute(sa.insert(Restaurant), rows)
+        RestaurantListing.refresh(
+            connection, sa.select(Restaurant.id).where(Restaurant.id.between(rows[0]["id"], rows[-1]["id"]))
+        )
+        PlaceCount.apply(connection, PlaceCount.deltas(rows))
+        DataVersion.bump(connection, {Restaurant.__tablename__})
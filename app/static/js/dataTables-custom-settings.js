@@ -1,9 +1,13 @@
 // Configure DataTable
 $(document).ready(function() {
-    var table = $('#restaurantTable').DataTable({
+    var $table = $('#restaurantTable');
+    // Cursor returned with the last page, used to fetch the following one by keyset
+    var cursor = null;
+
+    var options = {
         // Configure column definitions
         "columnDefs": [
-            { "searchable": false, "targets": 6 }  // Disable search in the "Actions" column
+            { "searchable": false, "orderable": false, "targets": 6 }  // Disable search and sorting in the "Actions" column
         ],
         // Set the initial order of the columns
         order: [[0, 'asc'], [2, 'asc']],
@@ -28,5 +32,44 @@ $(document).ready(function() {
                 }
             }
         }
-    });
+    };
+
+    // Sort, filter and page on the server, unless the rows were streamed with the page
+    if ($table.data('ajax-url')) {
+        $.extend(options, {
+            processing: true,
+            serverSide: true,
+            ajax: {
+                url: $table.data('ajax-url'),
+                data: function(d) {
+                    if (cursor) {
+                        d.cursor = cursor;
+                    }
+                },
+                dataSrc: function(json) {
+                    cursor = json.cursor;
+                    return json.data;
+                }
+            },
+            columns: [
+                { data: 'name', render: DataTable.render.text() },
+                { data: 'address', render: DataTable.render.text() },
+                { data: 'city', render: DataTable.render.text() },
+                { data: 'province', render: DataTable.render.text() },
+                { data: 'region', render: DataTable.render.text() },
+                { data: 'country', render: DataTable.render.text() },
+                {
+                    data: 'edit_url',
+                    render: function(url) {
+                        var $action = url
+                            ? $('<a class="btn btn-primary">').attr('href', url)
+                            : $('<button class="btn btn-primary" disabled>');
+                        return $action.text($table.data('edit-label')).prop('outerHTML');
+                    }
+                }
+            ]
+        });
+    }
+
+    var table = $table.DataTable(options);
 });
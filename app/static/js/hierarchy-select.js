@@ -0,0 +1,41 @@
+// Load the place options of the edit form on demand
+$(document).ready(function() {
+    var $selects = $('select[data-places-url]');
+
+    // Fetch the options of a select, once, keeping the current selection
+    function load($select) {
+        if ($select.data('loaded')) {
+            return;
+        }
+        var params = {};
+        var parent = $select.data('parent');
+        if (parent) {
+            params[parent] = $('#' + parent + '_id').val();
+            if (!params[parent]) {
+                return;
+            }
+        }
+        $select.data('loaded', true);
+        $.getJSON($select.data('places-url'), params).done(function(places) {
+            var selected = $select.val();
+            $select.empty().append($('<option value="">'));
+            $.each(places, function(i, place) {
+                $select.append($('<option>').val(place.id).text(place.name));
+            });
+            $select.val(selected);
+        }).fail(function() {
+            $select.data('loaded', false);
+        });
+    }
+
+    $selects.on('focus mousedown', function() {
+        load($(this));
+    });
+
+    // Changing a place invalidates every place below it
+    $selects.on('change', function() {
+        $selects.slice($selects.index(this) + 1).each(function() {
+            $(this).empty().data('loaded', false);
+        });
+    });
+});
@@ -0,0 +1,218 @@
+"""
+This module tracks data versions and answers conditional GET requests from them.
+
+Every flush that changes rows increases the DataVersion counter of the affected tables,
+inside the same transaction, and the data_changed signal announces the tables once the
+transaction commits, so in-process caches can drop what they derived from them. Views
+decorated with ``conditional`` get a strong ETag and a Last-Modified date computed from
+those counters, the place hierarchy snapshot the page is built from, the locale, the
+authenticated user and the request URL, and answer 304
+Not Modified before running any other query or rendering any template when the client
+already has the current page.
+
+Modules:
+    functools: Provides higher-order functions and operations on callable objects.
+    os: Provides a way of using operating system dependent functionality.
+    Namespace: Blinker namespace for creating signals.
+    sqlalchemy: SQLAlchemy library for database operations.
+    sqlalchemy.orm: SQLAlchemy ORM components.
+    xxhash: Provides fast non-cryptographic hashing.
+    current_app: Proxy for the current application.
+    g: Namespace object for storing data during a request.
+    make_response: Function to convert a view return value into a response object.
+    request: Proxy for the current request.
+    session: Proxy for the current user session.
+    current_user: Proxy for the current logged-in user.
+    get_locale: Function that selects the locale of the request.
+    DataVersion: Model storing the version counters.
+"""
+
+import functools
+import os
+
+import sqlalchemy as sa
+import sqlalchemy.orm as so
+import xxhash
+from blinker import Namespace
+from flask import current_app, g, make_response, request, session
+from flask_login import current_user
+
+from app import get_locale
+from app.models import DataVersion
+
+signals = Namespace()
+
+# Sent after a commit with the names of the tables it changed, as the ``tables`` keyword argument
+data_changed = signals.signal("data-changed")
+
+
+@sa.event.listens_for(so.Session, "after_flush")
+def bump_versions(db_session, flush_context):
+    """
+    Increases the data version of every table changed by a flush.
+
+    Args:
+        db_session (Session): The session that was flushed.
+        flush_context (UOWTransaction): The flush context.
+    """
+    tables = set()
+    for obj in (*db_session.new, *db_session.deleted):
+        tables.add(sa.inspect(obj).mapper.local_table.name)
+    for obj in db_session.dirty:
+        if db_session.is_modified(obj):
+            tables.add(sa.inspect(obj).mapper.local_table.name)
+    record_changes(db_session, tables)
+
+
+def record_changes(db_session, tables):
+    """
+    Increases the data version of some tables and announces them once the session commits.
+
+    Flushes call it for the tables they changed, and code changing rows with Core
+    statements through the session must call it for the tables it changed.
+
+    Args:
+        db_session (Session): The session holding the transaction that changed the tables.
+        tables (iterable): The names of the changed tables.
+    """
+    tables = set(tables)
+    tables.discard(DataVersion.__tablename__)
+    if tables:
+        DataVersion.bump(db_session.connection(), tables)
+        db_session.info.setdefault("changed_tables", set()).update(tables)
+
+
+@sa.event.listens_for(so.Session, "after_commit")
+def announce_changes(db_session):
+    """
+    Sends the data_changed signal for the tables changed by a committed transaction.
+
+    Args:
+        db_session (Session): The session that committed.
+    """
+    tables = db_session.info.pop("changed_tables", None)
+    if tables:
+        data_changed.send(db_session, tables=frozenset(tables))
+
+
+@sa.event.listens_for(so.Session, "after_soft_rollback")
+def forget_changes(db_session, previous_transaction):
+    """
+    Forgets the changed tables when the transaction is rolled back.
+
+    Args:
+        db_session (Session): The session that rolled back.
+        previous_transaction (SessionTransaction): The transaction that was rolled back.
+    """
+    db_session.info.pop("changed_tables", None)
+
+
+def _code_version():
+    """
+    Identifies the templates and translations the pages are rendered with.
+
+    Deploying new templates, catalogs or static assets must change the ETags even if no
+    data changed, since the pages link to the fingerprinted asset URLs.
+
+    Returns:
+        str: A digest of the template, translation and built asset files.
+    """
+    version = current_app.extensions.get("code_version")
+    if version is None:
+        digest = xxhash.xxh64()
+        for folder in (current_app.template_folder, "translations", os.path.join("static", "dist")):
+            root = os.path.join(current_app.root_path, folder)
+            for dirpath, dirnames, filenames in os.walk(root):
+                dirnames.sort()
+                for filename in sorted(filenames):
+                    path = os.path.join(dirpath, filename)
+                    stat = os.stat(path)
+                    digest.update("{}\0{}\0{}\n".format(os.path.relpath(path, root), stat.st_size, stat.st_mtime_ns))
+        version = current_app.extensions["code_version"] = digest.hexdigest()
+    return version
+
+
+def data_versions(tables):
+    """
+    Reads the data versions of some tables, once per request.
+
+    Args:
+        tables (iterable): The names of the tables.
+
+    Returns:
+        dict: The (version, updated_at) pair of each table.
+    """
+    cache = g.setdefault("data_versions", {})
+    missing = [name for name in tables if name not in cache]
+    if missing:
+        cache.update(DataVersion.get(missing))
+    return {name: cache[name] for name in tables}
+
+
+def conditional(*tables):
+    """
+    Decorator answering conditional GET requests for a view.
+
+    The view output must depend only on the given tables, the locale, the authenticated user
+    and the request URL. Requests with pending flash messages are always rendered, since the
+    page has to display them.
+
+    Views reading place tables render them from the hierarchy snapshot of the worker, which
+    can lag behind the data versions after a change committed by another process, so its
+    version is part of the ETag too: a page rendered from an old snapshot is not revalidated
+    once the snapshot is reloaded.
+
+    Args:
+        *tables (str): The names of the tables the view reads.
+
+    Returns:
+        function: The decorator.
+    """
+
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            if request.method not in ("GET", "HEAD") or "_flashes" in session:
+                return view(*args, **kwargs)
+
+            from app.hierarchy import TABLES as PLACE_TABLES  # pylint: disable=import-outside-toplevel
+            from app.hierarchy import get_hierarchy  # pylint: disable=import-outside-toplevel
+
+            versions = data_versions(tables)
+            digest = xxhash.xxh64()
+            digest.update(_code_version())
+            for name in tables:
+                digest.update("\0{}={}".format(name, versions[name][0]))
+            if not PLACE_TABLES.isdisjoint(tables):
+                digest.update("\0hierarchy={}".format(get_hierarchy().version))
+            digest.update("\0{}\0{}\0{}".format(get_locale(), current_user.get_id(), request.full_path))
+            etag = digest.hexdigest()
+            changes = [updated_at for _, updated_at in versions.values() if updated_at is not None]
+            last_modified = max(changes) if changes else None
+
+            if request.if_none_match:
+                # Weak comparison, so the weak ETag of a compressed response still matches
+                not_modified = request.if_none_match.contains_weak(etag)
+            else:
+                not_modified = (
+                    last_modified is not None
+                    and request.if_modified_since is not None
+                    and last_modified.replace(microsecond=0) <= request.if_modified_since.replace(tzinfo=None)
+                )
+            if not_modified:
+                response = current_app.response_class(status=304)
+            else:
+                response = make_response(view(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+            response.set_etag(etag)
+            if last_modified is not None:
+                response.last_modified = last_modified
+            response.cache_control.private = True
+            response.cache_control.no_cache = True
+            response.vary.update(("Accept-Language", "Cookie"))
+            return response
+
+        return wrapper
+
+    return decorator
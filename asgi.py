@@ -0,0 +1,13 @@
+"""
+This module creates the ASGI application of the read-only API.
+
+It runs next to the Flask application of run.py, served by any ASGI server, such as
+``uvicorn asgi:app --port 5001``.
+
+Modules:
+    create_asgi_app: Function to create the ASGI application of the read-only API.
+"""
+
+from app.asyncapi import create_asgi_app
+
+app = create_asgi_app()
@@ -0,0 +1,12 @@
+"""
+Load and latency benchmarks of the web endpoints.
+
+The suite builds the application with ``create_app`` against a generated SQLite database
+of a given number of restaurants, drives a fixed set of scenarios first through the Flask
+test client and then over HTTP with a multi-threaded load generator, and compares the
+results with a JSON baseline. Run it with ``python -m benchmarks --help`` or ``make benchmark``.
+
+Modules:
+    dataset: Generation of the benchmark databases.
+    harness: Scenarios, measurements and baseline comparison.
+"""
@@ -0,0 +1,135 @@
+"""
+Command-line entry point of the benchmark suite.
+
+Builds the database of the requested size if it does not exist yet, runs the scenarios
+through the test client and over HTTP, prints the results, and compares them with the
+baseline of the same size. The exit status is 1 when a result regressed past the
+threshold. Without a baseline for the size, or with --update-baseline, the results become
+the new baseline.
+
+Modules:
+    argparse: Provides command-line argument parsing.
+    json: Provides JSON encoding and decoding.
+    os: Provides a way of using operating system dependent functionality.
+    platform: Provides details of the interpreter and the machine.
+    sys: Provides access to the interpreter.
+    datetime, timezone: Classes for manipulating dates and times.
+    create_app: Function to create the Flask application instance.
+    dataset: Generation of the benchmark databases.
+    harness: Scenarios, measurements and baseline comparison.
+"""
+
+import argparse
+import json
+import os
+import platform
+import sys
+from datetime import datetime, timezone
+
+from app import create_app
+from benchmarks import dataset, harness
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+def print_results(results):
+    """
+    Prints the results of a run as a table.
+
+    Args:
+        results (dict): The results of the run.
+    """
+    print(
+        "{:<26} {:>8} {:>9} {:>9} {:>9} {:>10} {:>8} {:>7}".format(
+            "scenario", "requests", "p50 ms", "p95 ms", "p99 ms", "req/s", "queries", "errors"
+        )
+    )
+    for phase in ("client", "http"):
+        for name, summary in results.get(phase, {}).items():
+            print(
+                "{:<26} {:>8} {:>9.2f} {:>9.2f} {:>9.2f} {:>10.1f} {:>8} {:>7}".format(
+                    "{} {}".format(phase, name),
+                    summary["requests"],
+                    summary["p50"],
+                    summary["p95"],
+                    summary["p99"],
+                    summary["throughput"],
+                    summary.get("queries", "-"),
+                    summary["errors"],
+                )
+            )
+    print("peak RSS: {} MiB".format(results["peak_rss_mb"]))
+
+
+def main(argv=None):
+    """
+    Runs the benchmarks.
+
+    Args:
+        argv (list, optional): The command-line arguments, sys.argv by default.
+
+    Returns:
+        int: The exit status.
+    """
+    parser = argparse.ArgumentParser(prog="python -m benchmarks", description="Benchmark the web endpoints.")
+    parser.add_argument("--size", default="1k", help="Restaurants in the database: 1k, 100k, 1m or a number.")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the generated data and requests.")
+    parser.add_argument("--requests", type=int, default=200, help="Requests per scenario.")
+    parser.add_argument("--threads", type=int, default=8, help="Concurrent HTTP clients.")
+    parser.add_argument(
+        "--scenario",
+        action="append",
+        choices=[scenario.name for scenario in harness.SCENARIOS],
+        help="Scenario to run, all by default. Can be repeated.",
+    )
+    parser.add_argument("--no-http", action="store_true", help="Only run the test client phase.")
+    parser.add_argument("--data-dir", default=os.path.join(HERE, "data"), help="Directory of the generated databases.")
+    parser.add_argument("--baseline", default=os.path.join(HERE, "baseline.json"), help="Baseline file.")
+    parser.add_argument("--threshold", type=float, default=0.25, help="Tolerated relative regression.")
+    parser.add_argument("--update-baseline", action="store_true", help="Store the results as the new baseline.")
+    parser.add_argument("--output", help="Also write the results to this JSON file.")
+    args = parser.parse_args(argv)
+
+    size = dataset.parse_size(args.size)
+    database = harness.ensure_database(args.data_dir, size, args.seed)
+
+    scenarios = [scenario for scenario in harness.SCENARIOS if not args.scenario or scenario.name in args.scenario]
+    app = create_app(harness.config_for(database))
+    results = {
+        "size": size,
+        "seed": args.seed,
+        "date": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "client": harness.run_client(app, scenarios, size, args.requests, seed=args.seed),
+    }
+    if not args.no_http:
+        results["http"] = harness.run_http(app, scenarios, size, args.requests, args.threads, seed=args.seed)
+    results["peak_rss_mb"] = harness.peak_rss()
+    print_results(results)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            json.dump(results, file, indent=2)
+
+    baselines = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline, encoding="utf-8") as file:
+            baselines = json.load(file)
+    key = str(size)
+    status = 0
+    if key in baselines and not args.update_baseline:
+        regressions = harness.compare(results, baselines[key], args.threshold)
+        for regression in regressions:
+            print("REGRESSION " + regression, file=sys.stderr)
+        status = 1 if regressions else 0
+        print("{} regressions against the baseline of {}".format(len(regressions), baselines[key]["date"]))
+    else:
+        baselines[key] = results
+        with open(args.baseline, "w", encoding="utf-8") as file:
+            json.dump(baselines, file, indent=2, sort_keys=True)
+        print("Baseline for {} restaurants written to {}".format(size, args.baseline))
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,268 @@
+"""
+Compares the throughput of the async API with the Flask routes under concurrent connections.
+
+Each endpoint of the read-only async API is paired with the Flask route serving the same
+data: a page of the restaurant listing, and the places of a level with their restaurant
+counts. The Flask application is served by the threaded Werkzeug server of the benchmark
+suite, and the async API by a minimal asyncio HTTP server, each in a process of its own
+so the clients do not compete with it for the interpreter. Both answer one request per
+connection, and are loaded with the same requests at increasing numbers of concurrent
+connections.
+
+    python -m benchmarks.concurrency --size 100k --connections 1,16,64
+
+Modules:
+    argparse: Provides command-line argument parsing.
+    asyncio: Provides the event loop of the async server.
+    json: Provides JSON encoding and decoding.
+    multiprocessing: Provides the processes of the servers.
+    os: Provides a way of using operating system dependent functionality.
+    random: Provides pseudo-random number generators.
+    sys: Provides access to the interpreter.
+    unquote: Function decoding the path of a request.
+    make_server: Werkzeug threaded WSGI server.
+    create_app: Function to create the Flask application instance.
+    create_asgi_app: Function to create the ASGI application of the read-only API.
+    dataset: Generation of the benchmark databases.
+    harness: Scenarios, measurements and baseline comparison.
+"""
+
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import random
+import sys
+from urllib.parse import unquote
+
+from werkzeug.serving import make_server
+
+from app import create_app
+from app.asyncapi import create_asgi_app
+from benchmarks import dataset, harness
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+SERVER_START_TIMEOUT = 60
+
+
+def _listing(prefix):
+    def build(rng, size):
+        start = rng.randrange(0, max(size - 25, 1), 25)
+        if prefix:
+            return "GET", "/api/restaurants?start={}&length=25".format(start), None
+        return "GET", "/restaurants?draw=1&start={}&length=25".format(start), None
+
+    return build
+
+
+def _hierarchy(prefix):
+    def build(rng, size):
+        return "GET", "{}/regions?country={}".format(prefix, rng.randint(1, dataset.COUNTRIES)), None
+
+    return build
+
+
+# The sync and async request of each endpoint, as (name, sync build, async build)
+ENDPOINTS = (
+    ("listing", _listing(""), _listing("/api")),
+    ("hierarchy", _hierarchy("/facets"), _hierarchy("/api/places")),
+)
+
+
+def serve_sync(database, ports):
+    """
+    Serves the Flask application with the threaded Werkzeug server, until terminated.
+
+    Args:
+        database (str): The path of the database.
+        ports (Queue): Receives the port of the server once it listens.
+    """
+    app = create_app(harness.config_for(database))
+    server = make_server("127.0.0.1", 0, app, threaded=True, request_handler=harness.QuietRequestHandler)
+    ports.put(server.server_port)
+    server.serve_forever()
+
+
+async def _handle(app, reader, writer):
+    """
+    Answers the request of a connection with an ASGI application, then closes it.
+
+    Only what the read-only API needs is implemented: requests without a body, and
+    responses sent in one piece.
+
+    Args:
+        app (callable): The ASGI application.
+        reader (StreamReader): The stream of the connection.
+        writer (StreamWriter): The writer of the connection.
+    """
+    try:
+        method, target, _ = (await reader.readline()).decode("latin-1").split(" ", 2)
+        while (await reader.readline()) not in (b"\r\n", b"\n", b""):
+            pass
+        path, _, query = target.partition("?")
+        scope = {
+            "type": "http",
+            "asgi": {"version": "3.0"},
+            "http_version": "1.1",
+            "method": method,
+            "scheme": "http",
+            "path": unquote(path),
+            "raw_path": path.encode("latin-1"),
+            "query_string": query.encode("latin-1"),
+            "headers": [],
+        }
+
+        async def receive():
+            return {"type": "http.request", "body": b"", "more_body": False}
+
+        async def send(message):
+            if message["type"] == "http.response.start":
+                lines = ["HTTP/1.1 {} -".format(message["status"])]
+                lines.extend("{}: {}".format(name.decode(), value.decode()) for name, value in message["headers"])
+                lines.append("connection: close\r\n\r\n")
+                writer.write("\r\n".join(lines).encode("latin-1"))
+            else:
+                writer.write(message.get("body", b""))
+
+        await app(scope, receive, send)
+        await writer.drain()
+    except (ValueError, ConnectionError):
+        pass
+    finally:
+        writer.close()
+
+
+async def _serve_async(database, ports):
+    app = create_asgi_app(harness.config_for(database))
+    server = await asyncio.start_server(lambda reader, writer: _handle(app, reader, writer), "127.0.0.1", 0, backlog=1024)
+    ports.put(server.sockets[0].getsockname()[1])
+    await server.serve_forever()
+
+
+def serve_async(database, ports):
+    """
+    Serves the async API with a minimal asyncio HTTP server, until terminated.
+
+    Args:
+        database (str): The path of the database.
+        ports (Queue): Receives the port of the server once it listens.
+    """
+    asyncio.run(_serve_async(database, ports))
+
+
+def measure(serve, database, endpoints, size, requests, connections, seed):
+    """
+    Loads a server started in a process of its own.
+
+    Args:
+        serve (callable): The function serving the application, serve_sync or serve_async.
+        database (str): The path of the database.
+        endpoints (list): The name and request builder of each endpoint.
+        size (int): The number of restaurants in the database.
+        requests (int): The number of requests of each endpoint and concurrency.
+        connections (list): The numbers of concurrent connections to load the server with.
+        seed (int): The seed of the request arguments.
+
+    Returns:
+        dict: The summary of each endpoint, by name and then by number of connections.
+    """
+    ports = multiprocessing.Queue()
+    process = multiprocessing.Process(target=serve, args=(database, ports), daemon=True)
+    process.start()
+    results = {}
+    try:
+        port = ports.get(timeout=SERVER_START_TIMEOUT)
+        for name, build in endpoints:
+            rng = random.Random(seed)
+            harness.load(port, [build(rng, size) for _ in range(10)], 1)
+            results[name] = {}
+            for count in connections:
+                rng = random.Random(seed)
+                planned = [build(rng, size) for _ in range(max(requests, count))]
+                results[name][str(count)] = harness.load(port, planned, count)
+    finally:
+        process.terminate()
+        process.join()
+    return results
+
+
+def print_results(results):
+    """
+    Prints the results of a run as a table.
+
+    Args:
+        results (dict): The results of the run.
+    """
+    print(
+        "{:<12} {:>11} {:>11} {:>11} {:>8} {:>11} {:>11} {:>7}".format(
+            "endpoint", "connections", "sync req/s", "async req/s", "ratio", "sync p95", "async p95", "errors"
+        )
+    )
+    for name, by_count in results["sync"].items():
+        for count, sync in by_count.items():
+            current = results["async"][name][count]
+            print(
+                "{:<12} {:>11} {:>11.1f} {:>11.1f} {:>8.2f} {:>11.2f} {:>11.2f} {:>7}".format(
+                    name,
+                    count,
+                    sync["throughput"],
+                    current["throughput"],
+                    current["throughput"] / sync["throughput"],
+                    sync["p95"],
+                    current["p95"],
+                    sync["errors"] + current["errors"],
+                )
+            )
+
+
+def main(argv=None):
+    """
+    Runs the comparison.
+
+    Args:
+        argv (list, optional): The command-line arguments, sys.argv by default.
+
+    Returns:
+        int: The exit status.
+    """
+    parser = argparse.ArgumentParser(
+        prog="python -m benchmarks.concurrency", description="Compare the async API with the Flask routes."
+    )
+    parser.add_argument("--size", default="1k", help="Restaurants in the database: 1k, 100k, 1m or a number.")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the generated data and requests.")
+    parser.add_argument("--requests", type=int, default=500, help="Requests per endpoint and concurrency.")
+    parser.add_argument("--connections", default="1,16,64", help="Comma-separated numbers of concurrent connections.")
+    parser.add_argument(
+        "--endpoint",
+        action="append",
+        choices=[name for name, _, _ in ENDPOINTS],
+        help="Endpoint to run, all by default. Can be repeated.",
+    )
+    parser.add_argument("--data-dir", default=os.path.join(HERE, "data"), help="Directory of the generated databases.")
+    parser.add_argument("--output", help="Also write the results to this JSON file.")
+    args = parser.parse_args(argv)
+
+    size = dataset.parse_size(args.size)
+    connections = [int(count) for count in args.connections.split(",")]
+    database = harness.ensure_database(args.data_dir, size, args.seed)
+    try:
+        create_asgi_app(harness.config_for(database))
+    except RuntimeError as error:
+        print(error, file=sys.stderr)
+        return 1
+
+    endpoints = [endpoint for endpoint in ENDPOINTS if not args.endpoint or endpoint[0] in args.endpoint]
+    results = {"size": size, "seed": args.seed}
+    for side, serve, index in (("sync", serve_sync, 1), ("async", serve_async, 2)):
+        selected = [(endpoint[0], endpoint[index]) for endpoint in endpoints]
+        results[side] = measure(serve, database, selected, size, args.requests, connections, args.seed)
+    print_results(results)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            json.dump(results, file, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,81 @@
+"""
+This module generates the databases the benchmarks run against.
+
+A database is created with the migrations of the application, holds a benchmark user and
+is filled by the synthetic data generator of ``flask data seed``, with a place hierarchy
+sized for about fifty restaurants per city. The contents only depend on the size and the
+seed, so two runs of the same size measure the same data.
+
+Modules:
+    math: Provides mathematical functions.
+    os: Provides a way of using operating system dependent functionality.
+    upgrade: Flask-Migrate function applying the migrations.
+    db: SQLAlchemy database instance.
+    User: User model class.
+    generate: Function generating synthetic places and restaurants.
+"""
+
+import math
+import os
+
+from flask_migrate import upgrade
+
+from app import db
+from app.models import User
+from app.seed import seed as generate
+
+USERNAME = "benchmark"
+PASSWORD = "benchmark"
+SIZES = {"1k": 1000, "100k": 100000, "1m": 1000000}
+COUNTRIES = 5
+REGIONS = 5
+PROVINCES = 4
+RESTAURANTS_PER_CITY = 50
+
+
+def parse_size(size):
+    """
+    Reads a database size.
+
+    Args:
+        size (str): A size name from SIZES, or a number of restaurants.
+
+    Returns:
+        int: The number of restaurants.
+    """
+    return SIZES[size.lower()] if size.lower() in SIZES else int(size)
+
+
+def fan_out(size):
+    """
+    Returns the fan-out of the place hierarchy of a database.
+
+    Args:
+        size (int): The number of restaurants.
+
+    Returns:
+        dict: The number of countries, and of children of each place, keyed by level.
+    """
+    provinces = COUNTRIES * REGIONS * PROVINCES
+    cities = max(math.ceil(size / (RESTAURANTS_PER_CITY * provinces)), 1)
+    return {"country": COUNTRIES, "region": REGIONS, "province": PROVINCES, "city": cities}
+
+
+def build(app, size, seed=0):
+    """
+    Creates the database of an application and fills it.
+
+    Args:
+        app (Flask): The application, configured with the new database.
+        size (int): The number of restaurants.
+        seed (int): The seed of the generated data.
+    """
+    migrations = os.path.join(os.path.dirname(app.root_path), "migrations")
+    with app.app_context():
+        upgrade(directory=migrations)
+        user = User(username=USERNAME)
+        user.set_password(PASSWORD)
+        db.session.add(user)
+        db.session.commit()
+        with db.engine.connect() as connection:
+            generate(connection, fan_out(size), size, seed_value=seed)
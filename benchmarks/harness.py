@@ -0,0 +1,424 @@
+"""
+This module runs the benchmark scenarios and compares their results with a baseline.
+
+Each scenario is a request to an endpoint of the application, with arguments drawn from a
+seeded generator. The scenarios run first one at a time through the Flask test client,
+which measures the latency and the SQL statements of each request without any network,
+and then over HTTP against a threaded server with several concurrent clients, which
+measures the latency and throughput under load. Latencies are reported as percentiles in
+milliseconds.
+
+Modules:
+    http.client: Provides HTTP connections.
+    os: Provides a way of using operating system dependent functionality.
+    random: Provides pseudo-random number generators.
+    resource: Provides the resource usage of the process.
+    statistics: Provides percentiles.
+    sys: Provides access to the interpreter.
+    threading: Provides threads.
+    time: Provides time-related functions.
+    ProcessPoolExecutor, ThreadPoolExecutor: Pools of processes and threads executing calls asynchronously.
+    urlencode: Function encoding form data.
+    sqlalchemy: SQLAlchemy library for database operations.
+    WSGIRequestHandler, make_server: Werkzeug threaded WSGI server.
+    create_app: Function to create the Flask application instance.
+    db: SQLAlchemy database instance.
+    KINDS: The kinds of restaurant the generated names start with.
+    Config: Configuration class for the application.
+    dataset: Generation of the benchmark databases.
+    USERNAME, PASSWORD: Credentials of the benchmark user.
+"""
+
+import http.client
+import os
+import random
+import resource
+import statistics
+import sys
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from urllib.parse import urlencode
+
+import sqlalchemy as sa
+from werkzeug.serving import WSGIRequestHandler, make_server
+
+from app import create_app, db
+from app.seed import KINDS
+from benchmarks import dataset
+from benchmarks.dataset import PASSWORD, USERNAME
+from config import Config
+
+# Latency changes smaller than this many milliseconds are noise, not regressions
+MIN_DELTA_MS = 1.0
+LATENCY_METRICS = ("p50", "p95", "p99")
+
+
+def config_for(database):
+    """
+    Returns the configuration of an application running the benchmarks.
+
+    Args:
+        database (str): The path of the SQLite database.
+
+    Returns:
+        type: The configuration class.
+    """
+
+    class BenchmarkConfig(Config):
+        """
+        Configuration of the application under benchmark, without CSRF checks, slow query
+        plans or login limits, which would skew or refuse the repeated requests.
+        """
+
+        SQLALCHEMY_DATABASE_URI = "sqlite:///" + database
+        SQLALCHEMY_BINDS = {}
+        ASYNC_DATABASE_URL = None
+        TESTING = True
+        WTF_CSRF_ENABLED = False
+        SLOW_QUERY_THRESHOLD = 0
+        LOGIN_USERNAME_LIMIT = (10**9, 1)
+        LOGIN_ADDRESS_LIMIT = (10**9, 1)
+
+    return BenchmarkConfig
+
+
+def build_database(path, size, seed):
+    """
+    Generates a benchmark database, in a process of its own so its memory is not counted.
+
+    Args:
+        path (str): The path of the database.
+        size (int): The number of restaurants.
+        seed (int): The seed of the generated data.
+    """
+    temporary = path + ".tmp"
+    if os.path.exists(temporary):
+        os.remove(temporary)
+    dataset.build(create_app(config_for(temporary)), size, seed)
+    os.replace(temporary, path)
+
+
+def ensure_database(data_dir, size, seed):
+    """
+    Returns the benchmark database of a size, generating it if it does not exist yet.
+
+    Args:
+        data_dir (str): The directory of the generated databases.
+        size (int): The number of restaurants.
+        seed (int): The seed of the generated data.
+
+    Returns:
+        str: The path of the database.
+    """
+    database = os.path.join(os.path.abspath(data_dir), "restaurants-{}-{}.db".format(size, seed))
+    if not os.path.exists(database):
+        os.makedirs(os.path.dirname(database), exist_ok=True)
+        print("Generating {} restaurants in {}".format(size, database), file=sys.stderr)
+        with ProcessPoolExecutor(1) as executor:
+            executor.submit(build_database, database, size, seed).result()
+    return database
+
+
+class QuietRequestHandler(WSGIRequestHandler):
+    """
+    Request handler of the benchmark server, without the access log.
+    """
+
+    def log_request(self, code="-", size="-"):
+        pass
+
+
+class Scenario:
+    """
+    Request repeated by the benchmarks.
+
+    Attributes:
+        name (str): The name of the scenario in the results.
+        build (callable): Called with a random generator and the number of restaurants,
+            returns the method, path and form data of a request.
+        authenticated (bool): Whether the request is sent by a logged-in user.
+        expected (int): The status code of a successful response.
+        share (float): The fraction of the requested number of requests to send, for slow scenarios.
+    """
+
+    def __init__(self, name, build, authenticated=False, expected=200, share=1.0):
+        self.name = name
+        self.build = build
+        self.authenticated = authenticated
+        self.expected = expected
+        self.share = share
+
+    def count(self, requests):
+        """
+        Returns the number of requests to send.
+
+        Args:
+            requests (int): The requested number of requests.
+
+        Returns:
+            int: The number of requests, at least ten.
+        """
+        return max(int(requests * self.share), 10)
+
+
+def _page(rng, size, search=""):
+    query = {
+        "draw": 1,
+        "start": rng.randrange(0, max(size - 25, 1), 25),
+        "length": 25,
+        "order[0][column]": rng.randint(0, 5),
+        "order[0][dir]": rng.choice(("asc", "desc")),
+        "search[value]": search,
+    }
+    return "GET", "/restaurants?" + urlencode(query), None
+
+
+SCENARIOS = (
+    Scenario("index", lambda rng, size: ("GET", "/", None)),
+    Scenario("restaurants", _page),
+    Scenario("restaurants_search", lambda rng, size: _page(rng, 0, "{} {}".format(rng.choice(KINDS), rng.randint(1, 99)))),
+    Scenario("places", lambda rng, size: ("GET", "/places/regions?country=1", None)),
+    Scenario("facets", lambda rng, size: ("GET", "/facets/countries", None)),
+    Scenario("edit", lambda rng, size: ("GET", "/edit/{}".format(rng.randint(1, size)), None), authenticated=True),
+    Scenario(
+        "login",
+        lambda rng, size: ("POST", "/auth/login", {"username": USERNAME, "password": PASSWORD}),
+        expected=302,
+        share=0.1,
+    ),
+)
+
+
+def summarize(latencies, elapsed, errors, queries=None):
+    """
+    Summarizes the measurements of a scenario.
+
+    Args:
+        latencies (list): The latency of each request, in seconds.
+        elapsed (float): The time taken by all the requests, in seconds.
+        errors (int): The number of responses with an unexpected status.
+        queries (list, optional): The number of SQL statements of each request.
+
+    Returns:
+        dict: The percentiles and mean latency in milliseconds, the throughput in requests
+        per second, the errors, and the mean SQL statements per request if counted.
+    """
+    cuts = statistics.quantiles(latencies, n=100, method="inclusive")
+    summary = {
+        "requests": len(latencies),
+        "errors": errors,
+        "mean": round(statistics.fmean(latencies) * 1000, 3),
+        "p50": round(cuts[49] * 1000, 3),
+        "p95": round(cuts[94] * 1000, 3),
+        "p99": round(cuts[98] * 1000, 3),
+        "throughput": round(len(latencies) / elapsed, 1),
+    }
+    if queries is not None:
+        summary["queries"] = round(statistics.fmean(queries), 2)
+    return summary
+
+
+def _logged_in_client(app):
+    """
+    Returns a test client logged in as the benchmark user.
+
+    Args:
+        app (Flask): The application.
+
+    Returns:
+        FlaskClient: The client.
+    """
+    client = app.test_client()
+    response = client.post("/auth/login", data={"username": USERNAME, "password": PASSWORD})
+    if response.status_code != 302:
+        raise RuntimeError("Could not log in as {}: {}".format(USERNAME, response.status_code))
+    return client
+
+
+def run_client(app, scenarios, size, requests, seed=0, warmup=5):
+    """
+    Runs scenarios one request at a time through the test client.
+
+    Args:
+        app (Flask): The application.
+        scenarios (list): The scenarios to run.
+        size (int): The number of restaurants in the database.
+        requests (int): The number of requests of each scenario.
+        seed (int): The seed of the request arguments.
+        warmup (int): The number of requests sent before measuring.
+
+    Returns:
+        dict: The summary of each scenario, by name.
+    """
+    statements = [0]
+
+    def count_statement(conn, cursor, statement, parameters, context, executemany):
+        statements[0] += 1
+
+    with app.app_context():
+        engine = db.engine
+    sa.event.listen(engine, "after_cursor_execute", count_statement)
+    # Without cookies, the login scenario does not log the anonymous client in
+    anonymous = app.test_client(use_cookies=False)
+    authenticated = _logged_in_client(app)
+    results = {}
+    try:
+        for scenario in scenarios:
+            rng = random.Random(seed)
+            client = authenticated if scenario.authenticated else anonymous
+            latencies, queries, errors = [], [], 0
+            count = scenario.count(requests)
+            started = time.perf_counter()
+            for number in range(warmup + count):
+                method, path, data = scenario.build(rng, size)
+                before = statements[0]
+                request_started = time.perf_counter()
+                response = client.open(path, method=method, data=data)
+                response.get_data()
+                latency = time.perf_counter() - request_started
+                if number < warmup:
+                    started = time.perf_counter()
+                    continue
+                latencies.append(latency)
+                queries.append(statements[0] - before)
+                errors += response.status_code != scenario.expected
+            results[scenario.name] = summarize(latencies, time.perf_counter() - started, errors, queries)
+    finally:
+        sa.event.remove(engine, "after_cursor_execute", count_statement)
+    return results
+
+
+def _send(port, request, headers):
+    """
+    Sends a request on a new connection to a local server.
+
+    Args:
+        port (int): The port of the server.
+        request (tuple): The method, path and form data of the request.
+        headers (dict): The headers of the request.
+
+    Returns:
+        tuple: The latency in seconds and the status code of the response.
+    """
+    method, path, data = request
+    body = urlencode(data) if data else None
+    request_headers = dict(headers)
+    if body:
+        request_headers["Content-Type"] = "application/x-www-form-urlencoded"
+    connection = http.client.HTTPConnection("127.0.0.1", port, timeout=60)
+    started = time.perf_counter()
+    try:
+        connection.request(method, path, body=body, headers=request_headers)
+        response = connection.getresponse()
+        response.read()
+        return time.perf_counter() - started, response.status
+    finally:
+        connection.close()
+
+
+def load(port, planned, threads, expected=200, headers=None):
+    """
+    Sends requests to a local server from concurrent clients.
+
+    Args:
+        port (int): The port of the server.
+        planned (list): The method, path and form data of each request.
+        threads (int): The number of concurrent clients.
+        expected (int): The status code of a successful response.
+        headers (dict, optional): The headers of every request.
+
+    Returns:
+        dict: The summary of the requests.
+    """
+    with ThreadPoolExecutor(threads) as executor:
+        started = time.perf_counter()
+        outcomes = list(executor.map(lambda request: _send(port, request, headers or {}), planned))
+        elapsed = time.perf_counter() - started
+    errors = sum(status != expected for _, status in outcomes)
+    return summarize([latency for latency, _ in outcomes], elapsed, errors)
+
+
+def run_http(app, scenarios, size, requests, threads, seed=0):
+    """
+    Runs scenarios over HTTP with concurrent clients.
+
+    The application is served by a threaded Werkzeug server on a free local port.
+
+    Args:
+        app (Flask): The application.
+        scenarios (list): The scenarios to run.
+        size (int): The number of restaurants in the database.
+        requests (int): The number of requests of each scenario.
+        threads (int): The number of concurrent clients.
+        seed (int): The seed of the request arguments.
+
+    Returns:
+        dict: The summary of each scenario, by name.
+    """
+    cookie = "session=" + _logged_in_client(app).get_cookie("session").value
+    server = make_server("127.0.0.1", 0, app, threaded=True, request_handler=QuietRequestHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    results = {}
+    try:
+        for scenario in scenarios:
+            rng = random.Random(seed)
+            planned = [scenario.build(rng, size) for _ in range(scenario.count(requests))]
+            headers = {"Cookie": cookie} if scenario.authenticated else {}
+            results[scenario.name] = load(server.server_port, planned, threads, scenario.expected, headers)
+    finally:
+        server.shutdown()
+        thread.join()
+    return results
+
+
+def peak_rss():
+    """
+    Returns the peak resident memory of the process.
+
+    Returns:
+        float: The peak resident set size, in MiB.
+    """
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+
+
+def compare(results, baseline, threshold):
+    """
+    Lists the regressions of some results against a baseline.
+
+    A latency percentile or the peak memory regresses when it grows by more than the
+    threshold, the throughput when it drops by more than the threshold, and the SQL
+    statements per request as soon as they grow.
+
+    Args:
+        results (dict): The results of a run.
+        baseline (dict): The baseline results, of the same database size.
+        threshold (float): The tolerated relative change, such as 0.25 for 25%.
+
+    Returns:
+        list: A description of each regression.
+    """
+    regressions = []
+    for phase in ("client", "http"):
+        for name, current in results.get(phase, {}).items():
+            previous = baseline.get(phase, {}).get(name)
+            if previous is None:
+                continue
+            label = "{} {}".format(phase, name)
+            for metric in LATENCY_METRICS:
+                if current[metric] > previous[metric] * (1 + threshold) + MIN_DELTA_MS:
+                    regressions.append(
+                        "{} {}: {:.1f} ms, was {:.1f} ms".format(label, metric, current[metric], previous[metric])
+                    )
+            if current["throughput"] < previous["throughput"] * (1 - threshold):
+                regressions.append(
+                    "{} throughput: {:.1f}/s, was {:.1f}/s".format(label, current["throughput"], previous["throughput"])
+                )
+            if "queries" in previous and current["queries"] > previous["queries"]:
+                regressions.append(
+                    "{} queries: {} per request, was {}".format(label, current["queries"], previous["queries"])
+                )
+    if "peak_rss_mb" in baseline and results["peak_rss_mb"] > baseline["peak_rss_mb"] * (1 + threshold):
+        regressions.append("peak RSS: {} MiB, was {} MiB".format(results["peak_rss_mb"], baseline["peak_rss_mb"]))
+    return regressions
@@ -4,6 +4,11 @@ This module defines the configuration settings for the Flask application.
 It sets up the necessary configurations such as the secret key, database URI,
 supported languages, and the default locale for the Babel extension.
 
+The connection pool of each database is configured through environment variables named
+after its URL variable: DATABASE_POOL_SIZE, DATABASE_MAX_OVERFLOW, DATABASE_POOL_TIMEOUT
+and DATABASE_POOL_RECYCLE for the primary, and the same with the DATABASE_REPLICA prefix
+for the replica and the ASYNC_DATABASE prefix for the engine of the async API.
+
 Modules:
     os: Provides a way of using operating system dependent functionality.
 """
@@ -12,6 +17,31 @@ import os
 
 basedir = os.path.abspath(os.path.dirname(__file__))
 
+POOL_VARIABLES = {
+    "pool_size": "POOL_SIZE",
+    "max_overflow": "MAX_OVERFLOW",
+    "pool_timeout": "POOL_TIMEOUT",
+    "pool_recycle": "POOL_RECYCLE",
+}
+
+
+def pool_options(prefix):
+    """
+    Reads the connection pool options of a database from the environment.
+
+    Args:
+        prefix (str): The prefix of the environment variables, such as "DATABASE".
+
+    Returns:
+        dict: The engine options set in the environment.
+    """
+    options = {}
+    for option, name in POOL_VARIABLES.items():
+        value = os.environ.get("{}_{}".format(prefix, name))
+        if value:
+            options[option] = int(value)
+    return options
+
 
 class Config:
     """
@@ -22,6 +52,45 @@ class Config:
         SQLALCHEMY_DATABASE_URI (str): The database URI that specifies the database to be used.
         LANGUAGES (list): A list of supported languages for the application.
         BABEL_DEFAULT_LOCALE (str): The default locale for the Babel extension.
+        RESTAURANTS_MAX_PAGE_LENGTH (int): The maximum number of restaurants returned per page.
+        HIERARCHY_CACHE_TTL (int): Seconds a worker keeps its place hierarchy snapshot before reloading it.
+        RESPONSE_CACHE_TYPE (str): The page cache backend, "lru", "null" or the dotted path of a backend class.
+        RESPONSE_CACHE_SIZE (int): The maximum number of pages kept by the LRU page cache.
+        RESPONSE_CACHE_TTL (int): Seconds a page stays in the LRU page cache.
+        STREAM_RESTAURANT_LIST (bool): Whether to stream every restaurant with the list page instead of paging them.
+        STREAM_CHUNK_SIZE (int): The number of restaurants read and sent per chunk when streaming.
+        SQLALCHEMY_ENGINE_OPTIONS (dict): The engine and pool options of the primary database.
+        DATABASE_REPLICA_URL (str): The URI of a read-only replica of the database, if any.
+        SQLALCHEMY_BINDS (dict): The "replica" bind with its pool options, when DATABASE_REPLICA_URL is set.
+        REPLICA_STICKY_SECONDS (int): Seconds a client reads from the primary after committing a change.
+        USER_CACHE_SIZE (int): The maximum number of logged-in user identities kept by each worker.
+        USER_CACHE_TTL (int): Seconds a worker keeps a user identity before loading it again.
+        LOGIN_USERNAME_LIMIT (tuple): The login attempts allowed in a burst for a username, and the seconds to regain them.
+        LOGIN_ADDRESS_LIMIT (tuple): The login attempts allowed in a burst for a client address, and the seconds to regain them.
+        TRUSTED_PROXY_HOPS (int): The number of reverse proxies in front of the application whose X-Forwarded-For and
+            X-Forwarded-Proto headers are trusted for the client address, 0 when clients connect directly.
+        LOGIN_THROTTLE_SIZE (int): The maximum number of usernames and addresses tracked by each worker.
+        LOGIN_HASH_WORKERS (int): The number of threads verifying password hashes in each worker.
+        LOGIN_HASH_QUEUE (int): The maximum number of password verifications running or waiting in each worker.
+        LOGIN_HASH_TIMEOUT (int): Seconds a login attempt waits for its password verification.
+        METRICS_ALLOWED_ADDRESSES (list): The client addresses or networks allowed to read /metrics, empty to disable it,
+            matched against the address forwarded by the TRUSTED_PROXY_HOPS proxies, if any.
+        SLOW_QUERY_THRESHOLD (float): Seconds above which a SQL statement is logged with its plan, 0 to disable.
+        LOG_FILE (str): The path of the JSON lines log file.
+        LOG_MAX_BYTES (int): The size at which the log file rotates, unless LOG_ROTATE_WHEN is set.
+        LOG_ROTATE_WHEN (str): When the log file rotates, such as "midnight" or "H", instead of by size.
+        LOG_BACKUP_COUNT (int): The number of rotated log files kept.
+        LOG_QUEUE_SIZE (int): The maximum number of log records waiting to be written, beyond which they are dropped.
+        LOG_REQUESTS (bool): Whether to log every request with its status and duration.
+        MINIFY_HTML (bool): Whether to minify the HTML pages.
+        COMPRESS_MIN_SIZE (int): The size in bytes below which responses are sent uncompressed.
+        COMPRESS_LEVEL (int): The gzip and deflate compression level, from 1 to 9.
+        COMPRESS_CACHE_SIZE (int): The maximum number of minified or compressed bodies kept by each worker.
+        BATCH_UPDATE_MAX_SIZE (int): The maximum number of restaurant updates in a batch request.
+        PRELOAD_APP (bool): Whether create_app loads the templates, translations and place hierarchy before returning.
+        TEMPLATE_CACHE_DIR (str): The directory of the compiled templates shared by the workers, instance/jinja when preloading if unset.
+        ASYNC_DATABASE_URL (str): The URI the async API connects to, SQLALCHEMY_DATABASE_URI with its async driver if unset.
+        ASYNC_ENGINE_OPTIONS (dict): The engine and pool options of the async API.
     """
 
     SECRET_KEY = os.environ.get("SECRET_KEY") or "jXthea5ednWrlExO1WJfewOq6COYPE3N"
@@ -30,3 +99,42 @@ class Config:
     )  # pylint: disable=line-too-long
     LANGUAGES = ["ca", "es"]
     BABEL_DEFAULT_LOCALE = "ca"
+    RESTAURANTS_MAX_PAGE_LENGTH = 100
+    HIERARCHY_CACHE_TTL = 300
+    RESPONSE_CACHE_TYPE = os.environ.get("RESPONSE_CACHE_TYPE") or "lru"
+    RESPONSE_CACHE_SIZE = 256
+    RESPONSE_CACHE_TTL = 60
+    STREAM_RESTAURANT_LIST = os.environ.get("STREAM_RESTAURANT_LIST", "").lower() in ("1", "true", "yes")
+    STREAM_CHUNK_SIZE = 500
+    SQLALCHEMY_ENGINE_OPTIONS = pool_options("DATABASE")
+    DATABASE_REPLICA_URL = os.environ.get("DATABASE_REPLICA_URL")
+    SQLALCHEMY_BINDS = (
+        {"replica": {"url": DATABASE_REPLICA_URL, **pool_options("DATABASE_REPLICA")}} if DATABASE_REPLICA_URL else {}
+    )
+    REPLICA_STICKY_SECONDS = 5
+    USER_CACHE_SIZE = 1024
+    USER_CACHE_TTL = 60
+    LOGIN_USERNAME_LIMIT = (5, 60)
+    LOGIN_ADDRESS_LIMIT = (20, 60)
+    TRUSTED_PROXY_HOPS = int(os.environ.get("TRUSTED_PROXY_HOPS") or 0)
+    LOGIN_THROTTLE_SIZE = 10000
+    LOGIN_HASH_WORKERS = 2
+    LOGIN_HASH_QUEUE = 8
+    LOGIN_HASH_TIMEOUT = 5
+    METRICS_ALLOWED_ADDRESSES = os.environ.get("METRICS_ALLOWED_ADDRESSES", "127.0.0.1,::1").split(",")
+    SLOW_QUERY_THRESHOLD = float(os.environ.get("SLOW_QUERY_THRESHOLD") or 0.25)
+    LOG_FILE = os.environ.get("LOG_FILE") or "logs/restaurant.log"
+    LOG_MAX_BYTES = 10 * 1024 * 1024
+    LOG_ROTATE_WHEN = os.environ.get("LOG_ROTATE_WHEN")
+    LOG_BACKUP_COUNT = 10
+    LOG_QUEUE_SIZE = 10000
+    LOG_REQUESTS = True
+    MINIFY_HTML = True
+    COMPRESS_MIN_SIZE = 500
+    COMPRESS_LEVEL = 6
+    COMPRESS_CACHE_SIZE = 256
+    BATCH_UPDATE_MAX_SIZE = 1000
+    PRELOAD_APP = os.environ.get("PRELOAD_APP", "").lower() in ("1", "true", "yes")
+    TEMPLATE_CACHE_DIR = os.environ.get("TEMPLATE_CACHE_DIR")
+    ASYNC_DATABASE_URL = os.environ.get("ASYNC_DATABASE_URL")
+    ASYNC_ENGINE_OPTIONS = pool_options("ASYNC_DATABASE")
@@ -0,0 +1,67 @@
+"""add restaurant search index
+
+Revision ID: 9b41e6d0c2fa
+Revises: 5d2f8c41b7e3
+Create Date: 2024-09-15 18:40:07.215638
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9b41e6d0c2fa'
+down_revision = '5d2f8c41b7e3'
+branch_labels = None
+depends_on = None
+
+COLUMNS = "name, address, city_name, province_name, region_name, country_name"
+NEW_VALUES = "new.name, new.address, new.city_name, new.province_name, new.region_name, new.country_name"
+OLD_VALUES = "old.name, old.address, old.city_name, old.province_name, old.region_name, old.country_name"
+
+
+def upgrade():
+    # The full-text index relies on SQLite FTS5, other backends fall back to LIKE filtering
+    if op.get_bind().dialect.name != "sqlite":
+        return
+
+    # External-content table over the flattened listing, indexed for 2 and 3 character prefixes
+    op.execute(
+        f"CREATE VIRTUAL TABLE restaurant_search USING fts5({COLUMNS}, "
+        "content='restaurant_listing', content_rowid='restaurant_id', "
+        "tokenize='unicode61 remove_diacritics 2', prefix='2 3')"
+    )
+    # Rank matches on the restaurant name above its address, and both above the place names
+    op.execute("INSERT INTO restaurant_search(restaurant_search, rank) VALUES('rank', 'bm25(10.0, 4.0, 1.0, 1.0, 1.0, 1.0)')")
+
+    op.execute(
+        "CREATE TRIGGER restaurant_listing_ai AFTER INSERT ON restaurant_listing BEGIN "
+        f"INSERT INTO restaurant_search(rowid, {COLUMNS}) VALUES (new.restaurant_id, {NEW_VALUES}); "
+        "END"
+    )
+    op.execute(
+        "CREATE TRIGGER restaurant_listing_ad AFTER DELETE ON restaurant_listing BEGIN "
+        f"INSERT INTO restaurant_search(restaurant_search, rowid, {COLUMNS}) "
+        f"VALUES ('delete', old.restaurant_id, {OLD_VALUES}); "
+        "END"
+    )
+    op.execute(
+        "CREATE TRIGGER restaurant_listing_au AFTER UPDATE ON restaurant_listing BEGIN "
+        f"INSERT INTO restaurant_search(restaurant_search, rowid, {COLUMNS}) "
+        f"VALUES ('delete', old.restaurant_id, {OLD_VALUES}); "
+        f"INSERT INTO restaurant_search(rowid, {COLUMNS}) VALUES (new.restaurant_id, {NEW_VALUES}); "
+        "END"
+    )
+
+    # Index the existing listing rows
+    op.execute("INSERT INTO restaurant_search(restaurant_search) VALUES('rebuild')")
+
+
+def downgrade():
+    if op.get_bind().dialect.name != "sqlite":
+        return
+
+    op.execute("DROP TRIGGER IF EXISTS restaurant_listing_au")
+    op.execute("DROP TRIGGER IF EXISTS restaurant_listing_ad")
+    op.execute("DROP TRIGGER IF EXISTS restaurant_listing_ai")
+    op.execute("DROP TABLE IF EXISTS restaurant_search")
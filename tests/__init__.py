@@ -0,0 +1,3 @@
+"""
+Tests of the restaurant directory, run with pytest against SQLite databases built by the migrations.
+"""
@@ -0,0 +1,119 @@
+"""
+This module provides the fixtures of the test suite.
+
+A database is created once per test session with the migrations and the synthetic data of
+the benchmarks, and every test gets an application running on a copy of it, so tests can
+change rows without affecting each other.
+
+Modules:
+    os: Provides a way of using operating system dependent functionality.
+    shutil: Provides high-level file operations.
+    pytest: Testing framework.
+    create_app: Function to create the Flask application instance.
+    db: SQLAlchemy database instance.
+    dataset: Generation of the benchmark databases.
+    Config: Configuration class for the application.
+"""
+
+import os
+import shutil
+
+import pytest
+
+from app import create_app, db
+from benchmarks import dataset
+from config import Config
+
+RESTAURANTS = 500
+
+
+def config_for(database, **settings):
+    """
+    Returns the configuration of an application under test.
+
+    Args:
+        database (str): The path of the SQLite database.
+        **settings: Configuration values overriding the defaults.
+
+    Returns:
+        type: The configuration class.
+    """
+
+    class TestConfig(Config):
+        """
+        Configuration of the application under test, without CSRF checks or slow query plans.
+        """
+
+        SQLALCHEMY_DATABASE_URI = "sqlite:///" + database
+        SQLALCHEMY_BINDS = {}
+        ASYNC_DATABASE_URL = None
+        TESTING = True
+        WTF_CSRF_ENABLED = False
+        SLOW_QUERY_THRESHOLD = 0
+        PRELOAD_APP = False
+
+    for name, value in settings.items():
+        setattr(TestConfig, name, value)
+    return TestConfig
+
+
+@pytest.fixture(scope="session")
+def template_database(tmp_path_factory):
+    """
+    Creates the database the database of each test is copied from.
+    """
+    path = str(tmp_path_factory.mktemp("template") / "restaurants.db")
+    app = create_app(config_for(path))
+    dataset.build(app, RESTAURANTS)
+    with app.app_context():
+        db.engine.dispose()
+    return path
+
+
+@pytest.fixture
+def make_app(template_database, tmp_path):
+    """
+    Returns a function creating an application with some settings, on the database of the
+    test or on another copy of the template database.
+    """
+    apps = []
+
+    def make(database="restaurants.db", **settings):
+        path = str(tmp_path / database)
+        if not os.path.exists(path):
+            shutil.copyfile(template_database, path)
+        app = create_app(config_for(path, **settings))
+        apps.append(app)
+        return app
+
+    yield make
+    for app in apps:
+        with app.app_context():
+            db.engine.dispose()
+
+
+@pytest.fixture
+def app(make_app):
+    """
+    Returns an application on the database of the test.
+    """
+    return make_app()
+
+
+@pytest.fixture
+def client(app):
+    """
+    Returns an anonymous test client.
+    """
+    return app.test_client()
+
+
+@pytest.fixture
+def user_client(app):
+    """
+    Returns a test client logged in as the benchmark user.
+    """
+    client = app.test_client()
+    response = client.post("/auth/login", data={"username": dataset.USERNAME, "password": dataset.PASSWORD})
+    assert response.status_code == 302
+    return client
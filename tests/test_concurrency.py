@@ -0,0 +1,109 @@
+"""
+Tests of the optimistic concurrency of the edit form and the batch updates.
+"""
+
+import pytest
+import sqlalchemy as sa
+
+from app import db
+from app.hierarchy import get_hierarchy
+from app.main.batch import ConcurrentUpdate, apply_updates
+from app.models import Restaurant, RestaurantListing
+
+
+def _restaurant(app, restaurant_id=None):
+    with app.app_context():
+        query = sa.select(Restaurant).order_by(Restaurant.id)
+        if restaurant_id is not None:
+            query = query.where(Restaurant.id == restaurant_id)
+        restaurant = db.session.scalar(query.limit(1))
+        db.session.expunge(restaurant)
+        return restaurant
+
+
+def _form(restaurant, **changes):
+    form = {
+        "name": restaurant.name,
+        "address": restaurant.address,
+        "city_id": restaurant.city_id,
+        "province_id": restaurant.province_id,
+        "region_id": restaurant.region_id,
+        "country_id": restaurant.country_id,
+        "version": restaurant.version,
+    }
+    form.update(changes)
+    return form
+
+
+def test_edit_saves_the_current_version(app, user_client):
+    restaurant = _restaurant(app)
+    response = user_client.post("/edit/{}".format(restaurant.id), data=_form(restaurant, name="Renamed"))
+    assert response.status_code == 302
+    saved = _restaurant(app, restaurant.id)
+    assert saved.name == "Renamed"
+    assert saved.version == restaurant.version + 1
+    with app.app_context():
+        assert db.session.get(RestaurantListing, restaurant.id).name == "Renamed"
+
+
+def test_edit_rejects_a_stale_version(app, user_client):
+    restaurant = _restaurant(app)
+    user_client.post("/edit/{}".format(restaurant.id), data=_form(restaurant, name="First"))
+    response = user_client.post("/edit/{}".format(restaurant.id), data=_form(restaurant, name="Second"))
+    assert response.status_code == 302
+    assert response.headers["Location"].endswith("/edit/{}".format(restaurant.id))
+    saved = _restaurant(app, restaurant.id)
+    assert saved.name == "First"
+    assert saved.version == restaurant.version + 1
+
+
+def test_edit_requires_a_version(app, user_client):
+    restaurant = _restaurant(app)
+    form = _form(restaurant, name="Renamed")
+    del form["version"]
+    assert user_client.post("/edit/{}".format(restaurant.id), data=form).status_code == 400
+    assert _restaurant(app, restaurant.id).name == restaurant.name
+
+
+def test_batch_reports_conflicts_and_applies_the_rest(app, user_client):
+    with app.app_context():
+        first, second = db.session.scalars(sa.select(Restaurant).order_by(Restaurant.id).limit(2))
+        updates = [
+            {"id": first.id, "version": first.version, "address": "Carrer Nou 1"},
+            {"id": second.id, "version": second.version - 1, "address": "Carrer Nou 2"},
+            {"id": 0, "version": 1, "address": "Carrer Nou 3"},
+        ]
+        first_id, first_version, second_id, second_version = first.id, first.version, second.id, second.version
+    response = user_client.post("/restaurants/batch", json=updates)
+    assert response.status_code == 200
+    assert response.json["updated"] == [{"id": first_id, "version": first_version + 1}]
+    assert response.json["conflicts"] == [{"index": 1, "id": second_id, "version": second_version}]
+    assert [error["index"] for error in response.json["errors"]] == [2]
+    assert _restaurant(app, first_id).address == "Carrer Nou 1"
+    assert _restaurant(app, second_id).address != "Carrer Nou 2"
+
+
+def test_batch_detects_a_change_during_the_update(app):
+    class ChangingHierarchy:
+        """
+        Hierarchy changing the restaurant while its update is being validated.
+        """
+
+        def __init__(self, hierarchy, restaurant_id):
+            self.hierarchy = hierarchy
+            self.restaurant_id = restaurant_id
+
+        def path(self, city_id):
+            db.session.execute(
+                sa.update(Restaurant).where(Restaurant.id == self.restaurant_id).values(version=Restaurant.version + 1)
+            )
+            return self.hierarchy.path(city_id)
+
+    restaurant = _restaurant(app)
+    with app.app_context():
+        hierarchy = ChangingHierarchy(get_hierarchy(), restaurant.id)
+        update = {"id": restaurant.id, "version": restaurant.version, "city_id": restaurant.city_id}
+        with pytest.raises(ConcurrentUpdate):
+            apply_updates(db.session, [update], hierarchy)
+        db.session.rollback()
+    assert _restaurant(app, restaurant.id).version == restaurant.version
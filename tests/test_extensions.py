@@ -0,0 +1,28 @@
+"""
+Tests of the per-application state of the extensions.
+"""
+
+from app import db, response_cache
+from app.cache import LRUCache, NullCache
+from app.hierarchy import get_hierarchy
+from app.identity import identities
+from app.models import Country
+
+
+def test_applications_keep_their_own_state(make_app):
+    first = make_app(RESPONSE_CACHE_TYPE="lru")
+    second = make_app("other.db", RESPONSE_CACHE_TYPE="null")
+    with second.app_context():
+        country = db.session.get(Country, get_hierarchy().all("country")[0].id)
+        country.name = "Renamed"
+        db.session.commit()
+        assert get_hierarchy().get("country", country.id).name == "Renamed"
+        assert type(response_cache.backend) is NullCache
+    with first.app_context():
+        assert get_hierarchy().get("country", country.id).name != "Renamed"
+        assert type(response_cache.backend) is LRUCache
+        assert identities.stats() == {"hits": 0, "misses": 0}
+    client = first.test_client()
+    assert client.get("/").headers["X-Cache"] == "MISS"
+    assert client.get("/").headers["X-Cache"] == "HIT"
+    assert second.test_client().get("/").headers["X-Cache"] == "MISS"
@@ -0,0 +1,68 @@
+"""
+Tests of the login throttling and the bounded password verification.
+"""
+
+from app.auth.protection import TokenBuckets, login_guard
+from benchmarks import dataset
+
+
+def _login(client, username=dataset.USERNAME, password=dataset.PASSWORD, address="10.0.0.1"):
+    return client.post(
+        "/auth/login",
+        data={"username": username, "password": password},
+        environ_base={"REMOTE_ADDR": address},
+    )
+
+
+def test_buckets_refill_over_their_period(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr("app.auth.protection.time.monotonic", lambda: now[0])
+    buckets = TokenBuckets(2, 10, maxsize=2)
+    assert buckets.take("a") == 0
+    assert buckets.take("a") == 0
+    assert buckets.take("a") == 5
+    now[0] += 5
+    assert buckets.take("a") == 0
+    assert buckets.take("b") == 0
+    assert buckets.take("c") == 0
+    assert list(buckets._buckets) == ["b", "c"]  # pylint: disable=protected-access
+
+
+def test_username_limit_answers_429(make_app):
+    client = make_app(LOGIN_USERNAME_LIMIT=(2, 60)).test_client()
+    assert _login(client, password="wrong", address="10.0.0.1").status_code == 302
+    assert _login(client, password="wrong", address="10.0.0.2").status_code == 302
+    response = _login(client, address="10.0.0.3")
+    assert response.status_code == 429
+    assert int(response.headers["Retry-After"]) >= 1
+
+
+def test_address_limit_spares_the_username(make_app):
+    client = make_app(LOGIN_USERNAME_LIMIT=(2, 60), LOGIN_ADDRESS_LIMIT=(1, 60)).test_client()
+    assert _login(client, password="wrong", address="10.0.0.1").status_code == 302
+    for _ in range(5):
+        assert _login(client, address="10.0.0.1").status_code == 429
+    assert _login(client, address="10.0.0.2").status_code == 302
+
+
+def test_forwarded_address_is_throttled_behind_trusted_proxies(make_app):
+    client = make_app(LOGIN_ADDRESS_LIMIT=(1, 60), TRUSTED_PROXY_HOPS=1).test_client()
+    forwarded = {"X-Forwarded-For": "192.0.2.1"}
+    assert client.post("/auth/login", data={"username": "a", "password": "b"}, headers=forwarded).status_code == 302
+    assert client.post("/auth/login", data={"username": "c", "password": "d"}, headers=forwarded).status_code == 429
+    forwarded = {"X-Forwarded-For": "192.0.2.2"}
+    assert client.post("/auth/login", data={"username": "e", "password": "f"}, headers=forwarded).status_code == 302
+
+
+def test_busy_verification_pool_answers_503(app, client):
+    slots = login_guard._slots  # pylint: disable=protected-access
+    for _ in range(login_guard.max_pending):
+        slots.acquire()
+    try:
+        response = _login(client)
+    finally:
+        for _ in range(login_guard.max_pending):
+            slots.release()
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "1"
+    assert _login(client).status_code == 302
@@ -0,0 +1,98 @@
+"""
+Tests of the DataTables paging of the restaurant list.
+"""
+
+import json
+
+import pytest
+import sqlalchemy as sa
+
+from app import db
+from app.models import Restaurant
+
+PAGE_LENGTH = 40
+
+
+def _pages(client, cursors, **args):
+    """
+    Reads the pages of the restaurant list up to its total, following the cursors or with OFFSET only.
+    """
+    rows = []
+    cursor = total = page = None
+    while total is None or len(rows) < total:
+        query = {"draw": 1, "start": len(rows), "length": PAGE_LENGTH, **args}
+        if cursors and cursor:
+            query["cursor"] = cursor
+        page = client.get("/restaurants", query_string=query).json
+        if not page["data"]:
+            break
+        rows.extend(row["id"] for row in page["data"])
+        cursor, total = page["cursor"], page["recordsFiltered"]
+    return rows, page
+
+
+@pytest.mark.parametrize(
+    "args",
+    [
+        {},
+        {"order[0][column]": 2, "order[0][dir]": "desc"},
+        {"order[0][column]": 5, "order[0][dir]": "asc", "order[1][column]": 0, "order[1][dir]": "desc"},
+        {"search[value]": "Bar"},
+    ],
+)
+def test_keyset_pages_match_offset_pages(client, args):
+    keyset, _ = _pages(client, True, **args)
+    offset, _ = _pages(client, False, **args)
+    assert keyset == offset
+    assert len(keyset) == len(set(keyset))
+
+
+def test_cursor_pages_do_not_skip_rows_after_a_delete(app, client):
+    first = client.get("/restaurants", query_string={"length": 10}).json
+    with app.app_context():
+        db.session.delete(db.session.get(Restaurant, first["data"][0]["id"]))
+        db.session.commit()
+    remaining = client.get("/restaurants", query_string={"length": 20}).json["data"]
+    page = client.get("/restaurants", query_string={"start": 10, "length": 10, "cursor": first["cursor"]}).json
+    assert page["data"] == remaining[9:19]
+
+
+def test_city_pages_match_offset_pages(app, client):
+    with app.app_context():
+        city_id, count = db.session.execute(
+            sa.select(Restaurant.city_id, sa.func.count()).group_by(Restaurant.city_id).order_by(sa.func.count().desc())
+        ).first()
+    keyset, page = _pages(client, True, city_id=city_id)
+    assert keyset == _pages(client, False, city_id=city_id)[0]
+    assert len(keyset) == count
+    assert page["recordsTotal"] == page["recordsFiltered"] == count
+
+
+def test_totals_come_from_the_counters(app, client):
+    with app.app_context():
+        total = db.session.scalar(sa.select(sa.func.count()).select_from(Restaurant))
+    page = client.get("/restaurants", query_string={"draw": 3, "length": 10}).json
+    assert page["draw"] == 3
+    assert page["recordsTotal"] == page["recordsFiltered"] == total
+    page = client.get("/restaurants", query_string={"length": 10, "search[value]": "Bar"}).json
+    assert page["recordsTotal"] == total
+    assert 0 < page["recordsFiltered"] < total
+
+
+@pytest.mark.parametrize(
+    "corrupt",
+    [
+        lambda cursor: "not json",
+        lambda cursor: "[]",
+        lambda cursor: json.dumps({**cursor, "values": 1}),
+        lambda cursor: json.dumps({**cursor, "values": [{"a": 1}] + cursor["values"][1:]}),
+        lambda cursor: json.dumps({**cursor, "values": [[1]] + cursor["values"][1:]}),
+    ],
+)
+def test_malformed_cursors_fall_back_to_offset(client, corrupt):
+    first = client.get("/restaurants", query_string={"length": 10}).json
+    expected = client.get("/restaurants", query_string={"start": 10, "length": 10}).json["data"]
+    cursor = corrupt(json.loads(first["cursor"]))
+    page = client.get("/restaurants", query_string={"start": 10, "length": 10, "cursor": cursor})
+    assert page.status_code == 200
+    assert page.json["data"] == expected
@@ -0,0 +1,73 @@
+"""
+Tests of the incremental maintenance of the place counters.
+"""
+
+import sqlalchemy as sa
+
+from app import db
+from app.hierarchy import get_hierarchy
+from app.main.batch import apply_updates
+from app.models import PlaceCount, Restaurant
+
+
+def _counters():
+    rows = db.session.execute(sa.select(PlaceCount.level, PlaceCount.place_id, PlaceCount.total))
+    return {(level, place_id): total for level, place_id, total in rows if total}
+
+
+def _rebuilt():
+    with db.engine.connect() as connection:
+        transaction = connection.begin()
+        PlaceCount.rebuild(connection)
+        rows = connection.execute(sa.select(PlaceCount.level, PlaceCount.place_id, PlaceCount.total))
+        counters = {(level, place_id): total for level, place_id, total in rows if total}
+        transaction.rollback()
+    return counters
+
+
+def _other_city(restaurant):
+    cities = get_hierarchy().all("city")
+    city = next(city for city in cities if city.id != restaurant.city_id and city.parent_id != restaurant.province_id)
+    return get_hierarchy().path(city.id)
+
+
+def test_counters_follow_orm_changes(app):
+    with app.app_context():
+        first, second, third = db.session.scalars(sa.select(Restaurant).order_by(Restaurant.id).limit(3))
+        path = _other_city(first)
+        first.city_id, first.province_id = path["city"].id, path["province"].id
+        first.region_id, first.country_id = path["region"].id, path["country"].id
+        db.session.delete(second)
+        db.session.add(
+            Restaurant(
+                name="New restaurant",
+                address=third.address,
+                city_id=third.city_id,
+                province_id=third.province_id,
+                region_id=third.region_id,
+                country_id=third.country_id,
+            )
+        )
+        db.session.commit()
+        assert _rebuilt() == _counters()
+
+
+def test_counters_follow_batch_updates(app):
+    with app.app_context():
+        restaurants = db.session.scalars(sa.select(Restaurant).order_by(Restaurant.id).limit(5)).all()
+        updates = [
+            {"id": restaurant.id, "version": restaurant.version, "city_id": _other_city(restaurant)["city"].id}
+            for restaurant in restaurants
+        ]
+        result = apply_updates(db.session, updates, get_hierarchy())
+        db.session.commit()
+        assert len(result["updated"]) == len(updates)
+        assert _rebuilt() == _counters()
+
+
+def test_totals_match_the_restaurants(app):
+    with app.app_context():
+        expected = dict(
+            db.session.execute(sa.select(Restaurant.city_id, sa.func.count()).group_by(Restaurant.city_id)).all()
+        )
+        assert PlaceCount.totals("city") == expected
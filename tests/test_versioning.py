@@ -0,0 +1,47 @@
+"""
+Tests of the conditional GET requests answered from the data versions.
+"""
+
+import sqlalchemy as sa
+
+from app import db
+from app.models import Country, Restaurant
+
+
+def test_unchanged_page_answers_304(client):
+    response = client.get("/restaurants?length=10")
+    assert response.status_code == 200
+    etag = response.headers["ETag"]
+    assert client.get("/restaurants?length=10", headers={"If-None-Match": etag}).status_code == 304
+    assert client.get("/restaurants?length=10", headers={"If-None-Match": "W/" + etag}).status_code == 304
+    last_modified = response.headers["Last-Modified"]
+    assert client.get("/restaurants?length=10", headers={"If-Modified-Since": last_modified}).status_code == 304
+
+
+def test_etag_depends_on_the_url(client):
+    etag = client.get("/restaurants?length=10").headers["ETag"]
+    assert client.get("/restaurants?length=20", headers={"If-None-Match": etag}).status_code == 200
+
+
+def test_changed_data_renders_the_page_again(app, client):
+    etag = client.get("/restaurants?length=10").headers["ETag"]
+    with app.app_context():
+        restaurant = db.session.scalar(sa.select(Restaurant).order_by(Restaurant.id).limit(1))
+        restaurant.address = "Carrer Nou 1"
+        db.session.commit()
+    response = client.get("/restaurants?length=10", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["ETag"] != etag
+
+
+def test_reloaded_hierarchy_renders_the_page_again(app, client):
+    with app.app_context():
+        country_id = db.session.scalar(sa.select(Country.id).limit(1))
+    url = "/facets/regions?country={}".format(country_id)
+    etag = client.get(url).headers["ETag"]
+    with app.app_context():
+        db.session.get(Country, country_id).name = "Renamed"
+        db.session.commit()
+    response = client.get(url, headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["ETag"] != etag